@@ -3,6 +3,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import *
+from .planning import CUE_PERMUTATIONS
+from django.db.models import Count
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 import json
@@ -31,6 +33,17 @@ class PCMSettingsAdmin(admin.ModelAdmin):
                 'feedback_correct_consecutive',
             )
         }),
+        ('پارامترهای آزمون', {
+            'description': 'تغییرات فقط روی پلن‌هایی که از این پس ساخته می‌شوند اثر دارد؛ فیدبک و مهلت پاسخ فوراً اعمال می‌شوند.',
+            'fields': (
+                'valence_practice_trials',
+                'response_timeout',
+                'seq_practice_trials',
+                'seq_threshold',
+                'seq_max_blocks',
+                'rating_practice_trials',
+            )
+        }),
     )
 
 
@@ -927,3 +940,109 @@ class DeviceLogAdmin(admin.ModelAdmin):
 
 
 admin.site.register(VolumeLog)
+
+
+@admin.register(PCMSessionPlan)
+class PCMSessionPlanAdmin(admin.ModelAdmin):
+    list_display = ('user', 'stage', 'block', 'version', 'revision', 'updated_at')
+    list_filter = ('stage', 'block', 'version')
+    search_fields = ('user__username',)
+    readonly_fields = ('user', 'version', 'seed', 'revision', 'stage', 'block', 'plan', 'cursor', 'created_at', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ParticipantProgress)
+class ParticipantProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'valence_practice', 'pcm_rating_practice', 'pcm_rating_main', 'rating_practice', 'rating_main', 'updated_at')
+    search_fields = ('user__username',)
+    readonly_fields = (
+        'user', 'valence_practice', 'seq_blocks', 'pcm_blocks', 'pcm_rating_practice',
+        'pcm_rating_main', 'rating_practice', 'rating_main', 'updated_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(PCMCueAssignment)
+class PCMCueAssignmentAdmin(admin.ModelAdmin):
+    list_display = ('permutation', 'mapping', 'assigned')
+    readonly_fields = ('permutation', 'assigned')
+    ordering = ('permutation',)
+
+    def mapping(self, obj):
+        if obj.permutation >= len(CUE_PERMUTATIONS):
+            return "-"
+        return " | ".join(seq.replace('-', ' -> ') for seq in CUE_PERMUTATIONS[obj.permutation])
+
+    mapping.short_description = "توالی کیوهای ۱، ۲، ۳"
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(StimulusNorm)
+class StimulusNormAdmin(admin.ModelAdmin):
+    list_display = ('stimulus', 'source', 'stimulus_file', 'n_responses', 'mean_valence', 'mean_arousal', 'updated_at')
+    list_filter = ('source',)
+    search_fields = ('stimulus', 'stimulus_file')
+
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.concrete_fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='میانگین خوشایندی')
+    def mean_valence(self, obj):
+        mean = obj.mean('valence')
+        return round(mean, 2) if mean is not None else '-'
+
+    @admin.display(description='میانگین برانگیختگی')
+    def mean_arousal(self, obj):
+        mean = obj.mean('arousal')
+        return round(mean, 2) if mean is not None else '-'
+
+
+@admin.register(PCMEffect)
+class PCMEffectAdmin(admin.ModelAdmin):
+    list_display = ('user', 'measure', 'scope', 'n_expected', 'n_unexpected', 'expected', 'unexpected', 'delta', 'ci_low', 'ci_high')
+    list_filter = ('measure', 'scope')
+    search_fields = ('user__username',)
+    list_select_related = ('user',)
+
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.concrete_fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Stimulus)
+class StimulusAdmin(admin.ModelAdmin):
+    list_display = ('path', 'category', 'valence_class', 'arousal_class', 'duration', 'sample_rate', 'lufs', 'is_active')
+    list_filter = ('category', 'valence_class', 'arousal_class', 'is_active')
+    search_fields = ('path',)
+
+
+class StimulusSetMemberInline(admin.TabularInline):
+    model = StimulusSetMember
+    extra = 0
+    fields = ('position', 'stimulus')
+    autocomplete_fields = ('stimulus',)
+
+
+@admin.register(StimulusSet)
+class StimulusSetAdmin(admin.ModelAdmin):
+    list_display = ('name', 'description', 'member_count', 'updated_at')
+    search_fields = ('name',)
+    inlines = [StimulusSetMemberInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(member_count=Count('members'))
+
+    @admin.display(description='تعداد محرک', ordering='member_count')
+    def member_count(self, obj):
+        return obj.member_count
@@ -0,0 +1,195 @@
+"""
+تحلیل فایل‌های صوتی محرک‌ها برای build_stimulus_manifest.
+
+این ماژول عمداً به Django وابسته نیست تا در workerهای ProcessPoolExecutor بدون setup اجرا شود.
+مدت، bitrate و sample rate از هدر فریم‌های MP3 خوانده می‌شوند (Xing/Info/VBRI یا پیمایش فریم‌ها).
+بلندی صدا (RMS و LUFS یکپارچه طبق EBU R128) نیاز به دیکد دارد و فقط وقتی ffmpeg در PATH باشد
+اندازه‌گیری می‌شود؛ در غیر این صورت None برمی‌گردد.
+"""
+import hashlib
+import re
+import shutil
+import struct
+import subprocess
+from typing import Optional
+
+# (version, layer) -> جدول bitrate بر حسب kbps؛ version: 1 = MPEG1، 2 = MPEG2 و MPEG2.5
+BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# بیت‌های version در هدر: 0 = MPEG2.5، 2 = MPEG2، 3 = MPEG1
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+INTEGRATED_LOUDNESS_RE = re.compile(r'I:\s+(-?[\d.]+|-inf)\s+LUFS')
+MEAN_VOLUME_RE = re.compile(r'mean_volume:\s+(-?[\d.]+|-inf)\s+dB')
+
+
+def parse_frame_header(data: bytes, pos: int) -> Optional[dict]:
+    """هدر ۴ بایتی فریم MPEG audio در pos؛ برای هدر نامعتبر None"""
+    if pos + 4 > len(data):
+        return None
+    b1, b2, b3, b4 = data[pos:pos + 4]
+    if b1 != 0xFF or (b2 & 0xE0) != 0xE0:
+        return None
+    version_bits = (b2 >> 3) & 0x03
+    layer_bits = (b2 >> 1) & 0x03
+    bitrate_index = (b3 >> 4) & 0x0F
+    sample_rate_index = (b3 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = 1 if version_bits == 3 else 2
+    layer = 4 - layer_bits
+    bitrate = BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b3 >> 1) & 0x01
+    channels = 1 if (b4 >> 6) & 0x03 == 3 else 2
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version == 1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    return {
+        'version': version,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'samples': samples,
+        'length': length,
+    }
+
+
+def id3v2_size(data: bytes) -> int:
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def audio_end(data: bytes) -> int:
+    """انتهای داده صوتی؛ تگ ID3v1 انتهای فایل کنار گذاشته می‌شود"""
+    if len(data) >= 128 and data[-128:-125] == b'TAG':
+        return len(data) - 128
+    return len(data)
+
+
+def vbr_frame_count(data: bytes, pos: int, header: dict) -> Optional[int]:
+    """تعداد فریم از هدر Xing/Info یا VBRI در فریم اول (در صورت وجود)"""
+    if header['version'] == 1:
+        side_info = 17 if header['channels'] == 1 else 32
+    else:
+        side_info = 9 if header['channels'] == 1 else 17
+    xing = pos + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        if flags & 0x01:
+            return struct.unpack('>I', data[xing + 8:xing + 12])[0]
+    vbri = pos + 4 + 32
+    if data[vbri:vbri + 4] == b'VBRI':
+        return struct.unpack('>I', data[vbri + 14:vbri + 18])[0]
+    return None
+
+
+def mp3_info(data: bytes) -> dict:
+    """duration (ثانیه)، bitrate میانگین (bps)، sample_rate و channels از روی فریم‌ها"""
+    end = audio_end(data)
+    pos = id3v2_size(data)
+    first = None
+    while pos < end - 4:
+        header = parse_frame_header(data, pos)
+        # هم‌گام‌سازی: هدر معتبر وقتی پذیرفته می‌شود که فریم بعدی هم معتبر باشد
+        if header and (pos + header['length'] >= end or parse_frame_header(data, pos + header['length'])):
+            first = header
+            break
+        pos += 1
+    if first is None:
+        return {'duration': None, 'bitrate': None, 'sample_rate': None, 'channels': None}
+
+    start = pos
+    frames = vbr_frame_count(data, pos, first)
+    if frames is not None:
+        # فریم Xing/Info خودش صدا ندارد
+        audio_start = start + first['length']
+    else:
+        frames = 0
+        audio_start = start
+        while pos < end:
+            header = parse_frame_header(data, pos)
+            if header is None or header['length'] <= 0:
+                break
+            frames += 1
+            pos += header['length']
+
+    duration = frames * first['samples'] / first['sample_rate']
+    bitrate = round((end - audio_start) * 8 / duration) if duration else None
+    return {
+        'duration': round(duration, 4),
+        'bitrate': bitrate,
+        'sample_rate': first['sample_rate'],
+        'channels': first['channels'],
+    }
+
+
+def _parse_level(match) -> Optional[float]:
+    if match is None or match.group(1) == '-inf':
+        return None
+    return float(match.group(1))
+
+
+def loudness(path: str, ffmpeg: Optional[str]) -> dict:
+    """RMS میانگین (dBFS) و بلندی یکپارچه (LUFS) با فیلترهای volumedetect و ebur128 در ffmpeg"""
+    if not ffmpeg:
+        return {'rms_db': None, 'lufs': None}
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-nostats', '-hide_banner', '-i', path,
+             '-af', 'volumedetect,ebur128=framelog=quiet', '-f', 'null', '-'],
+            capture_output=True, text=True, timeout=120,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return {'rms_db': None, 'lufs': None}
+    # خلاصه ebur128 در انتهای خروجی چاپ می‌شود؛ آخرین تطابق I: همان مقدار یکپارچه است
+    lufs = INTEGRATED_LOUDNESS_RE.findall(result.stderr)
+    return {
+        'rms_db': _parse_level(MEAN_VOLUME_RE.search(result.stderr)),
+        'lufs': float(lufs[-1]) if lufs and lufs[-1] != '-inf' else None,
+    }
+
+
+def find_ffmpeg() -> Optional[str]:
+    return shutil.which('ffmpeg')
+
+
+def analyze_file(path: str, previous_hash: str = '', ffmpeg: Optional[str] = None) -> dict:
+    """
+    تحلیل یک فایل؛ اگر هش محتوا با previous_hash برابر باشد فقط {'sha256', 'unchanged': True}
+    برمی‌گردد و متادیتای قبلی دوباره استفاده می‌شود.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+    if sha256 == previous_hash:
+        return {'sha256': sha256, 'unchanged': True}
+    info = mp3_info(data)
+    info.update(loudness(path, ffmpeg))
+    info['sha256'] = sha256
+    return info
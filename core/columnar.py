@@ -0,0 +1,217 @@
+"""
+خروجی ستونی (Parquet) جداول تریال‌ها، پارتیشن‌بندی‌شده بر اساس مرحله و تاریخ جمع‌آوری:
+
+    <root>/<stage>/date=YYYY-MM-DD/part-<اولین id>.parquet
+
+ساختار پوشه‌ها Hive-style است و مستقیماً با arrow::open_dataset در R یا pyarrow.dataset خوانده می‌شود.
+نوع ستون‌ها از فیلدهای مدل گرفته می‌شود (PositiveIntegerField -> uint32، فیلدهای دارای choices مثل
+روش ورودی -> dictionary). خروجی افزایشی است: high-water mark هر مرحله در <root>/_state.json نگه داشته
+می‌شود و اجرای بعدی فقط ردیف‌های با id بزرگ‌تر را می‌نویسد. ویرایش یا حذف ردیف‌های قبلی در خروجی افزایشی
+دیده نمی‌شود؛ برای آن یک مرحله با full=True از نو ساخته می‌شود.
+
+تراکنش‌های ذخیره هم‌زمان ممکن است id کوچک‌تر را بعد از id بزرگ‌تر commit کنند، پس mark بیشترین id دیده‌شده
+نیست: فقط ردیف‌های قبل از اولین ردیفی که created_at آن در lag ثانیه اخیر است صادر می‌شوند (safe_bound) و
+همان مرز به عنوان mark ذخیره می‌شود؛ فرض این است که هیچ تراکنش ذخیره‌ای بیش از lag ثانیه باز نمی‌ماند.
+جدول‌هایی که تاریخشان از جدول دیگری می‌آید (answers و results با زمان شروع پرسشنامه) زمان درج خود را
+ندارند؛ خروجی افزایشی آن‌ها ممکن است ردیف جامانده داشته باشد و فقط اجرای full کامل است.
+
+این ماژول به pyarrow نیاز دارد و فقط توسط دستور export_parquet import می‌شود.
+"""
+import datetime
+import json
+import os
+import shutil
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.utils import timezone
+
+from .export import EXPORT_CHUNK_SIZE, ExportTable
+
+STATE_FILE = '_state.json'
+STATE_VERSION = 1
+# ردیف‌های جوان‌تر از این (ثانیه) در اجرای بعدی صادر می‌شوند؛ بیشتر از طولانی‌ترین تراکنش ذخیره
+EXPORT_LAG = getattr(settings, 'PARQUET_EXPORT_LAG', 300)
+# حداکثر فایل‌های باز هم‌زمان؛ ردیف‌ها به ترتیب id تقریباً به ترتیب تاریخ هم هستند
+MAX_OPEN_PARTITIONS = 16
+
+ARROW_TYPES = {
+    'AutoField': pa.int32(),
+    'BigAutoField': pa.int64(),
+    'SmallAutoField': pa.int16(),
+    'IntegerField': pa.int32(),
+    'BigIntegerField': pa.int64(),
+    'SmallIntegerField': pa.int16(),
+    'PositiveIntegerField': pa.uint32(),
+    'PositiveSmallIntegerField': pa.uint16(),
+    'PositiveBigIntegerField': pa.uint64(),
+    'FloatField': pa.float64(),
+    'BooleanField': pa.bool_(),
+    'DateField': pa.date32(),
+    'CharField': pa.string(),
+    'TextField': pa.string(),
+    'JSONField': pa.string(),
+}
+CATEGORY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+
+def arrow_type(field) -> pa.DataType:
+    if field.is_relation:
+        field = field.target_field
+    if field.choices:
+        return CATEGORY_TYPE
+    internal_type = field.get_internal_type()
+    if internal_type == 'DateTimeField':
+        return pa.timestamp('us', tz=settings.TIME_ZONE if settings.USE_TZ else None)
+    if internal_type == 'DecimalField':
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    return ARROW_TYPES.get(internal_type, pa.string())
+
+
+def arrow_schema(table: ExportTable) -> pa.Schema:
+    fields = [pa.field(name, arrow_type(field)) for name, _, field in table.fields()]
+    return pa.schema(fields, metadata={'stage': table.stage, 'model': table.model._meta.label})
+
+
+def to_record_batch(rows, schema: pa.Schema) -> pa.RecordBatch:
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_string(field.type) and any(isinstance(v, (dict, list)) for v in values):
+            values = [json.dumps(v, ensure_ascii=False) if v is not None else None for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def partition_date(value) -> str:
+    if value is None:
+        return 'unknown'
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.date()
+    return value.isoformat()
+
+
+def load_state(root: Path) -> dict:
+    try:
+        with open(root / STATE_FILE, encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if state.get('version') != STATE_VERSION:
+        return {}
+    return state.get('stages', {})
+
+
+def save_state(root: Path, stages: dict) -> None:
+    tmp = root / (STATE_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': STATE_VERSION, 'stages': stages}, f, indent=2, sort_keys=True)
+    os.replace(tmp, root / STATE_FILE)
+
+
+class PartitionWriters:
+    """یک ParquetWriter باز برای هر پارتیشن تاریخ؛ فایل‌ها تا commit با پسوند .tmp نوشته می‌شوند"""
+
+    def __init__(self, stage_dir: Path, schema: pa.Schema, compression='zstd'):
+        self.stage_dir = stage_dir
+        self.schema = schema
+        self.compression = compression
+        self.open = OrderedDict()  # date -> (writer, tmp path)
+        self.written = []          # (tmp path, final path)
+
+    def write(self, date: str, first_id: int, batch: pa.RecordBatch):
+        if date in self.open:
+            self.open.move_to_end(date)
+        else:
+            if len(self.open) >= MAX_OPEN_PARTITIONS:
+                self._close(next(iter(self.open)))
+            directory = self.stage_dir / f'date={date}'
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f'part-{first_id:012d}.parquet'
+            tmp = path.with_name(path.name + '.tmp')
+            self.open[date] = (pq.ParquetWriter(tmp, self.schema, compression=self.compression), tmp)
+            self.written.append((tmp, path))
+        self.open[date][0].write_batch(batch)
+
+    def _close(self, date):
+        writer, _ = self.open.pop(date)
+        writer.close()
+
+    def commit(self):
+        while self.open:
+            self._close(next(iter(self.open)))
+        for tmp, path in self.written:
+            os.replace(tmp, path)
+        return [path for _, path in self.written]
+
+    def abort(self):
+        while self.open:
+            self._close(next(iter(self.open)))
+        for tmp, _ in self.written:
+            tmp.unlink(missing_ok=True)
+
+
+def safe_bound(table: ExportTable, after_pk: int, lag: float) -> Optional[int]:
+    """
+    بزرگ‌ترین id که همه ردیف‌های تا آن commit شده‌اند: یکی کمتر از اولین ردیف (بعد از after_pk) که در lag
+    ثانیه اخیر ساخته شده، یا بیشترین id اگر چنین ردیفی نیست. None برای جدول‌های بدون زمان درج خودشان.
+    """
+    if '__' in table.date_path:
+        return None
+    rows = table.model.objects.filter(pk__gt=after_pk).order_by('pk').values_list('pk', flat=True)
+    cutoff = timezone.now() - datetime.timedelta(seconds=lag)
+    first_recent = rows.filter(**{f'{table.date_path}__gte': cutoff}).first()
+    if first_recent is not None:
+        return first_recent - 1
+    return rows.reverse().first() or after_pk
+
+
+def export_stage(table: ExportTable, root: Path, state: dict, full=False, chunk_size=EXPORT_CHUNK_SIZE,
+                 lag=EXPORT_LAG) -> dict:
+    """
+    نوشتن ردیف‌های جدید یک مرحله تا safe_bound؛ state (دیکشنری مراحل در _state.json) به‌روز می‌شود.
+    خروجی: {'rows': تعداد ردیف‌های نوشته‌شده، 'files': مسیر فایل‌ها، 'last_id': high-water mark}
+    """
+    stage_dir = root / table.stage
+    if full:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+        state.pop(table.stage, None)
+    for stale in stage_dir.glob('date=*/*.tmp'):
+        stale.unlink()
+
+    stage_state = state.get(table.stage, {})
+    last_id = stage_state.get('last_id', 0)
+    bound = safe_bound(table, last_id, lag)
+    schema = arrow_schema(table)
+    date_index = [lookup for _, lookup in table.columns()].index(table.date_path)
+
+    writers = PartitionWriters(stage_dir, schema)
+    rows = 0
+    try:
+        for chunk in table.chunks(chunk_size=chunk_size, after_pk=last_id, through_pk=bound):
+            by_date = defaultdict(list)
+            for row in chunk:
+                by_date[partition_date(row[date_index])].append(row)
+            for date, date_rows in by_date.items():
+                writers.write(date, date_rows[0][0], to_record_batch(date_rows, schema))
+            rows += len(chunk)
+            last_id = chunk[-1][0]
+        files = writers.commit()
+        if bound is not None:
+            # مرز امن حتی اگر ردیف آخر تا آن حذف شده باشد
+            last_id = max(last_id, bound)
+    except BaseException:
+        writers.abort()
+        raise
+
+    state[table.stage] = {
+        'last_id': last_id,
+        'rows': stage_state.get('rows', 0) + rows,
+        'exported_at': timezone.now().isoformat(),
+    }
+    return {'rows': rows, 'files': files, 'last_id': last_id}
@@ -0,0 +1,59 @@
+"""
+تنظیمات آزمون PCM (ردیف تکی FeedbackSettings) به صورت کش‌شده در هر پردازه.
+
+ویوها به جای FeedbackSettings.objects.first() و ثابت‌های داخل کد از pcm_config() استفاده می‌کنند که
+یک نمونه فقط‌خواندنی PCMConfig برمی‌گرداند؛ ردیف فقط وقتی دوباره خوانده می‌شود که نسخه تنظیمات در کش
+مشترک تغییر کند (سیگنال ذخیره/حذف FeedbackSettings) یا PCM_CONFIG_MAX_AGE ثانیه گذشته باشد
+(core.versioned). نبود ردیف تنظیمات یعنی مقادیر پیش‌فرض فیلدهای مدل.
+"""
+from dataclasses import dataclass, fields
+
+from .models import FeedbackSettings
+from .versioned import VersionedProcessCache
+
+CONFIG_VERSION_KEY = 'pcm_config_version'
+
+
+@dataclass(frozen=True)
+class PCMConfig:
+    # فیدبک مرحله تمرین توالی
+    feedback_mode: str
+    feedback_first_n: int
+    feedback_until_correct: int
+    feedback_correct_consecutive: bool
+    # پارامترهای آزمون
+    valence_practice_trials: int
+    response_timeout: int
+    seq_practice_trials: int
+    seq_threshold: float
+    seq_max_blocks: int
+    rating_practice_trials: int
+
+    @classmethod
+    def from_settings(cls, row: FeedbackSettings) -> 'PCMConfig':
+        return cls(**{f.name: getattr(row, f.name) for f in fields(cls)})
+
+    @classmethod
+    def load(cls) -> 'PCMConfig':
+        return cls.from_settings(FeedbackSettings.objects.first() or FeedbackSettings())
+
+    def feedback_context(self) -> dict:
+        return {
+            'feedback_mode': self.feedback_mode,
+            'feedback_first_n': self.feedback_first_n,
+            'feedback_until_correct': self.feedback_until_correct,
+            'feedback_correct_consecutive': self.feedback_correct_consecutive,
+        }
+
+
+_cache = VersionedProcessCache(CONFIG_VERSION_KEY, 'PCM_CONFIG_MAX_AGE')
+
+
+def pcm_config() -> PCMConfig:
+    """تنظیمات همین پردازه؛ فقط در صورت تغییر نسخه یا گذشتن MAX_AGE دوباره خوانده می‌شود"""
+    return _cache.get(None, lambda key, version: PCMConfig.load())
+
+
+def invalidate_config() -> None:
+    """بعد از commit تغییر تنظیمات صدا زده می‌شود تا همه پردازه‌ها تنظیمات را دوباره بخوانند"""
+    _cache.invalidate()
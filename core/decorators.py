@@ -5,20 +5,42 @@ from django.contrib import messages
 from django.urls import reverse
 from .models import Questionnaire, Response
 
+# شناسه پرسشنامه‌هایی که کاربر تکمیل کرده؛ تکمیل برگشت‌پذیر نیست، پس فقط اضافه می‌شود
+COMPLETED_QUESTIONNAIRES_KEY = 'completed_questionnaires'
+
+
+def completed_questionnaires(request):
+    return set(request.session.get(COMPLETED_QUESTIONNAIRES_KEY, ()))
+
+
+def mark_questionnaires_completed(request, questionnaire_ids):
+    completed = completed_questionnaires(request)
+    if not completed.issuperset(questionnaire_ids):
+        request.session[COMPLETED_QUESTIONNAIRES_KEY] = sorted(completed.union(questionnaire_ids))
+
+
 def questionnaires_required(questionnaire_ids):
     def decorator(view_func):
         def wrapper(request, *args, **kwargs):
-            for q_id in questionnaire_ids:
-                if not Response.objects.filter(
-                    questionnaire_id=q_id,
-                    respondent=request.user,
-                    is_completed=True
-                ).exists():
-                    # ذخیره URL فعلی برای بازگشت بعد از تکمیل
-                    request.session['next_url'] = request.get_full_path()
-                    # ریدایرکت به اولین پرسشنامه پیش‌نیاز تکمیل‌نشده
-                    return redirect('respond_questionnaire', pk=q_id)
+            # وضعیت تکمیل در سشن نگه داشته می‌شود؛ فقط برای پرسشنامه‌هایی که هنوز در سشن نیستند یک کوئری
+            completed = completed_questionnaires(request)
+            missing = [q_id for q_id in questionnaire_ids if q_id not in completed]
+            if missing:
+                done = set(
+                    Response.objects.filter(
+                        questionnaire_id__in=missing,
+                        respondent=request.user,
+                        is_completed=True
+                    ).values_list('questionnaire_id', flat=True)
+                )
+                mark_questionnaires_completed(request, done)
+                for q_id in missing:
+                    if q_id not in done:
+                        # ذخیره URL فعلی برای بازگشت بعد از تکمیل
+                        request.session['next_url'] = request.get_full_path()
+                        # ریدایرکت به اولین پرسشنامه پیش‌نیاز تکمیل‌نشده
+                        return redirect('respond_questionnaire', pk=q_id)
             # همه پیش‌نیازها تکمیل شده → ادامه به ویو اصلی
             return view_func(request, *args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
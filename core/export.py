@@ -0,0 +1,191 @@
+"""
+خروجی داده‌های تریال‌ها برای تحلیل (دستور export_trials و endpoint خروجی کارکنان).
+
+هر جدول مرحله با values_list و join مستقیم به CustomUser خوانده می‌شود (بدون lookup جدا برای هر ردیف)
+و ردیف‌ها به صورت دسته‌های chunk_size تایی با صفحه‌بندی روی کلید اصلی (pk > آخرین pk) جریان می‌یابند؛
+درایور MySQL کل نتیجه یک کوئری را در حافظه کلاینت بافر می‌کند، پس حافظه فقط وقتی ثابت می‌ماند که
+هر کوئری محدود باشد. ترتیب ردیف‌ها همیشه بر اساس id است.
+"""
+import csv
+import datetime
+import json
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .models import (
+    Answer,
+    PCMCatchResponse,
+    PCMMainResponse,
+    PCMSequenceCatchResponse,
+    PCMSequencePracticeResponse,
+    PCMValencePracticeResponse,
+    RatingMainResponse,
+    RatingPractice,
+    RatingPracticeResponse,
+    RatingResponse,
+    Result,
+)
+
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FORMATS = {
+    'csv': (',', 'text/csv'),
+    'tsv': ('\t', 'text/tab-separated-values'),
+}
+
+# اطلاعات جمعیت‌شناختی شرکت‌کننده که کنار هر ردیف می‌آید
+USER_FIELDS = (
+    'username', 'birth_date', 'gender', 'hand', 'marriage', 'education', 'smoking', 'alcohol',
+    'caffeine', 'trauma', 'substance', 'supplement', 'tbi', 'seizure', 'sleep', 'sleep_hours',
+    'mental_disorders', 'disorder', 'drug',
+)
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    stage: str
+    model: type
+    user_path: str = 'user'
+    date_path: str = 'created_at'
+    # ستون‌های اضافه از جداول مرتبط: (نام ستون، lookup)
+    extra: Tuple[Tuple[str, str], ...] = ()
+
+    def columns(self) -> List[Tuple[str, str]]:
+        """(نام ستون، lookup برای values_list)؛ ستون اول همیشه id است"""
+        columns = [('id', 'id'), ('user_id', f'{self.user_path}__id')]
+        columns += [(name, f'{self.user_path}__{name}') for name in USER_FIELDS]
+        for field in self.model._meta.concrete_fields:
+            if field.primary_key or field.name == self.user_path:
+                continue
+            columns.append((field.attname, field.attname))
+        columns += list(self.extra)
+        return columns
+
+    def fields(self) -> List[Tuple[str, str, models.Field]]:
+        """مانند columns به همراه فیلد مدلی که هر lookup به آن می‌رسد (برای تعیین نوع ستون)"""
+        return [(name, lookup, resolve_field(self.model, lookup)) for name, lookup in self.columns()]
+
+    def queryset(self, since=None, until=None, users=None, after_pk=None, through_pk=None):
+        queryset = self.model.objects.all()
+        if after_pk is not None:
+            queryset = queryset.filter(pk__gt=after_pk)
+        if through_pk is not None:
+            queryset = queryset.filter(pk__lte=through_pk)
+        if since is not None:
+            queryset = queryset.filter(**{f'{self.date_path}__gte': day_start(since)})
+        if until is not None:
+            queryset = queryset.filter(**{f'{self.date_path}__lt': day_start(until + datetime.timedelta(days=1))})
+        if users:
+            queryset = queryset.filter(**{f'{self.user_path}__username__in': users})
+        return queryset
+
+    def chunks(self, chunk_size=EXPORT_CHUNK_SIZE, **filters) -> Iterator[List[tuple]]:
+        """ردیف‌ها (به ترتیب columns) در دسته‌های حداکثر chunk_size تایی به ترتیب id"""
+        lookups = [lookup for _, lookup in self.columns()]
+        queryset = self.queryset(**filters).order_by('pk').values_list(*lookups)
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size].iterator(chunk_size=chunk_size))
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            last_pk = chunk[-1][0]
+
+    def rows(self, chunk_size=EXPORT_CHUNK_SIZE, **filters) -> Iterator[tuple]:
+        for chunk in self.chunks(chunk_size=chunk_size, **filters):
+            yield from chunk
+
+
+EXPORT_TABLES = {
+    table.stage: table
+    for table in (
+        ExportTable('valence_practice', PCMValencePracticeResponse),
+        ExportTable('seq_practice', PCMSequencePracticeResponse),
+        ExportTable('seq_catch', PCMSequenceCatchResponse),
+        ExportTable('pcm_catch', PCMCatchResponse),
+        ExportTable('pcm_main', PCMMainResponse),
+        ExportTable('pcm_rating_practice', RatingPracticeResponse),
+        ExportTable('pcm_rating_main', RatingMainResponse),
+        ExportTable('rating_practice', RatingPractice),
+        ExportTable('rating_main', RatingResponse),
+        ExportTable(
+            'answers', Answer, user_path='response__respondent', date_path='response__started_at',
+            extra=(
+                ('questionnaire_id', 'response__questionnaire_id'),
+                ('attribute', 'question__attribute__title'),
+                ('question', 'question__text'),
+                ('choice', 'choice__text'),
+                ('response_started_at', 'response__started_at'),
+            ),
+        ),
+        ExportTable(
+            'results', Result, date_path='response__started_at',
+            extra=(
+                ('questionnaire', 'questionnaire__title'),
+                ('attribute', 'attribute__title'),
+                ('response_started_at', 'response__started_at'),
+            ),
+        ),
+    )
+}
+
+
+def resolve_field(model, lookup: str) -> models.Field:
+    """فیلد انتهای یک lookup مثل 'response__respondent__gender'"""
+    *path, name = lookup.split('__')
+    for part in path:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(name)
+
+
+def day_start(day: datetime.date) -> datetime.datetime:
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class _Echo:
+    """شبه‌فایل برای csv.writer که خط نوشته‌شده را برمی‌گرداند (الگوی StreamingHttpResponse)"""
+
+    def write(self, value):
+        return value
+
+
+def iter_lines(table: ExportTable, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE, **filters) -> Iterator[str]:
+    """خطوط CSV/TSV یک جدول، از جمله سطر عنوان"""
+    writer = csv.writer(_Echo(), delimiter=EXPORT_FORMATS[fmt][0])
+    yield writer.writerow([name for name, _ in table.columns()])
+    for row in table.rows(chunk_size=chunk_size, **filters):
+        yield writer.writerow([format_value(value) for value in row])
+
+
+def write_table(table: ExportTable, stream, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE, **filters) -> int:
+    """نوشتن یک جدول در stream؛ خروجی: تعداد ردیف‌ها (بدون عنوان)"""
+    count = -1
+    for line in iter_lines(table, fmt, chunk_size=chunk_size, **filters):
+        stream.write(line)
+        count += 1
+    return count
+
+
+def resolve_stages(stages: Optional[Iterable[str]]) -> List[ExportTable]:
+    """نام مرحله‌ها -> جدول‌ها؛ خالی یعنی همه. برای نام نامعتبر KeyError"""
+    if not stages:
+        return list(EXPORT_TABLES.values())
+    return [EXPORT_TABLES[stage] for stage in stages]
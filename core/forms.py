@@ -217,4 +217,72 @@ class ParticipantInfoForm(forms.ModelForm):
         }),
         label='توضیحات تکمیلی',
         required=False,
-    )
\ No newline at end of file
+    )
+
+class RatingResultFilterForm(forms.Form):
+    """فیلتر، مرتب‌سازی و صفحه‌بندی صفحه نتایج آزمون رتبه‌بندی (پارامترهای GET)"""
+
+    STATUS_CHOICES = [
+        ('', 'همه'),
+        ('complete', 'تکمیل‌شده'),
+        ('incomplete', 'ناتمام'),
+    ]
+    # کلید پارامتر sort -> فیلد مرتب‌سازی (با پیشوند - نزولی)
+    SORT_FIELDS = {
+        'id': 'id',
+        'mobile': 'username',
+        'age': '-birth_date',
+        'n_responses': 'n_responses',
+        'avg_valence': 'avg_valence',
+        'avg_valence_rt': 'avg_valence_rt',
+        'avg_arousal': 'avg_arousal',
+        'avg_arousal_rt': 'avg_arousal_rt',
+    }
+    PER_PAGE_CHOICES = [(25, '25'), (50, '50'), (100, '100'), (200, '200')]
+
+    gender = forms.ChoiceField(choices=[('', 'همه')] + CustomUser.GENDER_CHOICES, required=False, label='جنسیت')
+    hand = forms.ChoiceField(choices=[('', 'همه')] + CustomUser.HAND_CHOICES, required=False, label='دست غالب')
+    age_min = forms.IntegerField(min_value=0, max_value=150, required=False, label='حداقل سن')
+    age_max = forms.IntegerField(min_value=0, max_value=150, required=False, label='حداکثر سن')
+    status = forms.ChoiceField(choices=STATUS_CHOICES, required=False, label='وضعیت')
+    sort = forms.CharField(required=False)
+    per_page = forms.TypedChoiceField(choices=PER_PAGE_CHOICES, coerce=int, required=False, empty_value=50, label='تعداد در صفحه')
+
+    def clean_sort(self):
+        sort = self.cleaned_data.get('sort') or 'id'
+        if sort.lstrip('-') not in self.SORT_FIELDS:
+            return 'id'
+        return sort
+
+    def ordering(self):
+        """فیلد order_by معادل پارامتر sort"""
+        sort = self.cleaned_data.get('sort') or 'id'
+        field = self.SORT_FIELDS[sort.lstrip('-')]
+        if sort.startswith('-'):
+            field = field[1:] if field.startswith('-') else f'-{field}'
+        return [field, 'id']
+
+
+class TrialExportForm(forms.Form):
+    """پارامترهای GET خروجی تریال‌ها (export_trials_view)"""
+
+    stage = forms.ChoiceField(label='مرحله')
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('tsv', 'TSV')], required=False, label='قالب')
+    since = forms.DateField(required=False, label='از تاریخ')
+    until = forms.DateField(required=False, label='تا تاریخ')
+    users = forms.CharField(required=False, label='شماره موبایل شرکت‌کنندگان (جدا شده با کاما)')
+
+    def __init__(self, *args, stages=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['stage'].choices = [(stage, stage) for stage in stages]
+
+    def clean_users(self):
+        users = self.cleaned_data.get('users') or ''
+        return [username.strip() for username in users.split(',') if username.strip()]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        since, until = cleaned_data.get('since'), cleaned_data.get('until')
+        if since and until and since > until:
+            raise forms.ValidationError('تاریخ شروع بعد از تاریخ پایان است.')
+        return cleaned_data
@@ -0,0 +1,188 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import (
+    CustomUser,
+    PCMCatchResponse,
+    PCMMainResponse,
+    PCMSequenceCatchResponse,
+    PCMSequencePracticeResponse,
+    RatingMainResponse,
+    RatingResponse,
+)
+
+# مدل‌هایی که ایندکس ترکیبی دارند (Meta.indexes)
+INDEXED_MODELS = [
+    PCMSequencePracticeResponse,
+    PCMSequenceCatchResponse,
+    PCMCatchResponse,
+    PCMMainResponse,
+    RatingMainResponse,
+    RatingResponse,
+]
+
+SEQUENCES = ['Negative-Neutral', 'Neutral-Negative', 'Neutral-Neutral']
+RATING_STIMULI = 60
+
+
+def for_count(queryset):
+    # count() ترتیب پیش‌فرض Meta.ordering را حذف می‌کند؛ EXPLAIN هم باید همان کوئری را نشان دهد
+    return queryset.order_by().values('pk')
+
+
+def bench_queries(user_id):
+    """
+    مسیرهای دسترسی pcm_view / rating_view / final_view.
+    هر آیتم: (نام، کوئری برای EXPLAIN، تابع اجرا)
+    """
+    seq_practice = PCMSequencePracticeResponse.objects.filter(user_id=user_id, is_active=True)
+    seq_catch = PCMSequenceCatchResponse.objects.filter(user_id=user_id, is_active=True)
+    rating_main_done = RatingMainResponse.objects.filter(
+        user_id=user_id, valence__isnull=False, arousal__isnull=False
+    )
+    rating_done = RatingResponse.objects.filter(
+        user_id=user_id, valence__isnull=False, arousal__isnull=False
+    )
+    last_seq = seq_practice.order_by('-block', '-trial')
+    seq_block = seq_practice.filter(block=1)
+    seq_catch_correct = seq_catch.filter(block=1, is_correct=True)
+    catch_block = PCMCatchResponse.objects.filter(user_id=user_id, block=2)
+    main_incons = PCMMainResponse.objects.filter(user_id=user_id, block=2, is_consistent=False)
+    main_last = PCMMainResponse.objects.filter(user_id=user_id).order_by('created_at')
+    return [
+        ('seq_practice last block', last_seq, lambda: last_seq.first()),
+        ('seq_practice block count', for_count(seq_block), seq_block.count),
+        ('seq_catch correct count', for_count(seq_catch_correct), seq_catch_correct.count),
+        ('pcm_catch block count', for_count(catch_block), catch_block.count),
+        ('pcm_main inconsistent count', for_count(main_incons), main_incons.count),
+        ('pcm_main last response', main_last, lambda: main_last.last()),
+        ('rating_main completed count', for_count(rating_main_done), rating_main_done.count),
+        ('rating completed count', for_count(rating_done), rating_done.count),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک ایندکس‌های ترکیبی جداول پاسخ روی داده مصنوعی. "
+        "یک دیتابیس تست جداگانه ساخته و در پایان حذف می‌شود "
+        "(کاربر دیتابیس باید اجازه CREATE DATABASE داشته باشد)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--participants', type=int, default=10000)
+        parser.add_argument('--samples', type=int, default=200, help='تعداد شرکت‌کننده برای زمان‌سنجی')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            rng = random.Random(options['seed'])
+            user_ids = self.populate(options['participants'], rng)
+            sample = rng.sample(user_ids, min(options['samples'], len(user_ids)))
+
+            indexes = [(model, index) for model in INDEXED_MODELS for index in model._meta.indexes]
+
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.remove_index(model, index)
+            before = self.report('بدون ایندکس‌های ترکیبی', sample)
+
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+            after = self.report('با ایندکس‌های ترکیبی', sample)
+
+            self.stdout.write('\n=== خلاصه (میلی‌ثانیه به ازای هر کوئری) ===')
+            for name in before:
+                self.stdout.write(f'{name:32} {before[name]:8.3f} -> {after[name]:8.3f}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def populate(self, participants, rng):
+        self.stdout.write(f'ساخت داده مصنوعی برای {participants} شرکت‌کننده...')
+        start = time.perf_counter()
+        CustomUser.objects.bulk_create(
+            [CustomUser(username=f'09{i:09d}') for i in range(participants)],
+            batch_size=2000,
+        )
+        user_ids = list(CustomUser.objects.values_list('pk', flat=True))
+
+        def flush(model, rows):
+            model.objects.bulk_create(rows, batch_size=2000)
+            rows.clear()
+
+        buffers = {model: [] for model in INDEXED_MODELS}
+        for user_id in user_ids:
+            blocks = rng.choice([1, 1, 1, 2, 3])
+            for block in range(1, blocks + 1):
+                for trial in range(1, 31):
+                    buffers[PCMSequencePracticeResponse].append(PCMSequencePracticeResponse(
+                        user_id=user_id, block=block, trial=trial, cue=str(trial % 3 + 1),
+                        user_response=rng.choice(SEQUENCES), is_correct=rng.random() < 0.9,
+                        is_consistent=trial % 5 != 0,
+                    ))
+                for trial in range(1, 7):
+                    buffers[PCMSequenceCatchResponse].append(PCMSequenceCatchResponse(
+                        user_id=user_id, block=block, trial=trial, cue=str(trial % 3 + 1),
+                        is_correct=rng.random() < 0.8,
+                    ))
+            for block in range(1, 4):
+                for trial in range(1, 7):
+                    buffers[PCMCatchResponse].append(PCMCatchResponse(
+                        user_id=user_id, block=block, trial=trial, cue=str(trial % 3 + 1),
+                        is_correct=rng.random() < 0.9,
+                    ))
+                for trial in range(1, 15):
+                    buffers[PCMMainResponse].append(PCMMainResponse(
+                        user_id=user_id, block=block, trial=trial, cue=str(trial % 3 + 1),
+                        is_consistent=trial > 2, valence_stim1=rng.randint(1, 9),
+                        valence_stim2=rng.randint(1, 9), valence_sequence=rng.randint(1, 9),
+                    ))
+            for stimulus in range(1, RATING_STIMULI + 1):
+                valence = rng.randint(1, 9) if rng.random() < 0.95 else None
+                arousal = rng.randint(1, 9) if rng.random() < 0.95 else None
+                buffers[RatingMainResponse].append(RatingMainResponse(
+                    user_id=user_id, trial=stimulus, stimulus_number=stimulus,
+                    stimulus_file=f'{stimulus}.mp3', valence=valence, arousal=arousal,
+                ))
+                buffers[RatingResponse].append(RatingResponse(
+                    user_id=user_id, trial=stimulus, stimulus=stimulus,
+                    stimulus_file=f'{stimulus}.mp3', valence=valence, arousal=arousal,
+                ))
+            for model, rows in buffers.items():
+                if len(rows) >= 10000:
+                    flush(model, rows)
+        for model, rows in buffers.items():
+            flush(model, rows)
+
+        for model in INDEXED_MODELS:
+            self.stdout.write(f'  {model.__name__}: {model.objects.count()} ردیف')
+        self.stdout.write(f'  زمان ساخت: {time.perf_counter() - start:.1f} ثانیه')
+
+        # به‌روزرسانی آمار برای انتخاب درست query plan
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'mysql':
+                for model in INDEXED_MODELS:
+                    cursor.execute(f'ANALYZE TABLE {model._meta.db_table}')
+                    cursor.fetchall()
+            elif connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE')
+        return user_ids
+
+    def report(self, title, sample):
+        self.stdout.write(f'\n=== {title} ===')
+        timings = {}
+        for name, queryset, _ in bench_queries(sample[0]):
+            self.stdout.write(f'\n-- {name}\n{queryset.explain()}')
+        for user_id in sample:
+            for name, _, run in bench_queries(user_id):
+                start = time.perf_counter()
+                run()
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        return {name: total * 1000 / len(sample) for name, total in timings.items()}
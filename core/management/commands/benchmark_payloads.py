@@ -0,0 +1,124 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import payloads
+from core.models import CustomUser
+
+SOUNDS = '/static/sounds/'
+SEQUENCES = ['Negative-Neutral', 'Neutral-Negative', 'Neutral-Neutral']
+
+
+def sample_payload(stage, trial, rng: random.Random) -> dict:
+    """payload نمونه هر مرحله با همان کلیدهایی که قالب‌های آزمون ارسال می‌کنند"""
+    cue = f'{SOUNDS}CUE/1/{rng.randint(1, 3)}.mp3'
+    stimuli = {
+        'stimulus1': f'{SOUNDS}neutral/{rng.randint(100, 199)}.mp3',
+        'stimulus2': f'{SOUNDS}negative/{rng.randint(200, 299)}.mp3',
+        'category_stim1': 'Neutral', 'category_stim2': 'Negative',
+    }
+    valence = {}
+    for suffix in ('stim1', 'stim2', 'sequence'):
+        valence.update({
+            f'valence_{suffix}': rng.randint(1, 9), f'valence_rt_{suffix}': rng.randint(300, 3000),
+            f'valence_delay_number_{suffix}': 0, f'valence_input_method_{suffix}': 'mouse',
+        })
+    response = {
+        'user_response': rng.choice(SEQUENCES), 'response_rt': rng.randint(300, 3000), 'delay_number': 0,
+        'response_input_method': 'keyboard', 'is_correct': rng.random() < 0.8,
+    }
+    rating = {
+        'valence': rng.randint(1, 9), 'valence_rt': rng.randint(300, 3000), 'valence_delay_number': 0,
+        'valence_input_method': 'mouse', 'arousal': rng.randint(1, 9), 'arousal_rt': rng.randint(300, 3000),
+        'arousal_delay_number': 0, 'arousal_input_method': 'mouse',
+    }
+    if stage == 'valence_practice':
+        return {'is_valence_practice': True, 'trial': trial, 'cue': cue, **stimuli, **valence}
+    if stage == 'seq_catch':
+        return {'is_catch': True, 'block': 1, 'trial': trial, 'cue': cue, **response}
+    if stage == 'seq_practice':
+        return {
+            'is_seq_practice': True, 'block': 1, 'trial': trial, 'cue': cue, **stimuli,
+            'expected_sequence': rng.choice(SEQUENCES), 'is_consistent': True, **response,
+        }
+    if stage == 'pcm_catch':
+        return {
+            'is_catch_pcm': True, 'block': 2, 'trial': trial, 'cue': cue, **response,
+            'cue_onset_latency': rng.random() * 20, 'audio_engine': 'webaudio',
+        }
+    if stage == 'pcm_main':
+        return {
+            'block': 2, 'trial': trial, 'cue': cue, **stimuli, 'expected_sequence': rng.choice(SEQUENCES),
+            'is_consistent': rng.random() < 0.8, **valence, 'cue_onset_latency': rng.random() * 20,
+            'stim1_onset_latency': rng.random() * 20, 'stim2_onset_latency': rng.random() * 20,
+            'audio_engine': 'webaudio',
+        }
+    if stage == 'rating_practice':
+        return {'is_rating_practice': True, 'trial': trial, 'stimulus': stimuli['stimulus1'], **rating}
+    return {
+        'is_rerating': True, 'trial': trial, 'stimulus_number': stimuli['stimulus1'],
+        'stimulus_file': stimuli['stimulus1'], **rating,
+    }
+
+
+def best_of(repeat, func) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "میکروبنچمارک لایه payload ذخیره تریال‌ها (core.payloads) بدون پایگاه داده: خواندن JSON، "
+        "تشخیص مرحله و اعتبارسنجی، و ساخت ردیف مدل؛ برای هر مرحله و برای ترکیب همه مراحل. "
+        "زمان‌ها بهترین نتیجه از --repeat اجرا هستند."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payloads', type=int, default=10000, help='تعداد payload هر مرحله')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--target', type=float, default=10000, help='حداقل payload بر ثانیه مورد انتظار')
+
+    def handle(self, *args, **options):
+        count = options['payloads']
+        if count <= 0 or options['repeat'] <= 0:
+            raise CommandError('--payloads و --repeat باید مثبت باشند.')
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+        user = CustomUser(pk=1)
+        table = payloads.PCM_PAYLOADS
+
+        self.stdout.write(f"JSON: {'orjson' if payloads.orjson is not None else 'json (orjson نصب نیست)'}")
+        self.stdout.write(f"{'مرحله':<18}{'json.loads':>12}{'decode':>12}{'validate':>12}{'build':>12}{'کل/ثانیه':>12}")
+
+        bodies = []
+        for stage in table.by_stage:
+            stage_bodies = [json.dumps(sample_payload(stage, i + 1, rng)).encode() for i in range(count)]
+            bodies.extend(stage_bodies)
+            self.report(stage, stage_bodies, table, user, repeat)
+        rng.shuffle(bodies)
+        per_second = self.report('همه', bodies, table, user, repeat)
+
+        if per_second >= options['target']:
+            self.stdout.write(self.style.SUCCESS(f"{per_second:.0f} payload بر ثانیه (هدف {options['target']:.0f})"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{per_second:.0f} payload بر ثانیه، کمتر از هدف {options['target']:.0f}"))
+
+    def report(self, label, bodies, table, user, repeat) -> float:
+        data = [payloads.decode(body) for body in bodies]
+        stdlib = best_of(repeat, lambda: [json.loads(body) for body in bodies])
+        decode = best_of(repeat, lambda: [payloads.decode(body) for body in bodies])
+        validate = best_of(repeat, lambda: [table.dispatch(item).clean(item) for item in data])
+        build = best_of(repeat, lambda: [table.build(user, item) for item in data])
+        n = len(bodies)
+        # build خودش شامل تشخیص مرحله و اعتبارسنجی است
+        per_second = n / (decode + build)
+        us = [1e6 * seconds / n for seconds in (stdlib, decode, validate, build)]
+        self.stdout.write(f'{label:<18}' + ''.join(f'{value:>10.2f}µs' for value in us) + f'{per_second:>12.0f}')
+        return per_second
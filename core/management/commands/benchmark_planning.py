@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import planning
+
+CUES = {
+    '/static/sounds/CUE/1/1.mp3': 'Negative-Neutral',
+    '/static/sounds/CUE/1/2.mp3': 'Neutral-Negative',
+    '/static/sounds/CUE/1/3.mp3': 'Neutral-Neutral',
+}
+
+
+def best_of(repeat, func) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "میکروبنچمارک plannerهای core.planning بدون پایگاه داده: تولید پلن هر مرحله از شمارنده‌های خالی "
+        "(شروع بلاک، بدترین حالت) با seed صریح. هر «پلن» یک فراخوانی planner است؛ برای آزمون اصلی "
+        "یعنی تریال‌های هر ۳ بلاک. زمان‌ها بهترین نتیجه از --repeat اجرا هستند."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', type=int, default=20000, help='تعداد پلن هر planner')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--target', type=float, default=100000, help='حداقل پلن بر ثانیه مورد انتظار')
+
+    def handle(self, *args, **options):
+        count, repeat, target = options['plans'], options['repeat'], options['target']
+        if count <= 0 or repeat <= 0:
+            raise CommandError('--plans و --repeat باید مثبت باشند.')
+        cue_list = list(CUES)
+        usage = planning.CueUsage()
+        seq_trials = planning.SEQ_PER_CUE * len(CUES)
+        catch_trials = planning.CATCH_PER_CUE * len(CUES)
+        blocks = [planning.MainBlockState(block) for block in range(1, planning.MAIN_BLOCKS + 1)]
+
+        planners = {
+            'valence_practice': lambda rng: planning.valence_practice_sequences(9, 0, {}, rng),
+            'seq_practice': lambda rng: planning.seq_practice_trials(CUES, usage, seq_trials, 0, rng),
+            'practice_catch': lambda rng: planning.practice_catch_cues(cue_list, {}, catch_trials, rng),
+            'remaining_catch': lambda rng: planning.remaining_catch_cues(cue_list, {}, catch_trials, rng),
+            'main (3 blocks)': lambda rng: planning.main_tracks(CUES, usage, (), blocks, rng),
+        }
+
+        self.stdout.write(f"{'planner':<18}{'هر پلن':>12}{'پلن/ثانیه':>14}")
+        for label, planner in planners.items():
+            rng = random.Random(options['seed'])
+            seconds = best_of(repeat, lambda: [planner(rng) for _ in range(count)])
+            per_second = count / seconds
+            line = f'{label:<18}{1e6 * seconds / count:>10.2f}µs{per_second:>14.0f}'
+            style = self.style.SUCCESS if per_second >= target else self.style.WARNING
+            self.stdout.write(style(line))
+        self.stdout.write(f'هدف: {target:.0f} پلن بر ثانیه')
@@ -0,0 +1,167 @@
+import http.client
+import json
+import secrets
+import threading
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import CustomUser
+
+# شماره‌های موبایل ساختگی شرکت‌کنندگان شبیه‌سازی‌شده؛ با last_name علامت می‌خورند و در پایان حذف می‌شوند
+BENCH_PREFIX = '0999'
+BENCH_MARK = 'benchmark'
+
+ENDPOINTS = {
+    'pcm': '/pcm/save/',
+    'rating': '/rating/save/',
+    'device': '/save-device-log/',
+    'volume': '/save-volume-log/',
+}
+
+
+def trial_payload(endpoint, trial):
+    if endpoint == 'pcm':
+        return {
+            'block': 1, 'trial': trial, 'cue': '/static/sounds/CUE/1/1.mp3',
+            'stimulus1': f'/static/sounds/neutral/{trial}.mp3', 'stimulus2': f'/static/sounds/negative/{trial}.mp3',
+            'expected_sequence': 'Neutral-Negative', 'is_consistent': True,
+            'category_stim1': 'Neutral', 'category_stim2': 'Negative',
+            'valence_stim1': 5, 'valence_rt_stim1': 800, 'valence_stim2': 3, 'valence_rt_stim2': 900,
+            'valence_sequence': 4, 'valence_rt_sequence': 1000,
+        }
+    if endpoint == 'rating':
+        return {
+            'is_rerating': True, 'trial': trial, 'stimulus_number': f'{trial}.mp3',
+            'stimulus_file': f'/static/sounds/rating/{trial}.mp3',
+            'valence': 5, 'valence_rt': 800, 'arousal': 4, 'arousal_rt': 900,
+        }
+    if endpoint == 'device':
+        return {'stage': f'bench-{trial}', 'device_type': 'Desktop', 'os': 'Linux', 'browser': 'bench'}
+    return {'volume': trial % 100}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "بنچمارک endpointهای ذخیره پاسخ روی یک سرور در حال اجرا: PARTICIPANTS شرکت‌کننده شبیه‌سازی‌شده "
+        "هم‌زمان، هر کدام TRIALS درخواست پشت سر هم (مانند ارسال تریال‌ها در آزمون). خروجی: درخواست بر ثانیه "
+        "و صدک‌های تأخیر. برای مقایسه مسیر WSGI و ASGI یک‌بار روی هر سرور اجرا شود (ASYNC_SAVE_ENDPOINTS فقط "
+        "روی سرور ASGI). کاربران و پاسخ‌های ساخته‌شده در پایان حذف می‌شوند."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='آدرس سرور، مثلاً http://127.0.0.1:8000')
+        parser.add_argument('--endpoint', choices=list(ENDPOINTS), default='pcm')
+        parser.add_argument('--participants', type=int, default=500)
+        parser.add_argument('--trials', type=int, default=20, help='تعداد درخواست هر شرکت‌کننده')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--keep', action='store_true', help='کاربران و داده‌های بنچمارک حذف نشوند')
+
+    def handle(self, *args, **options):
+        target = urlsplit(options['url'])
+        if target.scheme not in ('http', 'https') or not target.hostname:
+            raise CommandError(f"آدرس نامعتبر: {options['url']}")
+        participants = options['participants']
+        if not 0 < participants <= 9_999_999:
+            raise CommandError('--participants باید مثبت باشد.')
+
+        users, sessions = self.create_participants(participants)
+        try:
+            latencies, statuses, elapsed = self.run(target, options, sessions)
+        finally:
+            if not options['keep']:
+                for session in sessions:
+                    session.delete()
+                CustomUser.objects.filter(pk__in=[u.pk for u in users], last_name=BENCH_MARK).delete()
+
+        latencies.sort()
+        total = len(latencies)
+        ok = statuses.get(200, 0)
+        self.stdout.write(f"endpoint={options['endpoint']} participants={participants} trials={options['trials']}")
+        self.stdout.write(f'درخواست‌ها: {total}، موفق: {ok}، وضعیت‌ها: {dict(sorted(statuses.items(), key=str))}')
+        self.stdout.write(f'زمان: {elapsed:.2f} ثانیه، {total / elapsed:.1f} درخواست بر ثانیه')
+        self.stdout.write(
+            'تأخیر (ms): p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f}'.format(
+                *(1000 * percentile(latencies, p) for p in (50, 95, 99, 100))
+            )
+        )
+
+    def create_participants(self, count):
+        usernames = [f'{BENCH_PREFIX}{i:07d}' for i in range(count)]
+        if CustomUser.objects.filter(username__in=usernames).exclude(last_name=BENCH_MARK).exists():
+            raise CommandError(f'کاربر واقعی با پیشوند {BENCH_PREFIX} وجود دارد؛ بنچمارک اجرا نشد.')
+        CustomUser.objects.filter(username__in=usernames).delete()
+        CustomUser.objects.bulk_create([
+            CustomUser(username=username, last_name=BENCH_MARK, password='!') for username in usernames
+        ])
+        users = list(CustomUser.objects.filter(username__in=usernames))
+        backend = settings.AUTHENTICATION_BACKENDS[0]
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        sessions = []
+        for user in users:
+            session = session_store()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = backend
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            sessions.append(session)
+        return users, sessions
+
+    def run(self, target, options, sessions):
+        endpoint, trials = options['endpoint'], options['trials']
+        path = ENDPOINTS[endpoint]
+        connection_class = http.client.HTTPSConnection if target.scheme == 'https' else http.client.HTTPConnection
+        latencies, statuses = [], {}
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(sessions) + 1)
+
+        def participant(session):
+            csrf = secrets.token_hex(16)  # 32 کاراکتر: همان secret کوکی در هدر
+            headers = {
+                'Content-Type': 'application/json',
+                'Cookie': f'{settings.SESSION_COOKIE_NAME}={session.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}',
+                'X-CSRFToken': csrf,
+                'Referer': f'{target.scheme}://{target.netloc}/',
+            }
+            connection = connection_class(target.hostname, target.port, timeout=options['timeout'])
+            own_latencies, own_statuses = [], {}
+            barrier.wait()
+            for trial in range(1, trials + 1):
+                body = json.dumps(trial_payload(endpoint, trial))
+                start = time.perf_counter()
+                try:
+                    connection.request('POST', path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException) as exc:
+                    status = type(exc).__name__
+                    connection.close()
+                    connection = connection_class(target.hostname, target.port, timeout=options['timeout'])
+                own_latencies.append(time.perf_counter() - start)
+                own_statuses[status] = own_statuses.get(status, 0) + 1
+            connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                for status, n in own_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + n
+
+        threads = [threading.Thread(target=participant, args=(session,), daemon=True) for session in sessions]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return latencies, statuses, time.perf_counter() - start
@@ -0,0 +1,173 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.audio import analyze_file, find_ffmpeg
+from core.models import Stimulus
+from core.stimuli import invalidate_catalog, manifest_path, sounds_dir
+
+MANIFEST_VERSION = 1
+AUDIO_EXTENSIONS = ('.mp3',)
+METADATA_FIELDS = ('duration', 'bitrate', 'sample_rate', 'channels', 'rms_db', 'lufs')
+
+
+def scan(root):
+    """مسیر نسبی -> (size, mtime_ns) برای همه فایل‌های صوتی زیر root"""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            full = os.path.join(dirpath, name)
+            stat = os.stat(full)
+            files[os.path.relpath(full, root).replace(os.sep, '/')] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def category_of(path):
+    """پوشه سطح اول فایل (مثلاً 5-MP-MA یا CUE)"""
+    return path.split('/', 1)[0] if '/' in path else ''
+
+
+class Command(BaseCommand):
+    help = (
+        "پیمایش static/sounds و ساخت مانیفست محرک‌ها (مدت، bitrate، sample rate، RMS/LUFS و هش محتوا). "
+        "فایل‌هایی که اندازه و mtime آن‌ها تغییر نکرده دوباره خوانده نمی‌شوند و فایل‌های تغییرکرده "
+        "فقط در صورت تغییر هش دوباره تحلیل می‌شوند. نتیجه در فایل JSON و جدول Stimulus ذخیره می‌شود."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='تعداد پردازه‌های موازی')
+        parser.add_argument('--full', action='store_true', help='نادیده گرفتن مانیفست قبلی و تحلیل همه فایل‌ها')
+        parser.add_argument('--no-loudness', action='store_true', help='بدون اندازه‌گیری RMS/LUFS (بدون ffmpeg)')
+        parser.add_argument('--no-db', action='store_true', help='فقط نوشتن فایل مانیفست')
+
+    def handle(self, *args, **options):
+        root = sounds_dir()
+        if not root.is_dir():
+            raise CommandError(f'پوشه صداها پیدا نشد: {root}')
+        start = time.perf_counter()
+        output = manifest_path()
+
+        previous = {} if options['full'] else self.load_manifest(output)
+        ffmpeg = None if options['no_loudness'] else find_ffmpeg()
+        if ffmpeg is None and not options['no_loudness']:
+            self.stderr.write('ffmpeg پیدا نشد؛ RMS و LUFS اندازه‌گیری نمی‌شوند.')
+
+        files = scan(root)
+        entries, todo = {}, []
+        for path, (size, mtime_ns) in files.items():
+            old = previous.get(path)
+            needs_loudness = ffmpeg is not None and old is not None and not old.get('loudness')
+            if old and old['size'] == size and old['mtime_ns'] == mtime_ns and not needs_loudness:
+                entries[path] = old
+            else:
+                # اگر فقط بلندی صدا کم است، هش قبلی نباید باعث رد شدن تحلیل شود
+                previous_hash = old['sha256'] if old and not needs_loudness else ''
+                todo.append((path, size, mtime_ns, previous_hash))
+
+        analyzed, reanalyzed = self.analyze(root, todo, previous, ffmpeg, options['jobs'])
+        entries.update(analyzed)
+        entries = dict(sorted(entries.items()))
+        self.write_manifest(output, entries)
+
+        missing = sorted(set(previous) - set(files))
+        if missing:
+            self.stderr.write(f'{len(missing)} فایل از مانیفست قبلی دیگر وجود ندارد: {", ".join(missing[:5])}')
+
+        if not options['no_db']:
+            created, updated = self.sync_db(entries)
+            self.stdout.write(f'جدول Stimulus: {created} ردیف جدید، {updated} ردیف به‌روز شد.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(files)} فایل پیمایش شد، {len(todo)} فایل خوانده شد '
+            f'({reanalyzed} تحلیل کامل) در {time.perf_counter() - start:.2f} ثانیه -> {output}'
+        ))
+
+    def load_manifest(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            self.stderr.write(f'مانیفست قبلی قابل خواندن نیست و نادیده گرفته می‌شود: {path}')
+            return {}
+        if data.get('version') != MANIFEST_VERSION:
+            return {}
+        return data.get('files', {})
+
+    def analyze(self, root, todo, previous, ffmpeg, jobs):
+        if not todo:
+            return {}, 0
+        args = [(str(root / path), previous_hash, ffmpeg) for path, _, _, previous_hash in todo]
+        if jobs > 1 and len(todo) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(analyze_file, *zip(*args), chunksize=max(1, len(args) // (jobs * 4))))
+        else:
+            results = [analyze_file(*a) for a in args]
+
+        analyzed, reanalyzed = {}, 0
+        for (path, size, mtime_ns, _), result in zip(todo, results):
+            if result.get('unchanged'):
+                # فقط mtime عوض شده (مثلاً کپی دوباره فایل)؛ متادیتای قبلی معتبر است
+                entry = dict(previous[path])
+            else:
+                entry = {field: result.get(field) for field in METADATA_FIELDS}
+                entry['sha256'] = result['sha256']
+                entry['loudness'] = ffmpeg is not None
+                reanalyzed += 1
+            entry['size'] = size
+            entry['mtime_ns'] = mtime_ns
+            analyzed[path] = entry
+        return analyzed, reanalyzed
+
+    def write_manifest(self, path, entries):
+        data = {
+            'version': MANIFEST_VERSION,
+            'generated_at': timezone.now().isoformat(),
+            'files': entries,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp, path)
+
+    def sync_db(self, entries):
+        now = timezone.now()
+        stimuli = {s.path: s for s in Stimulus.objects.all()}
+        to_create, to_update = [], []
+        for path, entry in entries.items():
+            values = {field: entry.get(field) for field in METADATA_FIELDS}
+            values['byte_size'] = entry['size']
+            values['content_hash'] = entry['sha256']
+            stimulus = stimuli.get(path)
+            if stimulus is None:
+                category = category_of(path)
+                valence_class, arousal_class = Stimulus.classes_from_category(category)
+                to_create.append(Stimulus(
+                    path=path, category=category, valence_class=valence_class,
+                    arousal_class=arousal_class, analyzed_at=now, **values,
+                ))
+            elif any(getattr(stimulus, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(stimulus, field, value)
+                stimulus.analyzed_at = now
+                to_update.append(stimulus)
+
+        with transaction.atomic():
+            Stimulus.objects.bulk_create(to_create, batch_size=500)
+            Stimulus.objects.bulk_update(
+                to_update, list(METADATA_FIELDS) + ['byte_size', 'content_hash', 'analyzed_at'], batch_size=500,
+            )
+            # bulk_create/bulk_update سیگنال post_save نمی‌فرستند
+            if to_create or to_update:
+                invalidate_catalog()
+        return len(to_create), len(to_update)
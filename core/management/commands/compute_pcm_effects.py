@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import PCMEffect
+
+
+class Command(BaseCommand):
+    help = (
+        "محاسبه اثرهای PCM (قابل انتظار در برابر غیرقابل انتظار) برای همه شرکت‌کنندگان و کل گروه "
+        "و ذخیره آن‌ها در جدول PCMEffect. جدول قبلی در یک تراکنش جایگزین می‌شود."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bootstrap', type=int, default=2000, help='تعداد تکرار bootstrap برای فاصله اطمینان')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--trim', type=float, default=0.1, help='نسبت پیراستن از هر طرف برای میانگین پیراسته')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['trim'] < 0.5:
+            raise CommandError('--trim باید بین 0 و 0.5 باشد.')
+        try:
+            from core.analysis import compute_effects, load_trials
+        except ImportError:
+            raise CommandError('برای محاسبه اثرها بسته numpy لازم است (pip install numpy).') from None
+
+        start = time.perf_counter()
+        trials = load_trials()
+        loaded = time.perf_counter()
+        rows = compute_effects(trials, n_boot=options['bootstrap'], seed=options['seed'], trim=options['trim'])
+        computed = time.perf_counter()
+
+        with transaction.atomic():
+            PCMEffect.objects.all().delete()
+            PCMEffect.objects.bulk_create(
+                [PCMEffect(**vars(row)) for row in rows],
+                batch_size=options['batch_size'],
+            )
+        saved = time.perf_counter()
+
+        self.stdout.write(
+            f'{len(trials.user)} تریال از {trials.participants} شرکت‌کننده: '
+            f'خواندن {loaded - start:.3f}، محاسبه {computed - loaded:.3f}، ذخیره {saved - computed:.3f} ثانیه'
+        )
+        self.stdout.write(self.style.SUCCESS(f'{len(rows)} ردیف اثر ذخیره شد.'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import CustomUser, ParticipantProgress
+
+
+class Command(BaseCommand):
+    help = "بازسازی جدول ParticipantProgress از جداول پاسخ (برای همه کاربران یا کاربران مشخص‌شده)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='شماره موبایل کاربران؛ خالی یعنی همه')
+        parser.add_argument('--check', action='store_true', help='فقط گزارش اختلاف، بدون ذخیره')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        fields = [f.name for f in ParticipantProgress._meta.concrete_fields if f.name not in ('user', 'updated_at')]
+        mismatched = 0
+        total = 0
+        for user in users.iterator():
+            total += 1
+            with transaction.atomic():
+                current = ParticipantProgress.objects.select_for_update().filter(user=user).first()
+                if options['check']:
+                    rebuilt = ParticipantProgress.from_responses(user)
+                else:
+                    rebuilt = ParticipantProgress.rebuild(user)
+            if current is None or any(getattr(current, f) != getattr(rebuilt, f) for f in fields):
+                mismatched += 1
+                self.stdout.write(f'{user.username}: {"missing" if current is None else "out of sync"}')
+
+        action = 'بررسی شد' if options['check'] else 'بازسازی شد'
+        self.stdout.write(self.style.SUCCESS(f'{total} کاربر {action}؛ {mismatched} مورد اختلاف داشت.'))
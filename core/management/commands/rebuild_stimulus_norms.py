@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import StimulusNorm
+
+COUNTER_FIELDS = ['n_responses'] + [
+    f'{prefix}_{metric}' for metric in StimulusNorm.METRICS for prefix in ('n', 'sum', 'sumsq')
+]
+
+
+class Command(BaseCommand):
+    help = "تطبیق جدول StimulusNorm با جداول پاسخ رتبه‌بندی (RatingMainResponse و RatingResponse)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='*', help='منبع‌ها (pcm / rating)؛ خالی یعنی همه')
+        parser.add_argument('--check', action='store_true', help='فقط گزارش اختلاف، بدون ذخیره')
+
+    def handle(self, *args, **options):
+        sources = options['sources'] or list(StimulusNorm.SOURCES)
+        unknown = set(sources) - set(StimulusNorm.SOURCES)
+        if unknown:
+            raise CommandError(f'منبع نامعتبر: {", ".join(sorted(unknown))}')
+        mismatched = 0
+        total = 0
+        for source in sources:
+            with transaction.atomic():
+                current = {
+                    (norm.stimulus, norm.stimulus_file): norm
+                    for norm in StimulusNorm.objects.select_for_update().filter(source=source)
+                }
+                rebuilt = {(norm.stimulus, norm.stimulus_file): norm for norm in StimulusNorm.from_responses(source)}
+
+                to_create, to_update, stale = [], [], []
+                for key, norm in rebuilt.items():
+                    existing = current.get(key)
+                    if existing is None:
+                        to_create.append(norm)
+                    elif any(getattr(existing, f) != getattr(norm, f) for f in COUNTER_FIELDS):
+                        for f in COUNTER_FIELDS:
+                            setattr(existing, f, getattr(norm, f))
+                        to_update.append(existing)
+                for key, norm in current.items():
+                    if key not in rebuilt and norm.n_responses:
+                        stale.append(norm)
+
+                for label, norms in (('missing', to_create), ('out of sync', to_update), ('stale', stale)):
+                    for norm in norms:
+                        self.stdout.write(f'{source} {norm.stimulus} {norm.stimulus_file}: {label}')
+                total += len(rebuilt)
+                mismatched += len(to_create) + len(to_update) + len(stale)
+
+                if not options['check']:
+                    StimulusNorm.objects.bulk_create(to_create, batch_size=500)
+                    StimulusNorm.objects.bulk_update(to_update, COUNTER_FIELDS, batch_size=500)
+                    StimulusNorm.objects.filter(pk__in=[norm.pk for norm in stale]).delete()
+
+        action = 'بررسی شد' if options['check'] else 'بازسازی شد'
+        self.stdout.write(self.style.SUCCESS(f'{total} محرک {action}؛ {mismatched} مورد اختلاف داشت.'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_pcmcatchresponse_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PCMSessionPlan',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pcm_session_plan', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveIntegerField(default=1, verbose_name='نسخه پلن')),
+                ('seed', models.PositiveBigIntegerField(verbose_name='seed')),
+                ('revision', models.PositiveIntegerField(default=0, verbose_name='شماره بازسازی')),
+                ('stage', models.CharField(choices=[('valence_practice', '1) تمرین خوشایندی'), ('seq_practice', '2) تمرین توالی'), ('pcm_main', '3) آزمون اصلی'), ('rating_practice', '4) تمرین رتبه\u200cبندی'), ('rating_main', '5) رتبه\u200cبندی'), ('failed', 'رد شده'), ('done', 'پایان')], max_length=30, verbose_name='مرحله')),
+                ('block', models.PositiveIntegerField(default=1, verbose_name='شماره بلاک')),
+                ('plan', models.JSONField(default=dict, verbose_name='پلن')),
+                ('cursor', models.JSONField(default=dict, verbose_name='پیشرفت در پلن')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'پلن جلسه PCM',
+                'verbose_name_plural': 'پلن\u200cهای جلسه PCM',
+            },
+        ),
+    ]
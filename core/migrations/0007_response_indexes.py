@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_pcmsessionplan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pcmcatchresponse',
+            index=models.Index(fields=['user', 'block', 'is_correct'], name='pcm_catch_user_blk_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pcmmainresponse',
+            index=models.Index(fields=['user', 'block', 'is_consistent'], name='pcm_main_user_blk_cons_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pcmmainresponse',
+            index=models.Index(fields=['user', 'created_at'], name='pcm_main_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pcmsequencecatchresponse',
+            index=models.Index(fields=['user', 'block', 'is_active', 'is_correct'], name='pcm_seqcatch_user_blk_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pcmsequencepracticeresponse',
+            index=models.Index(fields=['user', 'block', 'trial', 'is_active'], name='pcm_seqprac_user_blk_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ratingmainresponse',
+            index=models.Index(fields=['user', 'valence', 'arousal'], name='rating_main_user_va_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ratingresponse',
+            index=models.Index(fields=['user', 'valence', 'arousal'], name='rating_user_va_idx'),
+        ),
+    ]
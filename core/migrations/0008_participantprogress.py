@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_response_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticipantProgress',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='participant_progress', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('valence_practice', models.PositiveIntegerField(default=0, verbose_name='1) تمرین خوشایندی')),
+                ('seq_blocks', models.JSONField(default=dict, verbose_name='2) تمرین توالی (هر بلاک)')),
+                ('pcm_blocks', models.JSONField(default=dict, verbose_name='3) آزمون اصلی (هر بلاک)')),
+                ('pcm_rating_practice', models.PositiveIntegerField(default=0, verbose_name='4) تمرین رتبه\u200cبندی')),
+                ('pcm_rating_main', models.PositiveIntegerField(default=0, verbose_name='5) رتبه\u200cبندی کامل')),
+                ('rating_practice', models.PositiveIntegerField(default=0, verbose_name='تمرین رتبه\u200cبندی (آزمون رتبه\u200cبندی)')),
+                ('rating_main', models.PositiveIntegerField(default=0, verbose_name='رتبه\u200cبندی کامل (آزمون رتبه\u200cبندی)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'پیشرفت شرکت\u200cکننده',
+                'verbose_name_plural': 'پیشرفت شرکت\u200cکنندگان',
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_participantprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stimulus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True, verbose_name='مسیر فایل (نسبت به static/sounds)')),
+                ('category', models.CharField(db_index=True, max_length=30, verbose_name='دسته')),
+                ('valence_class', models.CharField(blank=True, choices=[('HP', 'خوشایند'), ('MP', 'خنثی'), ('LP', 'ناخوشایند')], max_length=2, verbose_name='کلاس خوشایندی')),
+                ('arousal_class', models.CharField(blank=True, choices=[('HA', 'برانگیختگی بالا'), ('MA', 'برانگیختگی متوسط'), ('LA', 'برانگیختگی پایین')], max_length=2, verbose_name='کلاس برانگیختگی')),
+                ('duration', models.FloatField(blank=True, null=True, verbose_name='مدت (ثانیه)')),
+                ('byte_size', models.PositiveIntegerField(blank=True, null=True, verbose_name='حجم (بایت)')),
+                ('content_hash', models.CharField(blank=True, max_length=64, verbose_name='هش محتوا')),
+                ('is_active', models.BooleanField(default=True, verbose_name='فعال/غیرفعال')),
+            ],
+            options={
+                'verbose_name': 'محرک صوتی',
+                'verbose_name_plural': 'محرک\u200cهای صوتی',
+                'ordering': ['path'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StimulusSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(unique=True, verbose_name='نام')),
+                ('description', models.CharField(blank=True, max_length=255, verbose_name='توضیحات')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'مجموعه محرک',
+                'verbose_name_plural': 'مجموعه\u200cهای محرک',
+            },
+        ),
+        migrations.CreateModel(
+            name='StimulusSetMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='ترتیب')),
+                ('stimulus', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='memberships', to='core.stimulus')),
+                ('stimulus_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='core.stimulusset')),
+            ],
+            options={
+                'verbose_name': 'عضو مجموعه محرک',
+                'verbose_name_plural': 'اعضای مجموعه محرک',
+                'ordering': ['stimulus_set', 'position'],
+                'unique_together': {('stimulus_set', 'stimulus')},
+            },
+        ),
+        migrations.AddField(
+            model_name='stimulusset',
+            name='stimuli',
+            field=models.ManyToManyField(related_name='sets', through='core.StimulusSetMember', to='core.stimulus'),
+        ),
+    ]
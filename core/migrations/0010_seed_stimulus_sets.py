@@ -0,0 +1,129 @@
+from django.db import migrations
+
+# مجموعه‌های اولیه همان لیست‌های ثابتی هستند که قبلاً در core/views.py بودند
+STIMULUS_SETS = {
+    'cues': [
+        'CUE/1/1.mp3', 'CUE/2/2.mp3', 'CUE/3/3.mp3',
+    ],
+    'pcm_neutral': [
+        '5-MP-MA/102.mp3', '5-MP-MA/152.mp3', '5-MP-MA/170.mp3', '5-MP-MA/246.mp3', '5-MP-MA/320.mp3', '5-MP-MA/322.mp3',
+        '5-MP-MA/358.mp3', '5-MP-MA/361.mp3', '5-MP-MA/364.mp3', '5-MP-MA/368.mp3', '5-MP-MA/370.mp3', '5-MP-MA/373.mp3',
+        '5-MP-MA/374.mp3', '5-MP-MA/375.mp3', '5-MP-MA/376.mp3', '5-MP-MA/382.mp3', '5-MP-MA/403.mp3', '5-MP-MA/410.mp3',
+        '5-MP-MA/425.mp3', '5-MP-MA/698.mp3', '5-MP-MA/701.mp3', '5-MP-MA/705.mp3', '5-MP-MA/722.mp3', '5-MP-MA/724.mp3',
+    ],
+    'pcm_negative': [
+        '7-LP-HA/106.mp3', '7-LP-HA/115.mp3', '7-LP-HA/116.mp3', '7-LP-HA/133.mp3', '7-LP-HA/244.mp3', '7-LP-HA/255.mp3',
+        '7-LP-HA/260.mp3', '7-LP-HA/261.mp3', '7-LP-HA/275.mp3', '7-LP-HA/276.mp3', '7-LP-HA/277.mp3', '7-LP-HA/278.mp3',
+        '7-LP-HA/279.mp3', '7-LP-HA/282.mp3', '7-LP-HA/283.mp3', '7-LP-HA/284.mp3', '7-LP-HA/285.mp3', '7-LP-HA/286.mp3',
+        '7-LP-HA/288.mp3', '7-LP-HA/289.mp3', '7-LP-HA/290.mp3', '7-LP-HA/292.mp3', '7-LP-HA/296.mp3', '7-LP-HA/310.mp3',
+        '7-LP-HA/380.mp3', '7-LP-HA/420.mp3', '7-LP-HA/422.mp3', '7-LP-HA/423.mp3', '7-LP-HA/424.mp3', '7-LP-HA/501.mp3',
+        '7-LP-HA/502.mp3', '7-LP-HA/600.mp3', '7-LP-HA/624.mp3', '7-LP-HA/625.mp3', '7-LP-HA/626.mp3', '7-LP-HA/699.mp3',
+        '7-LP-HA/711.mp3', '7-LP-HA/712.mp3', '7-LP-HA/713.mp3', '7-LP-HA/714.mp3', '7-LP-HA/730.mp3', '7-LP-HA/732.mp3',
+        '8-LP-MA/241.mp3', '8-LP-MA/242.mp3', '8-LP-MA/280.mp3', '8-LP-MA/293.mp3', '8-LP-MA/295.mp3', '8-LP-MA/611.mp3',
+    ],
+    'pcm_rating': [
+        '5-MP-MA/102.mp3', '5-MP-MA/152.mp3', '5-MP-MA/170.mp3', '5-MP-MA/246.mp3', '5-MP-MA/320.mp3', '5-MP-MA/322.mp3',
+        '5-MP-MA/358.mp3', '5-MP-MA/361.mp3', '5-MP-MA/364.mp3', '5-MP-MA/368.mp3', '5-MP-MA/370.mp3', '5-MP-MA/373.mp3',
+        '5-MP-MA/374.mp3', '5-MP-MA/375.mp3', '5-MP-MA/376.mp3', '5-MP-MA/382.mp3', '5-MP-MA/403.mp3', '5-MP-MA/410.mp3',
+        '5-MP-MA/425.mp3', '5-MP-MA/698.mp3', '5-MP-MA/701.mp3', '5-MP-MA/705.mp3', '5-MP-MA/722.mp3', '5-MP-MA/724.mp3',
+        '7-LP-HA/106.mp3', '7-LP-HA/115.mp3', '7-LP-HA/116.mp3', '7-LP-HA/133.mp3', '7-LP-HA/244.mp3', '7-LP-HA/255.mp3',
+        '7-LP-HA/260.mp3', '7-LP-HA/261.mp3', '7-LP-HA/275.mp3', '7-LP-HA/276.mp3', '7-LP-HA/277.mp3', '7-LP-HA/278.mp3',
+        '7-LP-HA/279.mp3', '7-LP-HA/282.mp3', '7-LP-HA/283.mp3', '7-LP-HA/284.mp3', '7-LP-HA/285.mp3', '7-LP-HA/286.mp3',
+        '7-LP-HA/288.mp3', '7-LP-HA/289.mp3', '7-LP-HA/290.mp3', '7-LP-HA/292.mp3', '7-LP-HA/296.mp3', '7-LP-HA/310.mp3',
+        '7-LP-HA/380.mp3', '7-LP-HA/420.mp3', '7-LP-HA/422.mp3', '7-LP-HA/423.mp3', '7-LP-HA/424.mp3', '7-LP-HA/501.mp3',
+        '7-LP-HA/502.mp3', '7-LP-HA/600.mp3', '7-LP-HA/624.mp3', '7-LP-HA/625.mp3', '7-LP-HA/626.mp3', '7-LP-HA/699.mp3',
+        '7-LP-HA/711.mp3', '7-LP-HA/712.mp3', '7-LP-HA/713.mp3', '7-LP-HA/714.mp3', '7-LP-HA/730.mp3', '7-LP-HA/732.mp3',
+        '8-LP-MA/241.mp3', '8-LP-MA/242.mp3', '8-LP-MA/280.mp3', '8-LP-MA/293.mp3', '8-LP-MA/295.mp3', '8-LP-MA/611.mp3',
+    ],
+    'rating_practice': [
+        '0-practice/1.mp3', '0-practice/2.mp3', '0-practice/3.mp3', '0-practice/4.mp3', '0-practice/5.mp3', '0-practice/6.mp3',
+        '0-practice/7.mp3', '0-practice/8.mp3', '0-practice/9.mp3', '0-practice/10.mp3',
+    ],
+    'rating_main': [
+        '1-HP-HA/110.mp3', '1-HP-HA/200.mp3', '1-HP-HA/201.mp3', '1-HP-HA/202.mp3', '1-HP-HA/205.mp3', '1-HP-HA/215.mp3',
+        '1-HP-HA/220.mp3', '1-HP-HA/311.mp3', '1-HP-HA/352.mp3', '1-HP-HA/353.mp3', '1-HP-HA/355.mp3', '1-HP-HA/360.mp3',
+        '1-HP-HA/363.mp3', '1-HP-HA/365.mp3', '1-HP-HA/366.mp3', '1-HP-HA/367.mp3', '1-HP-HA/378.mp3', '1-HP-HA/415.mp3',
+        '1-HP-HA/716.mp3', '1-HP-HA/717.mp3', '1-HP-HA/808.mp3', '1-HP-HA/815.mp3', '1-HP-HA/817.mp3', '2-HP-MA/109.mp3',
+        '2-HP-MA/111.mp3', '2-HP-MA/112.mp3', '2-HP-MA/150.mp3', '2-HP-MA/151.mp3', '2-HP-MA/206.mp3', '2-HP-MA/221.mp3',
+        '2-HP-MA/224.mp3', '2-HP-MA/226.mp3', '2-HP-MA/230.mp3', '2-HP-MA/254.mp3', '2-HP-MA/270.mp3', '2-HP-MA/351.mp3',
+        '2-HP-MA/400.mp3', '2-HP-MA/601.mp3', '2-HP-MA/721.mp3', '2-HP-MA/725.mp3', '2-HP-MA/726.mp3', '2-HP-MA/802.mp3',
+        '2-HP-MA/810.mp3', '2-HP-MA/811.mp3', '2-HP-MA/813.mp3', '2-HP-MA/816.mp3', '2-HP-MA/820.mp3', '2-HP-MA/826.mp3',
+        '3-HP-LA/172.mp3', '3-HP-LA/809.mp3', '3-HP-LA/812.mp3', '4-MP-HA/114.mp3', '4-MP-HA/204.mp3', '4-MP-HA/210.mp3',
+        '4-MP-HA/216.mp3', '4-MP-HA/610.mp3', '4-MP-HA/704.mp3', '4-MP-HA/710.mp3', '4-MP-HA/715.mp3', '5-MP-MA/102.mp3',
+        '5-MP-MA/104.mp3', '5-MP-MA/107.mp3', '5-MP-MA/111.mp3', '5-MP-MA/113.mp3', '5-MP-MA/120.mp3', '5-MP-MA/130.mp3',
+        '5-MP-MA/132.mp3', '5-MP-MA/152.mp3', '5-MP-MA/170.mp3', '5-MP-MA/225.mp3', '5-MP-MA/245.mp3', '5-MP-MA/246.mp3',
+        '5-MP-MA/251.mp3', '5-MP-MA/252.mp3', '5-MP-MA/320.mp3', '5-MP-MA/322.mp3', '5-MP-MA/358.mp3', '5-MP-MA/361.mp3',
+        '5-MP-MA/364.mp3', '5-MP-MA/368.mp3', '5-MP-MA/370.mp3', '5-MP-MA/373.mp3', '5-MP-MA/374.mp3', '5-MP-MA/375.mp3',
+        '5-MP-MA/376.mp3', '5-MP-MA/382.mp3', '5-MP-MA/403.mp3', '5-MP-MA/410.mp3', '5-MP-MA/425.mp3', '5-MP-MA/500.mp3',
+        '5-MP-MA/627.mp3', '5-MP-MA/698.mp3', '5-MP-MA/700.mp3', '5-MP-MA/701.mp3', '5-MP-MA/702.mp3', '5-MP-MA/705.mp3',
+        '5-MP-MA/706.mp3', '5-MP-MA/720.mp3', '5-MP-MA/722.mp3', '5-MP-MA/723.mp3', '5-MP-MA/724.mp3', '5-MP-MA/728.mp3',
+        '5-MP-MA/729.mp3', '6-MP-LA/171.mp3', '6-MP-LA/262.mp3', '6-MP-LA/377.mp3', '6-MP-LA/602.mp3', '6-MP-LA/708.mp3',
+        '7-LP-HA/105.mp3', '7-LP-HA/106.mp3', '7-LP-HA/115.mp3', '7-LP-HA/116.mp3', '7-LP-HA/133.mp3', '7-LP-HA/134.mp3',
+        '7-LP-HA/244.mp3', '7-LP-HA/255.mp3', '7-LP-HA/260.mp3', '7-LP-HA/261.mp3', '7-LP-HA/275.mp3', '7-LP-HA/276.mp3',
+        '7-LP-HA/277.mp3', '7-LP-HA/278.mp3', '7-LP-HA/279.mp3', '7-LP-HA/281.mp3', '7-LP-HA/282.mp3', '7-LP-HA/283.mp3',
+        '7-LP-HA/284.mp3', '7-LP-HA/285.mp3', '7-LP-HA/286.mp3', '7-LP-HA/288.mp3', '7-LP-HA/289.mp3', '7-LP-HA/290.mp3',
+        '7-LP-HA/292.mp3', '7-LP-HA/296.mp3', '7-LP-HA/310.mp3', '7-LP-HA/312.mp3', '7-LP-HA/319.mp3', '7-LP-HA/380.mp3',
+        '7-LP-HA/420.mp3', '7-LP-HA/422.mp3', '7-LP-HA/423.mp3', '7-LP-HA/424.mp3', '7-LP-HA/501.mp3', '7-LP-HA/502.mp3',
+        '7-LP-HA/600.mp3', '7-LP-HA/624.mp3', '7-LP-HA/625.mp3', '7-LP-HA/626.mp3', '7-LP-HA/699.mp3', '7-LP-HA/709.mp3',
+        '7-LP-HA/711.mp3', '7-LP-HA/712.mp3', '7-LP-HA/713.mp3', '7-LP-HA/714.mp3', '7-LP-HA/719.mp3', '7-LP-HA/730.mp3',
+        '7-LP-HA/732.mp3', '7-LP-HA/910.mp3', '8-LP-MA/241.mp3', '8-LP-MA/242.mp3', '8-LP-MA/243.mp3', '8-LP-MA/250.mp3',
+        '8-LP-MA/280.mp3', '8-LP-MA/293.mp3', '8-LP-MA/295.mp3', '8-LP-MA/611.mp3', '8-LP-MA/703.mp3',
+    ],
+}
+
+DESCRIPTIONS = {
+    'cues': 'صداهای cue آزمون PCM',
+    'pcm_neutral': 'صداهای خنثی PCM (مراحل ۱ تا ۳)',
+    'pcm_negative': 'صداهای منفی PCM (مراحل ۱ تا ۳)',
+    'pcm_rating': 'رتبه‌بندی پایانی PCM (مرحله ۵)',
+    'rating_practice': 'تمرین رتبه‌بندی (مرحله ۴ و آزمون رتبه‌بندی)',
+    'rating_main': 'آزمون رتبه‌بندی همه صداها',
+}
+
+
+def seed_stimulus_sets(apps, schema_editor):
+    Stimulus = apps.get_model('core', 'Stimulus')
+    StimulusSet = apps.get_model('core', 'StimulusSet')
+    StimulusSetMember = apps.get_model('core', 'StimulusSetMember')
+
+    paths = sorted({path for files in STIMULUS_SETS.values() for path in files})
+    stimuli = []
+    for path in paths:
+        category = path.split('/')[0]
+        parts = category.split('-')
+        valence_class, arousal_class = (parts[1], parts[2]) if len(parts) == 3 else ('', '')
+        stimuli.append(Stimulus(
+            path=path, category=category, valence_class=valence_class, arousal_class=arousal_class,
+        ))
+    Stimulus.objects.bulk_create(stimuli, ignore_conflicts=True)
+    by_path = {s.path: s for s in Stimulus.objects.filter(path__in=paths)}
+
+    for name, files in STIMULUS_SETS.items():
+        stimulus_set, _ = StimulusSet.objects.get_or_create(
+            name=name, defaults={'description': DESCRIPTIONS[name]}
+        )
+        StimulusSetMember.objects.bulk_create(
+            [
+                StimulusSetMember(stimulus_set=stimulus_set, stimulus=by_path[path], position=position)
+                for position, path in enumerate(files)
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def unseed_stimulus_sets(apps, schema_editor):
+    StimulusSet = apps.get_model('core', 'StimulusSet')
+    Stimulus = apps.get_model('core', 'Stimulus')
+    StimulusSet.objects.filter(name__in=STIMULUS_SETS).delete()
+    Stimulus.objects.filter(sets__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_stimulus_catalog'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_stimulus_sets, unseed_stimulus_sets),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_seed_stimulus_sets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stimulus',
+            name='analyzed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='زمان تحلیل'),
+        ),
+        migrations.AddField(
+            model_name='stimulus',
+            name='bitrate',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='bitrate (bps)'),
+        ),
+        migrations.AddField(
+            model_name='stimulus',
+            name='channels',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='تعداد کانال'),
+        ),
+        migrations.AddField(
+            model_name='stimulus',
+            name='lufs',
+            field=models.FloatField(blank=True, null=True, verbose_name='بلندی (LUFS)'),
+        ),
+        migrations.AddField(
+            model_name='stimulus',
+            name='rms_db',
+            field=models.FloatField(blank=True, null=True, verbose_name='RMS (dBFS)'),
+        ),
+        migrations.AddField(
+            model_name='stimulus',
+            name='sample_rate',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='sample rate (Hz)'),
+        ),
+    ]
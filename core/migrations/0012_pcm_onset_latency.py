@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_stimulus_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pcmcatchresponse',
+            name='audio_engine',
+            field=models.CharField(blank=True, choices=[('webaudio', 'Web Audio (پیش\u200cبارگذاری\u200cشده)'), ('element', 'HTML audio')], max_length=10, null=True, verbose_name='موتور پخش'),
+        ),
+        migrations.AddField(
+            model_name='pcmcatchresponse',
+            name='cue_onset_latency',
+            field=models.FloatField(blank=True, null=True, verbose_name='تاخیر شروع پخش cue (ms)'),
+        ),
+        migrations.AddField(
+            model_name='pcmmainresponse',
+            name='audio_engine',
+            field=models.CharField(blank=True, choices=[('webaudio', 'Web Audio (پیش\u200cبارگذاری\u200cشده)'), ('element', 'HTML audio')], max_length=10, null=True, verbose_name='موتور پخش'),
+        ),
+        migrations.AddField(
+            model_name='pcmmainresponse',
+            name='cue_onset_latency',
+            field=models.FloatField(blank=True, null=True, verbose_name='تاخیر شروع پخش cue (ms)'),
+        ),
+        migrations.AddField(
+            model_name='pcmmainresponse',
+            name='stim1_onset_latency',
+            field=models.FloatField(blank=True, null=True, verbose_name='تاخیر شروع پخش محرک اول (ms)'),
+        ),
+        migrations.AddField(
+            model_name='pcmmainresponse',
+            name='stim2_onset_latency',
+            field=models.FloatField(blank=True, null=True, verbose_name='تاخیر شروع پخش محرک دوم (ms)'),
+        ),
+    ]
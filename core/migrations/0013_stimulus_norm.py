@@ -0,0 +1,78 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:30
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+METRICS = ('valence', 'valence_rt', 'arousal', 'arousal_rt')
+SOURCES = {
+    'pcm': ('RatingMainResponse', 'stimulus_number'),
+    'rating': ('RatingResponse', 'stimulus'),
+}
+
+
+def populate_stimulus_norms(apps, schema_editor):
+    """پر کردن اولیه جدول از پاسخ‌های موجود (همان محاسبه StimulusNorm.from_responses)"""
+    StimulusNorm = apps.get_model('core', 'StimulusNorm')
+    aggregates = {'n_responses': Count('pk')}
+    for metric in METRICS:
+        aggregates[f'n_{metric}'] = Count(metric)
+        aggregates[f'sum_{metric}'] = Sum(metric)
+        aggregates[f'sumsq_{metric}'] = Sum(F(metric) * F(metric))
+
+    norms = []
+    for source, (model_name, field) in SOURCES.items():
+        rows = (
+            apps.get_model('core', model_name).objects.order_by()
+            .annotate(file=Coalesce('stimulus_file', Value('')))
+            .values(field, 'file')
+            .annotate(**aggregates)
+        )
+        for row in rows:
+            norms.append(StimulusNorm(
+                source=source,
+                stimulus=row.pop(field),
+                stimulus_file=row.pop('file'),
+                **{name: value or 0 for name, value in row.items()},
+            ))
+    StimulusNorm.objects.bulk_create(norms, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_pcm_onset_latency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StimulusNorm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('pcm', 'آزمون PCM - رتبه\u200cبندی مرحله ۵'), ('rating', 'آزمون رتبه\u200cبندی')], max_length=10, verbose_name='منبع')),
+                ('stimulus', models.CharField(max_length=50, verbose_name='محرک')),
+                ('stimulus_file', models.CharField(blank=True, default='', max_length=200, verbose_name='فایل محرک')),
+                ('n_responses', models.IntegerField(default=0, verbose_name='تعداد پاسخ')),
+                ('n_valence', models.IntegerField(default=0)),
+                ('sum_valence', models.BigIntegerField(default=0)),
+                ('sumsq_valence', models.BigIntegerField(default=0)),
+                ('n_valence_rt', models.IntegerField(default=0)),
+                ('sum_valence_rt', models.BigIntegerField(default=0)),
+                ('sumsq_valence_rt', models.BigIntegerField(default=0)),
+                ('n_arousal', models.IntegerField(default=0)),
+                ('sum_arousal', models.BigIntegerField(default=0)),
+                ('sumsq_arousal', models.BigIntegerField(default=0)),
+                ('n_arousal_rt', models.IntegerField(default=0)),
+                ('sum_arousal_rt', models.BigIntegerField(default=0)),
+                ('sumsq_arousal_rt', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'هنجار محرک',
+                'verbose_name_plural': 'هنجارهای محرک\u200cها',
+                'ordering': ['source', 'stimulus'],
+                'unique_together': {('source', 'stimulus', 'stimulus_file')},
+            },
+        ),
+        migrations.RunPython(populate_stimulus_norms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_stimulus_norm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PCMEffect',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measure', models.CharField(max_length=40, verbose_name='سنجه')),
+                ('scope', models.CharField(max_length=60, verbose_name='دامنه')),
+                ('n_expected', models.IntegerField(default=0, verbose_name='تعداد قابل انتظار')),
+                ('n_unexpected', models.IntegerField(default=0, verbose_name='تعداد غیرقابل انتظار')),
+                ('expected', models.FloatField(blank=True, null=True, verbose_name='قابل انتظار')),
+                ('unexpected', models.FloatField(blank=True, null=True, verbose_name='غیرقابل انتظار')),
+                ('delta', models.FloatField(blank=True, null=True, verbose_name='تفاوت (غیرقابل انتظار - قابل انتظار)')),
+                ('ci_low', models.FloatField(blank=True, null=True, verbose_name='حد پایین فاصله اطمینان')),
+                ('ci_high', models.FloatField(blank=True, null=True, verbose_name='حد بالای فاصله اطمینان')),
+                ('computed_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان محاسبه')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pcm_effects', to=settings.AUTH_USER_MODEL, verbose_name='کاربر')),
+            ],
+            options={
+                'verbose_name': 'اثر PCM',
+                'verbose_name_plural': 'اثرهای PCM',
+                'ordering': ['measure', 'scope', 'user'],
+                'indexes': [models.Index(fields=['measure', 'scope'], name='core_pcmeff_measure_6f5216_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:41
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_pcm_effect'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedbacksettings',
+            name='rating_practice_trials',
+            field=models.PositiveIntegerField(default=10, verbose_name='تعداد تریال تمرین رتبه\u200cبندی'),
+        ),
+        migrations.AddField(
+            model_name='feedbacksettings',
+            name='response_timeout',
+            field=models.PositiveIntegerField(default=3000, verbose_name='مهلت پاسخ (میلی\u200cثانیه)'),
+        ),
+        migrations.AddField(
+            model_name='feedbacksettings',
+            name='seq_max_blocks',
+            field=models.PositiveIntegerField(default=3, validators=[django.core.validators.MinValueValidator(1)], verbose_name='حداکثر تعداد بلاک تمرین توالی'),
+        ),
+        migrations.AddField(
+            model_name='feedbacksettings',
+            name='seq_practice_trials',
+            field=models.PositiveIntegerField(default=30, verbose_name='تعداد تریال تمرین توالی در هر بلاک'),
+        ),
+        migrations.AddField(
+            model_name='feedbacksettings',
+            name='seq_threshold',
+            field=models.FloatField(default=0.8, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)], verbose_name='حداقل دقت catch برای عبور از تمرین توالی'),
+        ),
+        migrations.AddField(
+            model_name='feedbacksettings',
+            name='valence_practice_trials',
+            field=models.PositiveIntegerField(default=9, verbose_name='تعداد تریال تمرین خوشایندی'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:59
+
+import itertools
+
+from django.db import migrations, models
+
+# همان planning.CUE_PERMUTATIONS و views.MAPPING_CUES در زمان این migration
+CUES = ('/static/sounds/CUE/1/1.mp3', '/static/sounds/CUE/2/2.mp3', '/static/sounds/CUE/3/3.mp3')
+PERMUTATIONS = tuple(itertools.permutations(('Negative-Neutral', 'Neutral-Negative', 'Neutral-Neutral')))
+
+
+def seed_assignments(apps, schema_editor):
+    """شمارنده‌ها از نگاشت کاربران موجود (تا اینجا همه نگاشت ثابت = جایگشت 0) مقداردهی می‌شوند"""
+    PCMCueMapping = apps.get_model('core', 'PCMCueMapping')
+    PCMCueAssignment = apps.get_model('core', 'PCMCueAssignment')
+    index = {permutation: i for i, permutation in enumerate(PERMUTATIONS)}
+    assigned = [0] * len(PERMUTATIONS)
+    for mapping in PCMCueMapping.objects.values_list('mapping', flat=True).iterator():
+        i = index.get(tuple((mapping or {}).get(cue) for cue in CUES))
+        if i is not None:
+            assigned[i] += 1
+    PCMCueAssignment.objects.bulk_create(
+        [PCMCueAssignment(permutation=i, assigned=n) for i, n in enumerate(assigned)]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_telemetry_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PCMCueAssignment',
+            fields=[
+                ('permutation', models.PositiveSmallIntegerField(primary_key=True, serialize=False, verbose_name='شماره جایگشت')),
+                ('assigned', models.PositiveIntegerField(default=0, verbose_name='تعداد تخصیص')),
+            ],
+            options={
+                'verbose_name': 'شمارنده counterbalancing کیوها',
+                'verbose_name_plural': 'شمارنده\u200cهای counterbalancing کیوها',
+            },
+        ),
+        migrations.RunPython(seed_assignments, migrations.RunPython.noop),
+    ]
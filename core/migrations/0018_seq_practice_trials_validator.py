@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:20
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_pcm_cue_assignment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feedbacksettings',
+            name='seq_practice_trials',
+            field=models.PositiveIntegerField(default=30, validators=[core.models.validate_seq_practice_trials], verbose_name='تعداد تریال تمرین توالی در هر بلاک'),
+        ),
+    ]
@@ -1,5 +1,15 @@
-from django.db import models
+import math
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
+
+from . import planning
 
 ###################################################################################################### 
 ###################################################################################################### 
@@ -383,7 +393,8 @@ class DeviceLog(models.Model):
     is_touch = models.BooleanField( default=False, verbose_name="دستگاه لمسی؟" )
     audio_volume = models.FloatField( null=True, blank=True, verbose_name="حجم صدای تنظیم‌شده" )
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # زمان رخداد؛ ردیف‌ها با تأخیر و دسته‌ای درج می‌شوند (core.telemetry) پس auto_now_add مناسب نیست
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     class Meta:
         verbose_name = "لاگ تغییر دستگاه"
         verbose_name_plural = "لاگ‌های تغییر دستگاه"
@@ -395,7 +406,8 @@ class DeviceLog(models.Model):
 class VolumeLog(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='volume_log')
     volume = models.PositiveIntegerField( null=True, blank=True, verbose_name="volume" )
-    created_at = models.DateTimeField(auto_now_add=True)
+    # زمان رخداد؛ ردیف‌ها با تأخیر و دسته‌ای درج می‌شوند (core.telemetry) پس auto_now_add مناسب نیست
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         verbose_name = "حجم صدا"
@@ -405,6 +417,17 @@ class VolumeLog(models.Model):
     def __str__(self):
         return f"{self.user.username} | {self.volume} "
 
+def validate_seq_practice_trials(value):
+    """
+    تمرین توالی counterbalanced است: از هر کیو به یک تعداد تریال، SEQ_INCONSISTENT_PER_CUE تای آن inconsistent،
+    و SEQ_CONSISTENT_FIRST تریال اول consistent؛ پس تعداد باید مضرب تعداد کیوها و به اندازه کافی بزرگ باشد.
+    """
+    cues = len(planning.SEQUENCES)
+    minimum = planning.SEQ_CONSISTENT_FIRST + planning.SEQ_INCONSISTENT_PER_CUE * cues
+    if value % cues or value < minimum:
+        raise ValidationError(f'تعداد تریال باید مضرب {cues} (تعداد کیوها) و حداقل {minimum} باشد.')
+
+
 class FeedbackSettings(models.Model):
     # ... فیلدهای دیگر تنظیمات ...
     FEEDBACK_MODE_CHOICES = [
@@ -438,6 +461,36 @@ class FeedbackSettings(models.Model):
         verbose_name="پاسخ‌های درست باید متوالی باشند؟"
     )
 
+    # پارامترهای آزمون (پیش‌تر ثابت‌های داخل pcm_view)؛ تغییر آن‌ها فقط روی پلن‌هایی که از این پس ساخته
+    # می‌شوند اثر دارد
+    valence_practice_trials = models.PositiveIntegerField(
+        default=9,
+        verbose_name="تعداد تریال تمرین خوشایندی"
+    )
+    response_timeout = models.PositiveIntegerField(
+        default=3000,
+        verbose_name="مهلت پاسخ (میلی‌ثانیه)"
+    )
+    seq_practice_trials = models.PositiveIntegerField(
+        default=30,
+        validators=[validate_seq_practice_trials],
+        verbose_name="تعداد تریال تمرین توالی در هر بلاک"
+    )
+    seq_threshold = models.FloatField(
+        default=0.80,
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+        verbose_name="حداقل دقت catch برای عبور از تمرین توالی"
+    )
+    seq_max_blocks = models.PositiveIntegerField(
+        default=3,
+        validators=[MinValueValidator(1)],
+        verbose_name="حداکثر تعداد بلاک تمرین توالی"
+    )
+    rating_practice_trials = models.PositiveIntegerField(
+        default=10,
+        verbose_name="تعداد تریال تمرین رتبه‌بندی"
+    )
+
     class Meta:
         verbose_name = "تنظیمات PCM"
         verbose_name_plural = "تنظیمات PCM"
@@ -546,6 +599,10 @@ class RatingResponse(models.Model):
 
     class Meta:
         unique_together = ('user', 'stimulus')  # هر کاربر فقط یک بار برای هر محرک رتبه بدهد
+        indexes = [
+            # شمارش رتبه‌بندی‌های کامل (valence و arousal پر)
+            models.Index(fields=['user', 'valence', 'arousal'], name='rating_user_va_idx'),
+        ]
         verbose_name = "A-1)Rating"
         verbose_name_plural = "A-1)Rating"
         ordering = ['-created_at']
@@ -668,6 +725,10 @@ class PCMSequencePracticeResponse(models.Model):
     class Meta:
         unique_together = ('user', 'trial', 'created_at')
         verbose_name = "B-2)SequencePractice"
+        indexes = [
+            # آخرین بلاک (order_by -block, -trial) و شمارش هر بلاک
+            models.Index(fields=['user', 'block', 'trial', 'is_active'], name='pcm_seqprac_user_blk_idx'),
+        ]
         ordering = ['created_at']
 
 
@@ -698,9 +759,19 @@ class PCMSequenceCatchResponse(models.Model):
     class Meta:
         unique_together = ('user', 'trial', 'created_at')
         verbose_name = "B-3)SequenceCatch"
+        indexes = [
+            # شمارش هر بلاک و پاسخ‌های درست آن
+            models.Index(fields=['user', 'block', 'is_active', 'is_correct'], name='pcm_seqcatch_user_blk_idx'),
+        ]
         ordering = ['created_at']
 
 # مرحله 3
+PCM_AUDIO_ENGINE_CHOICES = [
+    ('webaudio', 'Web Audio (پیش‌بارگذاری‌شده)'),
+    ('element', 'HTML audio'),
+]
+
+
 class PCMCatchResponse(models.Model):  
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     block = models.PositiveIntegerField(
@@ -722,12 +793,18 @@ class PCMCatchResponse(models.Model):
         ]
     )
     is_correct = models.BooleanField(null=True, blank=True)
+    # تاخیر شروع پخش اندازه‌گیری‌شده در مرورگر (از درخواست پخش تا خروج صدا)
+    cue_onset_latency = models.FloatField(null=True, blank=True, verbose_name="تاخیر شروع پخش cue (ms)")
+    audio_engine = models.CharField(max_length=10, null=True, blank=True, choices=PCM_AUDIO_ENGINE_CHOICES, verbose_name="موتور پخش")
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True, verbose_name="فعال/غیرفعال")
 
     class Meta:
         unique_together = ('user', 'trial', 'created_at')
         verbose_name = "B-4)PCM-Catch"
+        indexes = [
+            models.Index(fields=['user', 'block', 'is_correct'], name='pcm_catch_user_blk_idx'),
+        ]
         ordering = ['created_at']
 
 class PCMMainResponse(models.Model):
@@ -846,6 +923,11 @@ class PCMMainResponse(models.Model):
             ('touch', 'Touch'),
         ]
     )
+    # تاخیر شروع پخش اندازه‌گیری‌شده در مرورگر (از درخواست پخش تا خروج صدا)
+    cue_onset_latency = models.FloatField(null=True, blank=True, verbose_name="تاخیر شروع پخش cue (ms)")
+    stim1_onset_latency = models.FloatField(null=True, blank=True, verbose_name="تاخیر شروع پخش محرک اول (ms)")
+    stim2_onset_latency = models.FloatField(null=True, blank=True, verbose_name="تاخیر شروع پخش محرک دوم (ms)")
+    audio_engine = models.CharField(max_length=10, null=True, blank=True, choices=PCM_AUDIO_ENGINE_CHOICES, verbose_name="موتور پخش")
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="زمان ایجاد"
@@ -855,6 +937,11 @@ class PCMMainResponse(models.Model):
     class Meta:
         unique_together = ('user', 'block', 'trial')
         verbose_name = "B-5)PCM-Main"
+        indexes = [
+            # شمارش ناهمخوان‌های هر بلاک و آخرین پاسخ
+            models.Index(fields=['user', 'block', 'is_consistent'], name='pcm_main_user_blk_cons_idx'),
+            models.Index(fields=['user', 'created_at'], name='pcm_main_user_created_idx'),
+        ]
         verbose_name_plural = "B-5)PCM-Main"
         ordering = ['-created_at', 'block', 'trial']
 
@@ -943,6 +1030,9 @@ class RatingMainResponse(models.Model):  # مرحله ۵ - رتبه‌بندی
     class Meta:
         unique_together = ('user', 'stimulus_number')
         verbose_name = "B-7)Rating"
+        indexes = [
+            models.Index(fields=['user', 'valence', 'arousal'], name='rating_main_user_va_idx'),
+        ]
         ordering = ['-created_at']
 
 
@@ -955,6 +1045,504 @@ class PCMCueMapping(models.Model):
         verbose_name = "نگاشت ثابت Cue به Sequence در PCM"
 
 
+class PCMCueAssignment(models.Model):
+    """
+    شمارنده counterbalancing نگاشت Cue به Sequence: یک ردیف برای هر جایگشت planning.CUE_PERMUTATIONS.
+    هر کاربر جدید کم‌استفاده‌ترین جایگشت را می‌گیرد؛ تخصیص یک UPDATE شرطی روی یک ردیف است
+    (compare-and-swap روی assigned) و نه شمارش PCMCueMapping، پس ثبت‌نام‌های هم‌زمان شرط تکراری نمی‌گیرند.
+    """
+    ALLOCATE_ATTEMPTS = 10
+
+    permutation = models.PositiveSmallIntegerField(primary_key=True, verbose_name="شماره جایگشت")
+    assigned = models.PositiveIntegerField(default=0, verbose_name="تعداد تخصیص")
+
+    class Meta:
+        verbose_name = "شمارنده counterbalancing کیوها"
+        verbose_name_plural = "شمارنده‌های counterbalancing کیوها"
+
+    def __str__(self):
+        return f"{self.permutation} | {self.assigned}"
+
+    @classmethod
+    def allocate(cls, permutations: int) -> int:
+        """
+        رزرو کم‌استفاده‌ترین جایگشت (در تساوی کوچک‌ترین شماره). اگر ردیف انتخاب‌شده بین خواندن و UPDATE
+        توسط درخواست دیگری جلو رفته باشد، UPDATE هیچ ردیفی را تغییر نمی‌دهد و دوباره خوانده می‌شود.
+        باید خارج از تراکنش صدا زده شود تا هر خواندن مقدار تازه را ببیند.
+        """
+        permutation = 0
+        for _ in range(cls.ALLOCATE_ATTEMPTS):
+            least = cls.objects.filter(permutation__lt=permutations).order_by('assigned', 'permutation').first()
+            if least is None:
+                cls.objects.bulk_create([cls(permutation=i) for i in range(permutations)], ignore_conflicts=True)
+                continue
+            permutation = least.permutation
+            if cls.objects.filter(pk=permutation, assigned=least.assigned).update(assigned=F('assigned') + 1):
+                return permutation
+        # رقابت شدید: همان آخرین انتخاب بدون شرط رزرو می‌شود (عدم تعادل حداکثر چند تخصیص)
+        cls.objects.filter(pk=permutation).update(assigned=F('assigned') + 1)
+        return permutation
+
+    @classmethod
+    def release(cls, permutation: int) -> None:
+        """پس دادن تخصیصی که استفاده نشد"""
+        cls.objects.filter(pk=permutation, assigned__gt=0).update(assigned=F('assigned') - 1)
+
+
+class Stimulus(models.Model):
+    """
+    یک فایل صوتی در static/sounds.
+    category همان پوشه فایل است (مثلاً 5-MP-MA) و کلاس خوشایندی/برانگیختگی از نام پوشه گرفته می‌شود.
+    """
+    VALENCE_CLASS_CHOICES = [
+        ('HP', 'خوشایند'),
+        ('MP', 'خنثی'),
+        ('LP', 'ناخوشایند'),
+    ]
+    AROUSAL_CLASS_CHOICES = [
+        ('HA', 'برانگیختگی بالا'),
+        ('MA', 'برانگیختگی متوسط'),
+        ('LA', 'برانگیختگی پایین'),
+    ]
+
+    path = models.CharField(max_length=255, unique=True, verbose_name="مسیر فایل (نسبت به static/sounds)")
+    category = models.CharField(max_length=30, db_index=True, verbose_name="دسته")
+    valence_class = models.CharField(max_length=2, choices=VALENCE_CLASS_CHOICES, blank=True, verbose_name="کلاس خوشایندی")
+    arousal_class = models.CharField(max_length=2, choices=AROUSAL_CLASS_CHOICES, blank=True, verbose_name="کلاس برانگیختگی")
+    duration = models.FloatField(null=True, blank=True, verbose_name="مدت (ثانیه)")
+    byte_size = models.PositiveIntegerField(null=True, blank=True, verbose_name="حجم (بایت)")
+    content_hash = models.CharField(max_length=64, blank=True, verbose_name="هش محتوا")
+    # متادیتای زیر را دستور build_stimulus_manifest پر می‌کند
+    bitrate = models.PositiveIntegerField(null=True, blank=True, verbose_name="bitrate (bps)")
+    sample_rate = models.PositiveIntegerField(null=True, blank=True, verbose_name="sample rate (Hz)")
+    channels = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="تعداد کانال")
+    rms_db = models.FloatField(null=True, blank=True, verbose_name="RMS (dBFS)")
+    lufs = models.FloatField(null=True, blank=True, verbose_name="بلندی (LUFS)")
+    analyzed_at = models.DateTimeField(null=True, blank=True, verbose_name="زمان تحلیل")
+    is_active = models.BooleanField(default=True, verbose_name="فعال/غیرفعال")
+
+    class Meta:
+        verbose_name = "محرک صوتی"
+        verbose_name_plural = "محرک‌های صوتی"
+        ordering = ['path']
+
+    def __str__(self):
+        return self.path
+
+    @staticmethod
+    def classes_from_category(category):
+        """'5-MP-MA' -> ('MP', 'MA')؛ برای پوشه‌هایی مثل 0-practice و CUE رشته خالی"""
+        parts = category.split('-')
+        if len(parts) == 3:
+            return parts[1], parts[2]
+        return '', ''
+
+
+class StimulusSet(models.Model):
+    """مجموعه نام‌دار و مرتب محرک‌های یک مرحله (مثلاً pcm_neutral یا rating_main)"""
+    name = models.SlugField(max_length=50, unique=True, verbose_name="نام")
+    description = models.CharField(max_length=255, blank=True, verbose_name="توضیحات")
+    stimuli = models.ManyToManyField(Stimulus, through='StimulusSetMember', related_name='sets')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "مجموعه محرک"
+        verbose_name_plural = "مجموعه‌های محرک"
+
+    def __str__(self):
+        return self.name
+
+
+class StimulusSetMember(models.Model):
+    stimulus_set = models.ForeignKey(StimulusSet, on_delete=models.CASCADE, related_name='members')
+    stimulus = models.ForeignKey(Stimulus, on_delete=models.PROTECT, related_name='memberships')
+    position = models.PositiveIntegerField(default=0, verbose_name="ترتیب")
+
+    class Meta:
+        unique_together = ('stimulus_set', 'stimulus')
+        ordering = ['stimulus_set', 'position']
+        verbose_name = "عضو مجموعه محرک"
+        verbose_name_plural = "اعضای مجموعه محرک"
+
+    def __str__(self):
+        return f"{self.stimulus_set.name} | {self.position} | {self.stimulus.path}"
+
+
+class PCMSessionPlan(models.Model):
+    """
+    پلن ذخیره‌شده مرحله جاری PCM برای هر کاربر.
+    پلن هر مرحله/بلاک یک‌بار با RNG دارای seed ساخته می‌شود و با ذخیره هر پاسخ فقط cursor جلو می‌رود.
+    version صفر یعنی پلن باطل شده و در درخواست بعدی دوباره ساخته می‌شود.
+    """
+    CURRENT_VERSION = 1
+
+    STAGE_CHOICES = [
+        ('valence_practice', '1) تمرین خوشایندی'),
+        ('seq_practice', '2) تمرین توالی'),
+        ('pcm_main', '3) آزمون اصلی'),
+        ('rating_practice', '4) تمرین رتبه‌بندی'),
+        ('rating_main', '5) رتبه‌بندی'),
+        ('failed', 'رد شده'),
+        ('done', 'پایان'),
+    ]
+    TERMINAL_STAGES = ('failed', 'done')
+
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='pcm_session_plan')
+    version = models.PositiveIntegerField(default=CURRENT_VERSION, verbose_name="نسخه پلن")
+    seed = models.PositiveBigIntegerField(verbose_name="seed")
+    revision = models.PositiveIntegerField(default=0, verbose_name="شماره بازسازی")
+    stage = models.CharField(max_length=30, choices=STAGE_CHOICES, verbose_name="مرحله")
+    block = models.PositiveIntegerField(default=1, verbose_name="شماره بلاک")
+    plan = models.JSONField(default=dict, verbose_name="پلن")
+    cursor = models.JSONField(default=dict, verbose_name="پیشرفت در پلن")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "پلن جلسه PCM"
+        verbose_name_plural = "پلن‌های جلسه PCM"
+
+    def __str__(self):
+        return f"{self.user.username} | {self.stage} | Block {self.block}"
+
+    def is_exhausted(self):
+        if self.stage in self.TERMINAL_STAGES:
+            return False
+        tracks = self.plan.get('tracks', {})
+        return all(self.cursor.get(name, 0) >= len(items) for name, items in tracks.items())
+
+    def is_usable(self):
+        return self.version == self.CURRENT_VERSION and not self.is_exhausted()
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cls.objects.filter(user_id=user_id).update(version=0)
+
+
+class ParticipantProgress(models.Model):
+    """
+    شمارش تجمیعی پیشرفت هر کاربر در همه مراحل (جدول denormalize شده).
+    در همان تراکنش ذخیره پاسخ‌ها به‌روز می‌شود؛ حذف یا ویرایش پاسخ‌ها ردیف را حذف می‌کند
+    تا در خواندن بعدی از جداول خام بازسازی شود (دستور rebuild_participant_progress هم همین کار را می‌کند).
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='participant_progress')
+    valence_practice = models.PositiveIntegerField(default=0, verbose_name="1) تمرین خوشایندی")
+    # {"1": {"practice": n, "practice_correct": n, "catch": n, "catch_correct": n}} فقط پاسخ‌های فعال
+    seq_blocks = models.JSONField(default=dict, verbose_name="2) تمرین توالی (هر بلاک)")
+    # {"1": {"catch": n, "main": n}}
+    pcm_blocks = models.JSONField(default=dict, verbose_name="3) آزمون اصلی (هر بلاک)")
+    pcm_rating_practice = models.PositiveIntegerField(default=0, verbose_name="4) تمرین رتبه‌بندی")
+    pcm_rating_main = models.PositiveIntegerField(default=0, verbose_name="5) رتبه‌بندی کامل")
+    rating_practice = models.PositiveIntegerField(default=0, verbose_name="تمرین رتبه‌بندی (آزمون رتبه‌بندی)")
+    rating_main = models.PositiveIntegerField(default=0, verbose_name="رتبه‌بندی کامل (آزمون رتبه‌بندی)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "پیشرفت شرکت‌کننده"
+        verbose_name_plural = "پیشرفت شرکت‌کنندگان"
+
+    def __str__(self):
+        return f"{self.user.username} | updated {self.updated_at}"
+
+    # ---------- خواندن ----------
+    def seq_block(self, block):
+        stats = self.seq_blocks.get(str(block), {})
+        return {key: stats.get(key, 0) for key in ('practice', 'practice_correct', 'catch', 'catch_correct')}
+
+    def pcm_block(self, block):
+        stats = self.pcm_blocks.get(str(block), {})
+        return {key: stats.get(key, 0) for key in ('catch', 'main')}
+
+    @classmethod
+    def for_user(cls, user):
+        progress = cls.objects.filter(user=user).first()
+        return progress if progress is not None else cls.rebuild(user)
+
+    # ---------- نوشتن ----------
+    def _bump(self, field, block, key, amount=1):
+        stats = getattr(self, field).setdefault(str(block), {})
+        stats[key] = stats.get(key, 0) + amount
+
+    def count(self, response):
+        """افزودن یک پاسخ تازه ذخیره‌شده به شمارنده‌ها"""
+        complete_rating = getattr(response, 'valence', None) is not None and getattr(response, 'arousal', None) is not None
+        if isinstance(response, PCMValencePracticeResponse):
+            self.valence_practice += 1
+        elif isinstance(response, PCMSequencePracticeResponse):
+            if response.is_active:
+                self._bump('seq_blocks', response.block, 'practice')
+                self._bump('seq_blocks', response.block, 'practice_correct', int(bool(response.is_correct)))
+        elif isinstance(response, PCMSequenceCatchResponse):
+            if response.is_active:
+                self._bump('seq_blocks', response.block, 'catch')
+                self._bump('seq_blocks', response.block, 'catch_correct', int(bool(response.is_correct)))
+        elif isinstance(response, PCMCatchResponse):
+            self._bump('pcm_blocks', response.block, 'catch')
+        elif isinstance(response, PCMMainResponse):
+            self._bump('pcm_blocks', response.block, 'main')
+        elif isinstance(response, RatingPracticeResponse):
+            self.pcm_rating_practice += 1
+        elif isinstance(response, RatingMainResponse):
+            self.pcm_rating_main += int(complete_rating)
+        elif isinstance(response, RatingPractice):
+            self.rating_practice += 1
+        elif isinstance(response, RatingResponse):
+            self.rating_main += int(complete_rating)
+
+    @classmethod
+    def record(cls, user, responses):
+        """
+        به‌روزرسانی شمارنده‌ها برای پاسخ‌های تازه ذخیره‌شده؛ باید داخل تراکنش ذخیره پاسخ‌ها صدا زده شود.
+        اگر ردیف هنوز وجود ندارد از جداول خام ساخته می‌شود (که پاسخ‌های همین تراکنش را هم شامل است).
+        مسیرهای ذخیره پیش از آن ردیف کاربر را قفل می‌کنند (views.lock_participant) تا record هم‌زمان نداشته باشد.
+        """
+        progress = cls.objects.select_for_update().filter(user=user).first()
+        if progress is None:
+            progress = cls.from_responses(user)
+            try:
+                with transaction.atomic():
+                    progress.save(force_insert=True)
+                return
+            except IntegrityError:
+                # ردیف هم‌زمان (مثلاً for_user بیرون از قفل کاربر) از داده commitشده ساخته شد که پاسخ‌های
+                # همین تراکنش را ندارد؛ روی همان ردیف شمرده می‌شوند
+                progress = cls.objects.select_for_update().get(user=user)
+        for response in responses:
+            progress.count(response)
+        progress.save()
+
+    @classmethod
+    def from_responses(cls, user):
+        """محاسبه شمارنده‌ها از جداول پاسخ (بدون ذخیره)"""
+        complete = Q(valence__isnull=False, arousal__isnull=False)
+        progress = cls(user=user)
+        progress.valence_practice = PCMValencePracticeResponse.objects.filter(user=user).count()
+
+        for row in (
+            PCMSequencePracticeResponse.objects.filter(user=user, is_active=True).order_by()
+            .values('block').annotate(n=Count('pk'), correct=Count('pk', filter=Q(is_correct=True)))
+        ):
+            progress._bump('seq_blocks', row['block'], 'practice', row['n'])
+            progress._bump('seq_blocks', row['block'], 'practice_correct', row['correct'])
+        for row in (
+            PCMSequenceCatchResponse.objects.filter(user=user, is_active=True).order_by()
+            .values('block').annotate(n=Count('pk'), correct=Count('pk', filter=Q(is_correct=True)))
+        ):
+            progress._bump('seq_blocks', row['block'], 'catch', row['n'])
+            progress._bump('seq_blocks', row['block'], 'catch_correct', row['correct'])
+        for model, key in ((PCMCatchResponse, 'catch'), (PCMMainResponse, 'main')):
+            for row in model.objects.filter(user=user).order_by().values('block').annotate(n=Count('pk')):
+                progress._bump('pcm_blocks', row['block'], key, row['n'])
+
+        progress.pcm_rating_practice = RatingPracticeResponse.objects.filter(user=user).count()
+        progress.pcm_rating_main = RatingMainResponse.objects.filter(complete, user=user).count()
+        progress.rating_practice = RatingPractice.objects.filter(user=user).count()
+        progress.rating_main = RatingResponse.objects.filter(complete, user=user).count()
+        return progress
+
+    @classmethod
+    def rebuild(cls, user):
+        """بازسازی کامل ردیف کاربر از جداول پاسخ"""
+        progress = cls.from_responses(user)
+        try:
+            with transaction.atomic():
+                progress.save()
+        except IntegrityError:
+            # درخواست هم‌زمان دیگری ردیف را ساخته است (شاید با پاسخ‌هایی که این خواندن ندیده)؛ بازنویسی نمی‌شود
+            with transaction.atomic():
+                return cls.objects.select_for_update().get(user=user)
+        return progress
+
+    @classmethod
+    def invalidate(cls, user_id):
+        cls.objects.filter(user_id=user_id).delete()
+
+
+class StimulusNorm(models.Model):
+    """
+    آمار هنجاری هر محرک (جدول materialize شده): تعداد، مجموع و مجموع مربعات هر شاخص.
+    با هر پاسخ تازه در همان تراکنش ذخیره به‌روز می‌شود (record)؛ حذف یا ویرایش پاسخ سهم قبلی آن را
+    کم می‌کند (سیگنال‌ها). دستور rebuild_stimulus_norms جدول را با جداول خام تطبیق می‌دهد.
+    میانگین، انحراف معیار و خطای معیار از همین ستون‌ها بدون GROUP BY روی جداول پاسخ به دست می‌آیند.
+    """
+    SOURCE_CHOICES = [
+        ('pcm', 'آزمون PCM - رتبه‌بندی مرحله ۵'),
+        ('rating', 'آزمون رتبه‌بندی'),
+    ]
+    # منبع -> (مدل پاسخ، فیلد شماره محرک)
+    SOURCES = {
+        'pcm': (RatingMainResponse, 'stimulus_number'),
+        'rating': (RatingResponse, 'stimulus'),
+    }
+    METRICS = ('valence', 'valence_rt', 'arousal', 'arousal_rt')
+
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, verbose_name="منبع")
+    stimulus = models.CharField(max_length=50, verbose_name="محرک")
+    stimulus_file = models.CharField(max_length=200, blank=True, default='', verbose_name="فایل محرک")
+    n_responses = models.IntegerField(default=0, verbose_name="تعداد پاسخ")
+
+    n_valence = models.IntegerField(default=0)
+    sum_valence = models.BigIntegerField(default=0)
+    sumsq_valence = models.BigIntegerField(default=0)
+    n_valence_rt = models.IntegerField(default=0)
+    sum_valence_rt = models.BigIntegerField(default=0)
+    sumsq_valence_rt = models.BigIntegerField(default=0)
+    n_arousal = models.IntegerField(default=0)
+    sum_arousal = models.BigIntegerField(default=0)
+    sumsq_arousal = models.BigIntegerField(default=0)
+    n_arousal_rt = models.IntegerField(default=0)
+    sum_arousal_rt = models.BigIntegerField(default=0)
+    sumsq_arousal_rt = models.BigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('source', 'stimulus', 'stimulus_file')
+        ordering = ['source', 'stimulus']
+        verbose_name = "هنجار محرک"
+        verbose_name_plural = "هنجارهای محرک‌ها"
+
+    def __str__(self):
+        return f"{self.source} | {self.stimulus} | N={self.n_responses}"
+
+    # ---------- خواندن ----------
+    def mean(self, metric):
+        n = getattr(self, f'n_{metric}')
+        return getattr(self, f'sum_{metric}') / n if n else None
+
+    def sd(self, metric):
+        """انحراف معیار نمونه (n-1)"""
+        n = getattr(self, f'n_{metric}')
+        if n < 2:
+            return None
+        total = getattr(self, f'sum_{metric}')
+        variance = (getattr(self, f'sumsq_{metric}') - total * total / n) / (n - 1)
+        return math.sqrt(max(variance, 0))
+
+    def se(self, metric):
+        sd = self.sd(metric)
+        return sd / math.sqrt(getattr(self, f'n_{metric}')) if sd is not None else None
+
+    def summary(self):
+        data = {
+            'source': self.source,
+            'stimulus': self.stimulus,
+            'stimulus_file': self.stimulus_file,
+            'n_responses': self.n_responses,
+        }
+        for metric in self.METRICS:
+            data[metric] = {
+                'n': getattr(self, f'n_{metric}'),
+                'mean': self.mean(metric),
+                'sd': self.sd(metric),
+                'se': self.se(metric),
+            }
+        return data
+
+    # ---------- نوشتن ----------
+    @classmethod
+    def key_of(cls, response):
+        """(source, stimulus, stimulus_file) یک پاسخ؛ برای مدل‌های دیگر None"""
+        for source, (model, field) in cls.SOURCES.items():
+            if isinstance(response, model):
+                return source, str(getattr(response, field)), response.stimulus_file or ''
+        return None
+
+    @classmethod
+    def record(cls, responses, sign=1):
+        """
+        افزودن (sign=1) یا کم کردن (sign=-1) سهم پاسخ‌ها؛ باید داخل تراکنش ذخیره پاسخ‌ها صدا زده شود.
+        برای هر محرک فقط یک UPDATE با F() اجرا می‌شود و ردیف نبود ساخته می‌شود.
+        """
+        deltas = defaultdict(Counter)
+        for response in responses:
+            key = cls.key_of(response)
+            if key is None:
+                continue
+            delta = deltas[key]
+            delta['n_responses'] += sign
+            for metric in cls.METRICS:
+                value = getattr(response, metric)
+                if value is None:
+                    continue
+                delta[f'n_{metric}'] += sign
+                delta[f'sum_{metric}'] += sign * value
+                delta[f'sumsq_{metric}'] += sign * value * value
+
+        for (source, stimulus, stimulus_file), delta in deltas.items():
+            lookup = {'source': source, 'stimulus': stimulus, 'stimulus_file': stimulus_file}
+            changes = {field: F(field) + amount for field, amount in delta.items() if amount}
+            if not changes or cls.objects.filter(**lookup).update(**changes) or sign < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(**lookup, **delta)
+            except IntegrityError:
+                # درخواست هم‌زمان دیگری ردیف را ساخته است
+                cls.objects.filter(**lookup).update(**changes)
+
+    @classmethod
+    def aggregates(cls):
+        aggregates = {'n_responses': Count('pk')}
+        for metric in cls.METRICS:
+            aggregates[f'n_{metric}'] = Count(metric)
+            aggregates[f'sum_{metric}'] = Sum(metric)
+            aggregates[f'sumsq_{metric}'] = Sum(F(metric) * F(metric))
+        return aggregates
+
+    @classmethod
+    def from_responses(cls, source):
+        """محاسبه ردیف‌های یک منبع از جدول پاسخ (بدون ذخیره)"""
+        model, field = cls.SOURCES[source]
+        rows = (
+            model.objects.order_by()
+            .annotate(file=Coalesce('stimulus_file', Value('')))
+            .values(field, 'file')
+            .annotate(**cls.aggregates())
+        )
+        return [
+            cls(
+                source=source,
+                stimulus=row.pop(field),
+                stimulus_file=row.pop('file'),
+                **{name: value or 0 for name, value in row.items()},
+            )
+            for row in rows
+        ]
+
+
+class PCMEffect(models.Model):
+    """
+    اثرهای PCM محاسبه‌شده (قابل انتظار در برابر غیرقابل انتظار) برای هر شرکت‌کننده و کل گروه؛
+    کش نتیجه core.analysis که دستور compute_pcm_effects هر بار کل جدول را از نو می‌سازد.
+    ردیف بدون کاربر ردیف کل گروه است و فاصله اطمینان bootstrap دارد.
+    """
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='pcm_effects', verbose_name="کاربر",
+    )
+    measure = models.CharField(max_length=40, verbose_name="سنجه")
+    scope = models.CharField(max_length=60, verbose_name="دامنه")
+    n_expected = models.IntegerField(default=0, verbose_name="تعداد قابل انتظار")
+    n_unexpected = models.IntegerField(default=0, verbose_name="تعداد غیرقابل انتظار")
+    expected = models.FloatField(null=True, blank=True, verbose_name="قابل انتظار")
+    unexpected = models.FloatField(null=True, blank=True, verbose_name="غیرقابل انتظار")
+    delta = models.FloatField(null=True, blank=True, verbose_name="تفاوت (غیرقابل انتظار - قابل انتظار)")
+    ci_low = models.FloatField(null=True, blank=True, verbose_name="حد پایین فاصله اطمینان")
+    ci_high = models.FloatField(null=True, blank=True, verbose_name="حد بالای فاصله اطمینان")
+    computed_at = models.DateTimeField(auto_now_add=True, verbose_name="زمان محاسبه")
+
+    class Meta:
+        indexes = [models.Index(fields=['measure', 'scope'])]
+        ordering = ['measure', 'scope', 'user']
+        verbose_name = "اثر PCM"
+        verbose_name_plural = "اثرهای PCM"
+
+    def __str__(self):
+        who = self.user_id or 'گروه'
+        return f"{who} | {self.measure} | {self.scope} | Δ={self.delta}"
+
+
 ###################################################################################################### 
 ###################################################################################################### 
 ###################################################################################################### 
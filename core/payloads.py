@@ -0,0 +1,356 @@
+"""
+اعتبارسنجی و ساخت ردیف‌های پاسخ از payload تریال‌هایی که کلاینت ذخیره می‌کند.
+
+برای هر مرحله یک طرح اعلانی (PayloadSchema) تعریف شده است: فیلدهای مدل پاسخ، کلیدهای payload متناظر،
+الزامی بودن، مقدار پیش‌فرض و تبدیل (مثلاً URL صدا -> شماره محرک). نوع و محدودیت‌های هر فیلد (بازه عدد صحیح
+ستون در پایگاه داده، حداکثر طول رشته، choices، null) از خود فیلد مدل خوانده و هنگام import یک‌بار به تاپلی
+از تابع‌های تبدیل کامپایل می‌شود؛ اعتبارسنجی هر payload فقط یک حلقه روی همین تاپل است.
+StageTable مرحله payload را به ترتیب پرچم‌ها (is_valence_practice، is_catch، ...) تشخیص می‌دهد و ردیف
+مدل همان مرحله را می‌سازد. خطاها PayloadError هستند با فهرست {'field', 'message'} که ویو با کد 400
+برمی‌گرداند.
+"""
+import json
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.db import connection, models
+
+from .models import (
+    PCMCatchResponse,
+    PCMMainResponse,
+    PCMSequenceCatchResponse,
+    PCMSequencePracticeResponse,
+    PCMValencePracticeResponse,
+    RatingMainResponse,
+    RatingPractice,
+    RatingPracticeResponse,
+    RatingResponse,
+)
+from .stimuli import canonical_audio_url, extract_stimulus_number
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MISSING = object()
+
+
+def decode(body: bytes):
+    """
+    خواندن JSON بدنه درخواست (با orjson اگر نصب باشد).
+    خطای JSON نامعتبر در هر دو حالت json.JSONDecodeError است.
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class PayloadError(ValueError):
+    def __init__(self, message: str, errors: Optional[List[dict]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+    def as_dict(self) -> dict:
+        payload = {'status': 'error', 'message': str(self)}
+        if self.errors:
+            payload['errors'] = self.errors
+        return payload
+
+
+# ---------- تبدیل مقدارها بر اساس نوع فیلد مدل ----------
+def _integer(min_value, max_value):
+    def coerce(value):
+        if type(value) is not int:
+            if isinstance(value, float) and math.isfinite(value):
+                value = round(value)
+            elif isinstance(value, str):
+                try:
+                    value = int(value.strip())
+                except ValueError:
+                    raise ValueError('عدد صحیح نامعتبر') from None
+            else:
+                raise ValueError('عدد صحیح نامعتبر')
+        if min_value is not None and value < min_value:
+            raise ValueError('نباید منفی باشد' if min_value == 0 else f'نباید کمتر از {min_value} باشد')
+        if max_value is not None and value > max_value:
+            raise ValueError(f'نباید بیشتر از {max_value} باشد')
+        return value
+    return coerce
+
+
+def _float(value):
+    if type(value) is not float:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError('عدد نامعتبر')
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError('عدد نامعتبر') from None
+    if not math.isfinite(value):
+        raise ValueError('عدد نامعتبر')
+    return value
+
+
+_BOOLEANS = {True: True, False: False, 1: True, 0: False, 'true': True, 'false': False, '1': True, '0': False}
+
+
+def _boolean(value):
+    try:
+        return _BOOLEANS[value.lower() if isinstance(value, str) else value]
+    except (KeyError, TypeError):
+        raise ValueError('مقدار بولی نامعتبر') from None
+
+
+def _string(max_length):
+    def coerce(value):
+        if type(value) is not str:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError('رشته نامعتبر')
+            value = str(value)
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f'حداکثر {max_length} کاراکتر')
+        return value
+    return coerce
+
+
+def _choice(coerce, allowed):
+    def coerce_choice(value):
+        value = coerce(value)
+        if value not in allowed:
+            raise ValueError('مقدار مجاز نیست: ' + '، '.join(map(str, allowed)))
+        return value
+    return coerce_choice
+
+
+def _base_coercer(model_field: models.Field) -> Callable:
+    if isinstance(model_field, models.BooleanField):
+        return _boolean
+    if isinstance(model_field, models.IntegerField):
+        # بازه ستون همان backend (مثلاً INT UNSIGNED در MySQL)؛ مقدار خارج از آن DataError می‌داد
+        return _integer(*connection.ops.integer_field_range(model_field.get_internal_type()))
+    if isinstance(model_field, models.FloatField):
+        return _float
+    if isinstance(model_field, models.CharField):
+        return _string(model_field.max_length)
+    raise TypeError(f'{model_field} در طرح payload پشتیبانی نمی‌شود')
+
+
+def coercer(model_field: models.Field) -> Callable:
+    coerce = _base_coercer(model_field)
+    if model_field.choices:
+        return _choice(coerce, tuple(value for value, _ in model_field.flatchoices))
+    return coerce
+
+
+# ---------- طرح‌ها ----------
+@dataclass(frozen=True)
+class Field:
+    name: str                          # فیلد مدل
+    keys: Tuple[str, ...] = ()         # کلیدهای payload به ترتیب اولویت؛ پیش‌فرض همان name
+    required: bool = False
+    default: object = MISSING          # پیش‌فرض: default فیلد مدل
+    transform: Optional[Callable] = None
+
+
+class PayloadSchema:
+    def __init__(self, stage: str, model, fields, flag: Optional[str] = None, markers: Tuple[str, ...] = (),
+                 plan: Optional[Tuple[str, str]] = None):
+        """
+        stage: نام مرحله؛ flag: پرچم تشخیص مرحله در payload، یا در نبود آن markers: کلیدهایی که باید باشند.
+        plan: (مرحله پلن، track) برای advance_session_plan؛ track می‌تواند {block} داشته باشد.
+        """
+        self.stage = stage
+        self.model = model
+        self.fields = tuple(fields)
+        self.flag = flag
+        self.markers = tuple(markers)
+        self.plan = plan
+        self._compiled = tuple(self._compile(f) for f in self.fields)
+
+    def _compile(self, spec: Field):
+        model_field = self.model._meta.get_field(spec.name)
+        default = spec.default
+        if default is MISSING and model_field.has_default():
+            default = model_field.get_default()
+        keys = spec.keys or (spec.name,)
+        return (
+            spec.name,
+            keys[0],
+            keys[1] if len(keys) > 1 else None,
+            spec.required,
+            default,
+            spec.transform,
+            coercer(model_field),
+            model_field.null,
+        )
+
+    def matches(self, data: dict) -> bool:
+        if self.flag is not None:
+            return bool(data.get(self.flag))
+        return all(key in data for key in self.markers)
+
+    def clean(self, data: dict) -> dict:
+        """مقدارهای تبدیل‌شده فیلدهای مدل؛ در صورت خطا PayloadError با همه خطاهای فیلدها"""
+        values = {}
+        errors = None
+        for name, key, alias, required, default, transform, coerce, nullable in self._compiled:
+            raw = data.get(key)
+            if raw is None and alias is not None:
+                raw = data.get(alias)
+            value = raw
+            if value is not None and transform is not None:
+                try:
+                    value = transform(value)
+                except (AttributeError, TypeError, ValueError):
+                    value = None
+            if value is None:
+                if not required and default is not MISSING:
+                    values[name] = default
+                elif not required and nullable:
+                    values[name] = None
+                else:
+                    errors = errors or []
+                    errors.append({'field': key, 'message': 'الزامی است' if raw is None else 'مقدار نامعتبر'})
+                continue
+            try:
+                values[name] = coerce(value)
+            except ValueError as e:
+                errors = errors or []
+                errors.append({'field': key, 'message': str(e)})
+        if errors:
+            raise PayloadError('داده نامعتبر: ' + '، '.join(f"{e['field']} {e['message']}" for e in errors), errors)
+        return values
+
+    def build(self, user, data: dict):
+        """(ردیف ذخیره‌نشده، plan_entry)"""
+        values = self.clean(data)
+        response = self.model(user=user, **values)
+        plan_entry = None
+        if self.plan is not None:
+            stage, track = self.plan
+            plan_entry = (stage, track.format(**values), data)
+        return response, plan_entry
+
+
+class StageTable:
+    """جدول مرحله‌ها؛ اولین طرحی که با payload بخواند انتخاب می‌شود"""
+
+    def __init__(self, schemas):
+        self.schemas = tuple(schemas)
+        self.by_stage: Dict[str, PayloadSchema] = {schema.stage: schema for schema in self.schemas}
+
+    def dispatch(self, data: dict) -> Optional[PayloadSchema]:
+        for schema in self.schemas:
+            if schema.matches(data):
+                return schema
+        return None
+
+    def build(self, user, data):
+        if not isinstance(data, dict):
+            raise PayloadError('آیتم باید شیء JSON باشد')
+        schema = self.dispatch(data)
+        if schema is None:
+            raise PayloadError('نوع داده نامعتبر')
+        return schema.build(user, data)
+
+
+def _stimulus(name, key=None, required=False) -> Field:
+    return Field(name, keys=(key or name,), required=required, transform=extract_stimulus_number)
+
+
+def _plain(*names) -> Tuple[Field, ...]:
+    return tuple(Field(name) for name in names)
+
+
+def _valence(suffix, rt_alias=False) -> Tuple[Field, ...]:
+    rt = f'valence_rt_{suffix}'
+    return (
+        Field(f'valence_{suffix}'),
+        Field(rt, keys=(rt, f'rt_{suffix}') if rt_alias else ()),
+        Field(f'valence_delay_number_{suffix}'),
+        Field(f'valence_input_method_{suffix}'),
+    )
+
+
+RATING_FIELDS = _plain(
+    'valence', 'valence_rt', 'valence_delay_number', 'valence_input_method',
+    'arousal', 'arousal_rt', 'arousal_delay_number', 'arousal_input_method',
+)
+STIMULUS_FIELDS = (_stimulus('stimulus1'), _stimulus('stimulus2'), *_plain('category_stim1', 'category_stim2'))
+REQUIRED_TRIAL = Field('trial', required=True)
+REQUIRED_CUE = _stimulus('cue', required=True)
+STIMULUS_FILE = Field('stimulus_file', required=True, transform=canonical_audio_url)
+
+
+# ترتیب همان زنجیره if/elif قبلی pcm_save_response است
+PCM_PAYLOADS = StageTable([
+    # مرحله 1: تمرین رتبه‌بندی خوشایندی
+    PayloadSchema(
+        'valence_practice', PCMValencePracticeResponse, flag='is_valence_practice',
+        plan=('valence_practice', 'trials'),
+        fields=(
+            REQUIRED_TRIAL, REQUIRED_CUE, *STIMULUS_FIELDS,
+            *_valence('stim1', rt_alias=True), *_valence('stim2', rt_alias=True), *_valence('sequence', rt_alias=True),
+        ),
+    ),
+    # مرحله 2: تمرین تشخیص توالی
+    PayloadSchema(
+        'seq_catch', PCMSequenceCatchResponse, flag='is_catch', plan=('seq_practice', 'catch'),
+        fields=(
+            Field('block', default=1), REQUIRED_TRIAL, REQUIRED_CUE, Field('user_response', required=True),
+            *_plain('response_rt', 'delay_number', 'response_input_method', 'is_correct'),
+        ),
+    ),
+    PayloadSchema(
+        'seq_practice', PCMSequencePracticeResponse, flag='is_seq_practice', plan=('seq_practice', 'practice'),
+        fields=(
+            REQUIRED_TRIAL, Field('block', default=1), REQUIRED_CUE, *STIMULUS_FIELDS,
+            *_plain('expected_sequence', 'is_consistent'),
+            *(Field(name, required=True) for name in (
+                'user_response', 'response_rt', 'delay_number', 'response_input_method', 'is_correct',
+            )),
+        ),
+    ),
+    # مرحله ۳: آزمون اصلی
+    PayloadSchema(
+        'pcm_catch', PCMCatchResponse, flag='is_catch_pcm', plan=('pcm_main', 'catch:{block}'),
+        fields=(
+            Field('block'), REQUIRED_TRIAL, REQUIRED_CUE, Field('response_rt', required=True),
+            *_plain('user_response', 'delay_number', 'response_input_method', 'is_correct',
+                    'cue_onset_latency', 'audio_engine'),
+        ),
+    ),
+    PayloadSchema(
+        'pcm_main', PCMMainResponse, markers=('block', 'trial'), plan=('pcm_main', 'main:{block}'),
+        fields=(
+            Field('block', required=True), REQUIRED_TRIAL, REQUIRED_CUE, *STIMULUS_FIELDS,
+            *_plain('expected_sequence', 'is_consistent'),
+            *_valence('stim1'), *_valence('stim2'), *_valence('sequence'),
+            *_plain('cue_onset_latency', 'stim1_onset_latency', 'stim2_onset_latency', 'audio_engine'),
+        ),
+    ),
+    # مرحله ۴: تمرین رتبه‌بندی کامل
+    PayloadSchema(
+        'rating_practice', RatingPracticeResponse, flag='is_rating_practice', plan=('rating_practice', 'trials'),
+        fields=(REQUIRED_TRIAL, _stimulus('stimulus'), *RATING_FIELDS),
+    ),
+    # مرحله ۵: رتبه‌بندی نهایی
+    PayloadSchema(
+        'rating_main', RatingMainResponse, flag='is_rerating', plan=('rating_main', 'trials'),
+        fields=(REQUIRED_TRIAL, _stimulus('stimulus_number'), STIMULUS_FILE, *RATING_FIELDS),
+    ),
+])
+
+# صفحه‌های rating_1 / rating_2 (پیش از آزمون PCM)
+RATING_PAYLOADS = StageTable([
+    PayloadSchema(
+        'rating_practice', RatingPractice, flag='is_rating_practice',
+        fields=(REQUIRED_TRIAL, _stimulus('stimulus'), *RATING_FIELDS),
+    ),
+    PayloadSchema(
+        'rerating', RatingResponse, flag='is_rerating',
+        fields=(REQUIRED_TRIAL, _stimulus('stimulus', key='stimulus_number'), STIMULUS_FILE, *RATING_FIELDS),
+    ),
+])
@@ -0,0 +1,357 @@
+"""
+تولید پلن تریال‌های آزمون PCM به صورت تابع‌های خالص.
+
+ورودی هر planner فقط شمارنده‌های پاسخ‌های ثبت‌شده (به تفکیک کیو، بلاک و ...) و نگاشت کیو -> توالی
+مورد انتظار است و خروجی لیست تریال‌ها؛ هیچ دسترسی به پایگاه داده یا ماژول random سراسری ندارد.
+همه تصادفی‌سازی‌ها از rng ورودی می‌آید (نمونه random.Random یا seed صریح)، پس پلن با seed یکسان و
+شمارنده‌های یکسان دقیقاً بازتولید می‌شود. views.build_session_plan شمارنده‌ها را از PCMProgress می‌خواند،
+این تابع‌ها را با seed ذخیره‌شده در PCMSessionPlan صدا می‌زند و نتیجه را در پلن جلسه ذخیره می‌کند.
+"""
+import itertools
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+SEQUENCES = ('Neutral-Neutral', 'Neutral-Negative', 'Negative-Neutral')
+# همه mismatchهای ممکن (توالی مورد انتظار، توالی پخش‌شده): ۶ ترکیب = ۲ تا برای هر کیو
+MISMATCHES = tuple((expected, actual) for expected in SEQUENCES for actual in SEQUENCES if actual != expected)
+
+# counterbalancing بین شرکت‌کنندگان: هر جایگشت ۳ توالی روی ۳ کیو یک شرط است (۶ شرط، هر کیو در هر
+# توالی در ۲ شرط). شرط 0 همان نگاشت ثابت قبلی است: CUE 1 → Negative-Neutral، 2 → Neutral-Negative، 3 → Neutral-Neutral
+CUE_PERMUTATIONS = tuple(itertools.permutations(SEQUENCES[::-1]))
+
+# تمرین تشخیص توالی (هر بلاک)
+SEQ_PER_CUE = 10
+SEQ_INCONSISTENT_PER_CUE = 2
+SEQ_CONSISTENT_FIRST = 6
+CATCH_PER_CUE = 2
+
+# آزمون اصلی
+MAIN_BLOCKS = 3
+MAIN_CATCH_PER_BLOCK = 6
+MAIN_TRIALS_PER_BLOCK = 14
+MAIN_PER_CUE = 14             # در مجموع ۳ بلاک
+MAIN_INCONSISTENT_PER_CUE = 2  # از ۱۴ تا → ۱۲ consistent + ۲ inconsistent
+MAIN_INCONSISTENT_PER_BLOCK = 2
+
+RandomLike = Union[random.Random, int, None]
+
+
+def make_rng(rng: RandomLike) -> random.Random:
+    """random.Random از seed صریح؛ نمونه random.Random بدون تغییر برمی‌گردد"""
+    return rng if isinstance(rng, random.Random) else random.Random(rng)
+
+
+def shuffle(items: list, rng: random.Random) -> None:
+    """
+    جایگشت تصادفی درجا با مرتب‌سازی روی کلید rng.random(). random.shuffle برای هر عنصر _randbelow
+    (کد پایتون) صدا می‌زند و در این لیست‌های کوتاه حدود دو برابر کندتر است.
+    """
+    rnd = rng.random
+    items.sort(key=lambda _: rnd())
+
+
+def fill_least_used(cue_list: Sequence[str], counts: Counter, n: int, cap: int) -> List[str]:
+    """
+    n کیو برای تریال‌های consistent: هر بار کم‌استفاده‌ترین کیو (در تساوی به ترتیب cue_list) از بین کیوهای
+    زیر cap، یا از همه اگر هیچ‌کدام زیر cap نیست. همان نتیجه n بار min گرفتن، ولی به صورت دور به دور:
+    کیوهای هم‌سطح تا سطح بعدی (یا cap) یکی‌یکی بالا می‌روند. counts به‌روز می‌شود؛ ترتیب خروجی مهم نیست.
+    """
+    picks = []
+    while n > 0:
+        pool = [c for c in cue_list if counts[c] < cap] or cue_list
+        level = min(counts[c] for c in pool)
+        at_level = [c for c in pool if counts[c] == level]
+        higher = [counts[c] - level for c in pool if counts[c] > level]
+        if pool is not cue_list:
+            higher.append(cap - level)
+        rounds = min(min(higher, default=n), n // len(at_level))
+        if rounds == 0:
+            at_level = at_level[:n]
+            rounds = 1
+        for cue in at_level:
+            counts[cue] += rounds
+            picks.extend([cue] * rounds)
+        n -= rounds * len(at_level)
+    return picks
+
+
+def cue_mapping(cues: Sequence[str], permutation: int) -> Dict[str, str]:
+    """نگاشت کیو -> توالی مورد انتظار برای شرط permutation از CUE_PERMUTATIONS"""
+    return dict(zip(cues, CUE_PERMUTATIONS[permutation]))
+
+
+@dataclass
+class CueUsage:
+    """تریال‌های ثبت‌شده هر کیو: کل، inconsistent و توالی‌های پخش‌شده در inconsistentها"""
+    total: Counter = field(default_factory=Counter)
+    inconsistent: Counter = field(default_factory=Counter)
+    inconsistent_seqs: Dict[str, Set[str]] = field(default_factory=dict)
+
+    @classmethod
+    def from_groups(cls, groups: Iterable[Mapping], normalize: Optional[Callable] = None) -> 'CueUsage':
+        """
+        groups: ردیف‌های گروه‌بندی‌شده پاسخ‌ها با کلیدهای cue، n، is_consistent، category_stim1/2
+        (PCMProgress.seq_practice_block_groups / main_groups). normalize کیو ذخیره‌شده را به کلید نگاشت می‌برد.
+        """
+        usage = cls()
+        for g in groups:
+            if not g['cue']:
+                continue
+            cue = normalize(g['cue']) if normalize else g['cue']
+            usage.total[cue] += g['n']
+            if not g['is_consistent']:
+                usage.inconsistent[cue] += g['n']
+                if g['category_stim1'] and g['category_stim2']:
+                    usage.inconsistent_seqs.setdefault(cue, set()).add(f"{g['category_stim1']}-{g['category_stim2']}")
+        return usage
+
+
+@dataclass(frozen=True)
+class MainBlockState:
+    """وضعیت یک بلاک آزمون اصلی در لحظه ساخت پلن"""
+    block: int
+    catch_done: int = 0
+    main_done: int = 0
+    inconsistent_done: int = 0
+    catch_cues: Mapping[str, int] = field(default_factory=dict)
+
+
+# ---------- مرحله 1: تمرین رتبه‌بندی خوشایندی ----------
+def valence_practice_sequences(total_trials: int, done: int, counts: Mapping[str, int], rng: RandomLike) -> List[str]:
+    """توالی تریال‌های باقی‌مانده؛ هر توالی total_trials/3 بار (کمبودها بر اساس counts)"""
+    rng = make_rng(rng)
+    remain_trials = total_trials - done
+    target_per_seq, remainder_total = divmod(total_trials, len(SEQUENCES))
+
+    sequence_order = []
+    for i, seq in enumerate(SEQUENCES):
+        target = target_per_seq + (1 if i < remainder_total else 0)
+        sequence_order.extend([seq] * max(0, target - counts.get(seq, 0)))
+
+    # اگر به هر دلیلی کمبود داشتیم
+    while len(sequence_order) < remain_trials:
+        sequence_order.append(rng.choice(SEQUENCES))
+
+    # فقط shuffle ساده (بدون محدودیت پشت‌سرهم)
+    shuffle(sequence_order, rng)
+    return sequence_order
+
+
+# ---------- مرحله 2: تمرین تشخیص توالی ----------
+def seq_practice_trials(
+    cues_mapping: Mapping[str, str],
+    usage: CueUsage,
+    remain_trials: int,
+    done: int,
+    rng: RandomLike,
+    per_cue: int = SEQ_PER_CUE,
+    inconsistent_per_cue: int = SEQ_INCONSISTENT_PER_CUE,
+    consistent_first: int = SEQ_CONSISTENT_FIRST,
+) -> List[dict]:
+    """
+    تریال‌های باقی‌مانده تمرین یک بلاک: در کل بلاک per_cue تریال از هر کیو که inconsistent_per_cue تای آن
+    inconsistent است (هر کدام با یکی از دو توالی دیگر)، و consistent_first تریال اول بلاک consistent.
+    usage: تریال‌های ثبت‌شده همین بلاک؛ done: تعداد آن‌ها.
+    """
+    rng = make_rng(rng)
+    cue_list = list(cues_mapping)
+
+    need_total = {}
+    need_incons_seqs = {}  # توالی‌های inconsistent که هنوز باید بیایند
+    for cue in cue_list:
+        expected = cues_mapping[cue]
+        need_total[cue] = max(0, per_cue - usage.total[cue])
+        need_incons = max(0, inconsistent_per_cue - usage.inconsistent[cue])
+        already_seqs = usage.inconsistent_seqs.get(cue, ())
+        missing = [s for s in SEQUENCES if s != expected and s not in already_seqs]
+        need_incons_seqs[cue] = missing[:need_incons]
+
+    # ---------- inconsistentهای باقی‌مانده ----------
+    remaining_incons = [
+        {'cue': cue, 'expected_seq': actual_seq, 'is_consistent': False}  # actual sequence که باید پخش شود
+        for cue in cue_list
+        for actual_seq in need_incons_seqs[cue]
+    ]
+    if len(remaining_incons) > remain_trials:
+        shuffle(remaining_incons, rng)
+        remaining_incons = remaining_incons[:remain_trials]
+
+    # ---------- consistentها برای رسیدن به per_cue تا از هر کیو ----------
+    cons_pool = [
+        {'cue': cue, 'expected_seq': cues_mapping[cue], 'is_consistent': True}
+        for cue in cue_list
+        for _ in range(max(0, need_total[cue] - len(need_incons_seqs[cue])))
+    ]
+    if len(remaining_incons) + len(cons_pool) > remain_trials:
+        # فقط وقتی بخشی از consistentها کنار گذاشته می‌شوند ترتیب pool مهم است
+        shuffle(cons_pool, rng)
+
+    remaining_plan = remaining_incons + cons_pool[:max(0, remain_trials - len(remaining_incons))]
+
+    # اگر هنوز کم است (نباید)، از کم‌استفاده‌ترین کیو consistent اضافه کن
+    if len(remaining_plan) < remain_trials:
+        planned = usage.total + Counter(t['cue'] for t in remaining_plan)
+        while len(remaining_plan) < remain_trials:
+            candidates = [c for c in cue_list if planned[c] < per_cue] or cue_list
+            cue = min(candidates, key=planned.__getitem__)
+            remaining_plan.append({'cue': cue, 'expected_seq': cues_mapping[cue], 'is_consistent': True})
+            planned[cue] += 1
+
+    cons = [t for t in remaining_plan if t['is_consistent']]
+    incons = [t for t in remaining_plan if not t['is_consistent']]
+    # اگر بیشتر شد، فقط consistentها را کم کن
+    if len(remaining_plan) > remain_trials:
+        shuffle(cons, rng)
+        cons = cons[:max(0, remain_trials - len(incons))]
+
+    # ========== قانون consistent_first تای اول (حتی بعد از رفرش) ==========
+    first_remaining = max(0, consistent_first - done)
+    if not first_remaining:
+        remaining_plan = incons + cons
+        shuffle(remaining_plan, rng)
+        return remaining_plan
+
+    # فقط در حالت اضطراری inconsistent را به consistent تبدیل کن
+    while len(cons) < first_remaining and incons:
+        item = incons.pop(0)
+        cons.append({'cue': item['cue'], 'expected_seq': cues_mapping[item['cue']], 'is_consistent': True})
+
+    shuffle(cons, rng)
+    rest = cons[first_remaining:] + incons
+    shuffle(rest, rng)
+    return cons[:first_remaining] + rest
+
+
+def practice_catch_cues(cue_list: Sequence[str], used: Mapping[str, int], count: int, rng: RandomLike,
+                        per_cue: int = CATCH_PER_CUE) -> List[str]:
+    """catchهای بلاک تمرین که همراه تمرین برنامه‌ریزی می‌شوند؛ per_cue تا از هر کیو منهای ثبت‌شده‌ها"""
+    rng = make_rng(rng)
+    catch_plan = [cue for cue in cue_list for _ in range(per_cue)]
+    shuffle(catch_plan, rng)
+
+    used = Counter(used)
+    final = []
+    for cue in catch_plan:
+        if used[cue] > 0:
+            used[cue] -= 1
+        else:
+            final.append(cue)
+
+    while len(final) < count:
+        least_used = min(cue_list, key=used.__getitem__)
+        final.append(least_used)
+        used[least_used] += 1
+    return final[:count]
+
+
+def remaining_catch_cues(cue_list: Sequence[str], used: Mapping[str, int], remain: int, rng: RandomLike,
+                         per_cue: int = CATCH_PER_CUE) -> List[str]:
+    """کیوهای remain تریال catch باقی‌مانده؛ per_cue تا از هر کیو در کل بلاک"""
+    rng = make_rng(rng)
+    used = dict(used)
+    remaining = [cue for cue in cue_list for _ in range(max(0, per_cue - used.get(cue, 0)))]
+
+    if len(remaining) < remain:
+        for cue in cue_list:
+            if used.get(cue, 0) < per_cue:
+                remaining.append(cue)
+                used[cue] = used.get(cue, 0) + 1
+                if len(remaining) >= remain:
+                    break
+
+    shuffle(remaining, rng)
+    return remaining[:remain]
+
+
+# ---------- مرحله ۳: آزمون اصلی ----------
+def main_tracks(
+    cues_mapping: Mapping[str, str],
+    usage: CueUsage,
+    used_mismatches: Iterable[Tuple[str, str]],
+    blocks: Sequence[MainBlockState],
+    rng: RandomLike,
+) -> Tuple[Dict[str, list], Optional[int]]:
+    """
+    تریال‌های باقی‌مانده همه بلاک‌های آزمون اصلی.
+    هدف سراسری: MAIN_PER_CUE تریال از هر کیو که MAIN_INCONSISTENT_PER_CUE تای آن inconsistent است
+    (هر mismatch حداکثر یک‌بار)، و در هر بلاک MAIN_INCONSISTENT_PER_BLOCK inconsistent.
+    usage: تریال‌های ثبت‌شده کل بلاک‌ها؛ used_mismatches: (expected، actual) های ثبت‌شده.
+    خروجی: ({'catch:N': [...], 'main:N': [...]}، اولین بلاک ناتمام یا None)
+    """
+    rng = make_rng(rng)
+    cue_list = list(cues_mapping)
+    used_mismatches = set(used_mismatches)
+    remaining_mismatches = [m for m in MISMATCHES if m not in used_mismatches]
+    shuffle(remaining_mismatches, rng)
+    mismatch_idx = 0
+
+    # شمارنده ثبت‌شده + برنامه‌ریزی‌شده در همین پلن (تا بلاک‌های بعدی هم تعادل را ببینند)
+    cue_count = Counter(usage.total)
+    incons_count = Counter(usage.inconsistent)
+    incons_seqs = {cue: set(seqs) for cue, seqs in usage.inconsistent_seqs.items()}
+    cues_by_expected = {}
+    for cue, expected in cues_mapping.items():
+        cues_by_expected.setdefault(expected, []).append(cue)
+
+    tracks = {}
+    current_block = None
+    for state in blocks:
+        if current_block is None and (
+            state.catch_done < MAIN_CATCH_PER_BLOCK or state.main_done < MAIN_TRIALS_PER_BLOCK
+        ):
+            current_block = state.block
+
+        # --- catchهای این بلاک ---
+        if state.catch_done < MAIN_CATCH_PER_BLOCK:
+            cues = remaining_catch_cues(cue_list, state.catch_cues, MAIN_CATCH_PER_BLOCK - state.catch_done, rng)
+            tracks[f'catch:{state.block}'] = [{'cue': cue, 'expected_seq': cues_mapping.get(cue)} for cue in cues]
+
+        if state.main_done >= MAIN_TRIALS_PER_BLOCK:
+            continue
+
+        # --- توالی‌های main این بلاک ---
+        remain_main = MAIN_TRIALS_PER_BLOCK - state.main_done
+        remain_inconsistent = max(0, MAIN_INCONSISTENT_PER_BLOCK - state.inconsistent_done)
+        trials = []
+
+        # inconsistentها (هدف سراسری: ۲ تا برای هر کیو)
+        for _ in range(remain_inconsistent):
+            chosen = None
+            while mismatch_idx < len(remaining_mismatches):
+                expected_seq, actual_seq = remaining_mismatches[mismatch_idx]
+                mismatch_idx += 1
+                candidates = [
+                    c for c in cues_by_expected.get(expected_seq, ())
+                    if incons_count[c] < MAIN_INCONSISTENT_PER_CUE and actual_seq not in incons_seqs.get(c, ())
+                ]
+                if candidates:
+                    cue = min(candidates, key=cue_count.__getitem__)
+                    chosen = {'actual_seq': actual_seq, 'cue': cue, 'expected_seq': expected_seq}
+                    break
+
+            if chosen is None:
+                # fallback: کیویی که هنوز inconsistent کم دارد
+                needy = [c for c in cue_list if incons_count[c] < MAIN_INCONSISTENT_PER_CUE] or cue_list
+                cue = min(needy, key=cue_count.__getitem__)
+                expected_seq = cues_mapping[cue]
+                other_seqs = [s for s in SEQUENCES if s != expected_seq]
+                missing = [s for s in other_seqs if s not in incons_seqs.get(cue, ())]
+                actual_seq = missing[0] if missing else rng.choice(other_seqs)
+                chosen = {'actual_seq': actual_seq, 'cue': cue, 'expected_seq': expected_seq}
+
+            trials.append(chosen)
+            cue_count[chosen['cue']] += 1
+            incons_count[chosen['cue']] += 1
+            incons_seqs.setdefault(chosen['cue'], set()).add(chosen['actual_seq'])
+
+        # consistentها: اولویت با کیوهایی که هنوز زیر MAIN_PER_CUE هستند
+        for cue in fill_least_used(cue_list, cue_count, remain_main - remain_inconsistent, MAIN_PER_CUE):
+            seq = cues_mapping[cue]
+            trials.append({'actual_seq': seq, 'cue': cue, 'expected_seq': seq})
+
+        shuffle(trials, rng)
+        tracks[f'main:{state.block}'] = trials
+
+    return tracks, current_block
@@ -0,0 +1,168 @@
+from collections import Counter
+from functools import cached_property
+from typing import Dict, List, Optional, Set
+
+from django.db.models import Count, Q
+
+from .models import (
+    ParticipantProgress,
+    PCMCatchResponse,
+    PCMMainResponse,
+    PCMSequenceCatchResponse,
+    PCMSequencePracticeResponse,
+    PCMValencePracticeResponse,
+    RatingMainResponse,
+)
+
+
+def used_stimulus_keys(rows) -> Set[str]:
+    """صداهای مصرف‌شده (شماره فایل، همان‌طور که در جدول پاسخ‌ها ذخیره می‌شود)"""
+    used = set()
+    for stimulus1, stimulus2 in rows:
+        if stimulus1:
+            used.add(stimulus1)
+        if stimulus2:
+            used.add(stimulus2)
+    return used
+
+
+class PCMProgress:
+    """
+    تصویر لحظه‌ای پیشرفت یک شرکت‌کننده در مراحل PCM.
+
+    هر جدول پاسخ حداکثر یک‌بار و با یک کوئری گروه‌بندی‌شده (Count با filter=Q) خوانده می‌شود؛
+    صداهای مصرف‌شده هر مرحله هم با یک کوئری سبک جدا و فقط در صورت نیاز.
+    همه مقادیر lazy هستند و شمارش‌های مسیریابی مراحل (تعداد هر مرحله/بلاک) از ردیف
+    ParticipantProgress خوانده می‌شوند؛ پس تشخیص مرحله جاری یک خواندن با کلید اصلی است و
+    کوئری‌های گروه‌بندی‌شده فقط برای مرحله‌ای اجرا می‌شوند که پلنش ساخته می‌شود.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def participant(self) -> ParticipantProgress:
+        return ParticipantProgress.for_user(self.user)
+
+    def _rows(self, model, **filters):
+        return model.objects.filter(user=self.user, **filters).order_by()
+
+    # ---------- مرحله 1: تمرین رتبه‌بندی خوشایندی ----------
+    @cached_property
+    def valence_practice_sequences(self) -> Counter:
+        """تعداد تریال‌ها به تفکیک توالی (category_stim1-category_stim2)؛ کلید None برای توالی نامعلوم"""
+        groups = (
+            self._rows(PCMValencePracticeResponse)
+            .values('category_stim1', 'category_stim2')
+            .annotate(n=Count('pk'))
+        )
+        counts = Counter()
+        for g in groups:
+            seq = f"{g['category_stim1']}-{g['category_stim2']}" if g['category_stim1'] and g['category_stim2'] else None
+            counts[seq] += g['n']
+        return counts
+
+    @property
+    def valence_practice_count(self) -> int:
+        return self.participant.valence_practice
+
+    @cached_property
+    def valence_practice_used_stimuli(self) -> Set[str]:
+        return used_stimulus_keys(self._rows(PCMValencePracticeResponse).values_list('stimulus1', 'stimulus2'))
+
+    # ---------- مرحله 2: تمرین تشخیص توالی (فقط پاسخ‌های فعال) ----------
+    @cached_property
+    def seq_practice_groups(self) -> List[dict]:
+        return list(
+            self._rows(PCMSequencePracticeResponse, is_active=True)
+            .values('block', 'cue', 'is_consistent', 'category_stim1', 'category_stim2')
+            .annotate(n=Count('pk'), correct=Count('pk', filter=Q(is_correct=True)))
+        )
+
+    @cached_property
+    def seq_catch_groups(self) -> List[dict]:
+        return list(
+            self._rows(PCMSequenceCatchResponse, is_active=True)
+            .values('block', 'cue')
+            .annotate(n=Count('pk'), correct=Count('pk', filter=Q(is_correct=True)))
+        )
+
+    def seq_block(self, block: int) -> Dict[str, int]:
+        """{practice, practice_correct, catch, catch_correct} یک بلاک"""
+        return self.participant.seq_block(block)
+
+    @property
+    def last_seq_block(self) -> int:
+        blocks = [int(block) for block in self.participant.seq_blocks if block.isdigit()]
+        return max(blocks, default=0)
+
+    def seq_practice_block_groups(self, block: int) -> List[dict]:
+        return [g for g in self.seq_practice_groups if g['block'] == block]
+
+    def seq_catch_cues(self, block: int) -> Counter:
+        return Counter({g['cue']: g['n'] for g in self.seq_catch_groups if g['block'] == block})
+
+    def seq_practice_used_stimuli(self, block: int) -> Set[str]:
+        return used_stimulus_keys(
+            self._rows(PCMSequencePracticeResponse, is_active=True, block=block).values_list('stimulus1', 'stimulus2')
+        )
+
+    # ---------- مرحله 3: آزمون اصلی ----------
+    @cached_property
+    def pcm_catch_groups(self) -> List[dict]:
+        return list(self._rows(PCMCatchResponse).values('block', 'cue').annotate(n=Count('pk')))
+
+    def pcm_catch_count(self, block: int) -> int:
+        return self.participant.pcm_block(block)['catch']
+
+    def pcm_catch_cues(self, block: int) -> Counter:
+        cues = Counter()
+        for g in self.pcm_catch_groups:
+            if g['block'] == block:
+                cues[g['cue']] += g['n']
+        return cues
+
+    @cached_property
+    def main_groups(self) -> List[dict]:
+        return list(
+            self._rows(PCMMainResponse)
+            .values('block', 'cue', 'is_consistent', 'expected_sequence', 'category_stim1', 'category_stim2')
+            .annotate(n=Count('pk'))
+        )
+
+    def main_count(self, block: int) -> int:
+        return self.participant.pcm_block(block)['main']
+
+    def main_inconsistent_count(self, block: int) -> int:
+        return sum(g['n'] for g in self.main_groups if g['block'] == block and g['is_consistent'] is False)
+
+    @cached_property
+    def main_trials(self) -> List[tuple]:
+        """(block, trial, stimulus1, stimulus2) به ترتیب ثبت؛ برای صداهای مصرف‌شده و آخرین تریال"""
+        return list(
+            self._rows(PCMMainResponse)
+            .order_by('created_at')
+            .values_list('block', 'trial', 'stimulus1', 'stimulus2')
+        )
+
+    @property
+    def main_used_stimuli(self) -> Set[str]:
+        return used_stimulus_keys((s1, s2) for _, _, s1, s2 in self.main_trials)
+
+    @property
+    def main_last(self) -> Optional[tuple]:
+        """(block, trial) آخرین پاسخ ثبت‌شده"""
+        return self.main_trials[-1][:2] if self.main_trials else None
+
+    # ---------- مرحله 4 و 5: رتبه‌بندی ----------
+    @property
+    def rating_practice_count(self) -> int:
+        return self.participant.pcm_rating_practice
+
+    @cached_property
+    def rating_main_completed_files(self) -> Set[str]:
+        """فایل‌هایی که هر دو رتبه valence و arousal آن‌ها ثبت شده است"""
+        return set(
+            self._rows(RatingMainResponse, valence__isnull=False, arousal__isnull=False)
+            .values_list('stimulus_file', flat=True)
+        )
@@ -0,0 +1,152 @@
+"""
+تعریف پرسشنامه‌ها (پرسشنامه، سؤال‌ها و گزینه‌ها) به صورت کش‌شده.
+
+هر پرسشنامه فعال یک‌بار از پایگاه داده خوانده و به دیکشنری ساده سریال می‌شود و با کلید نسخه‌دار در کش
+مشترک (بین workerها) ذخیره می‌شود؛ هر پردازه هم نسخه ساخته‌شده (dataclassهای فقط‌خواندنی) را در حافظه
+نگه می‌دارد. نمایش پرسشنامه و امتیازدهی پاسخ‌ها هر دو از همین تعریف استفاده می‌کنند.
+تغییر Questionnaire، Question، Choice یا Attribute (سیگنال‌ها) نسخه را در کش مشترک بالا می‌برد؛ در هر حال
+تعریف هر پردازه حداکثر پس از QUESTIONNAIRE_CACHE_MAX_AGE ثانیه تازه می‌شود (core.versioned).
+"""
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Optional, Tuple
+
+from django.core.cache import cache
+
+from .models import Choice, Question, Questionnaire
+from .versioned import VersionedProcessCache
+
+DEFINITIONS_VERSION_KEY = 'questionnaire_definitions_version'
+DEFINITION_KEY = 'questionnaire_definition:{pk}:{version}'
+# نسخه قالب دیکشنری سریال‌شده؛ با تغییر ساختار آن بالا برده شود
+SCHEMA_VERSION = 1
+
+
+@dataclass(frozen=True)
+class ChoiceDefinition:
+    id: int
+    text: str
+    value: int
+
+
+@dataclass(frozen=True)
+class QuestionDefinition:
+    id: int
+    attribute_id: int
+    text: str
+    question_type: str
+    required: bool
+    choices: Tuple[ChoiceDefinition, ...]
+
+
+@dataclass(frozen=True)
+class QuestionnaireDefinition:
+    id: int
+    title: str
+    description: str
+    questions: Tuple[QuestionDefinition, ...]
+
+    @property
+    def pk(self):
+        return self.id
+
+    # ---------- نقشه‌های امتیازدهی ----------
+    @cached_property
+    def question_map(self) -> Dict[int, Tuple[int, str]]:
+        """سؤال -> (ویژگی، نوع سؤال)"""
+        return {q.id: (q.attribute_id, q.question_type) for q in self.questions}
+
+    @cached_property
+    def choice_map(self) -> Dict[int, Tuple[int, int]]:
+        """گزینه -> (سؤال، ارزش عددی)"""
+        return {c.id: (q.id, c.value) for q in self.questions for c in q.choices}
+
+    @cached_property
+    def attributes(self):
+        """ویژگی‌های پرسشنامه به ترتیب id"""
+        return sorted({q.attribute_id for q in self.questions})
+
+    # ---------- سریال‌سازی ----------
+    def to_dict(self) -> dict:
+        return {
+            'schema': SCHEMA_VERSION,
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'questions': [
+                [q.id, q.attribute_id, q.text, q.question_type, q.required, [[c.id, c.text, c.value] for c in q.choices]]
+                for q in self.questions
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'QuestionnaireDefinition':
+        questions = tuple(
+            QuestionDefinition(
+                id=pk,
+                attribute_id=attribute_id,
+                text=text,
+                question_type=question_type,
+                required=required,
+                choices=tuple(ChoiceDefinition(*choice) for choice in choices),
+            )
+            for pk, attribute_id, text, question_type, required, choices in data['questions']
+        )
+        return cls(data['id'], data['title'], data['description'], questions)
+
+    @classmethod
+    def load(cls, pk: int) -> Optional['QuestionnaireDefinition']:
+        """خواندن از پایگاه داده با سه کوئری؛ برای پرسشنامه نبود یا غیرفعال None"""
+        questionnaire = Questionnaire.objects.filter(pk=pk, is_active=True).values('title', 'description').first()
+        if questionnaire is None:
+            return None
+        choices = {}
+        for choice_pk, question_pk, text, value in (
+            Choice.objects.filter(question__questionnaire_id=pk)
+            .order_by('pk')
+            .values_list('pk', 'question_id', 'text', 'value')
+        ):
+            choices.setdefault(question_pk, []).append(ChoiceDefinition(choice_pk, text, value))
+        questions = tuple(
+            QuestionDefinition(
+                id=question_pk,
+                attribute_id=attribute_id,
+                text=text,
+                question_type=question_type,
+                required=required,
+                choices=tuple(choices.get(question_pk, ())),
+            )
+            # ترتیب پیش‌فرض Question (order)
+            for question_pk, attribute_id, text, question_type, required in (
+                Question.objects.filter(questionnaire_id=pk)
+                .values_list('pk', 'attribute_id', 'text', 'question_type', 'required')
+            )
+        )
+        return cls(pk, questionnaire['title'], questionnaire['description'], questions)
+
+
+_cache = VersionedProcessCache(DEFINITIONS_VERSION_KEY, 'QUESTIONNAIRE_CACHE_MAX_AGE')
+
+
+def _load_definition(pk: int, version) -> Optional[QuestionnaireDefinition]:
+    key = DEFINITION_KEY.format(pk=pk, version=version)
+    data = cache.get(key)
+    if data is not None and data.get('schema') == SCHEMA_VERSION:
+        return QuestionnaireDefinition.from_dict(data)
+    definition = QuestionnaireDefinition.load(pk)
+    if definition is not None:
+        cache.set(key, definition.to_dict(), _cache.max_age())
+    return definition
+
+
+def questionnaire_definition(pk: int) -> Optional[QuestionnaireDefinition]:
+    """
+    تعریف پرسشنامه فعال pk (None اگر وجود ندارد یا غیرفعال است).
+    ترتیب جست‌وجو: حافظه همین پردازه، کش مشترک، پایگاه داده.
+    """
+    return _cache.get(pk, _load_definition)
+
+
+def invalidate_definitions() -> None:
+    """بعد از commit تغییر تعریف‌ها صدا زده می‌شود تا همه پردازه‌ها تعریف‌ها را دوباره بخوانند"""
+    _cache.invalidate()
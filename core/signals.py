@@ -0,0 +1,129 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import (
+    Attribute,
+    Choice,
+    FeedbackSettings,
+    ParticipantProgress,
+    PCMCatchResponse,
+    PCMMainResponse,
+    PCMSequenceCatchResponse,
+    PCMSequencePracticeResponse,
+    PCMSessionPlan,
+    PCMValencePracticeResponse,
+    Question,
+    Questionnaire,
+    RatingMainResponse,
+    RatingPractice,
+    RatingPracticeResponse,
+    RatingResponse,
+    Stimulus,
+    StimulusSet,
+    StimulusNorm,
+    StimulusSetMember,
+)
+from .config import invalidate_config
+from .questionnaires import invalidate_definitions
+from .stimuli import invalidate_catalog
+
+PCM_RESPONSE_MODELS = (
+    PCMValencePracticeResponse,
+    PCMSequencePracticeResponse,
+    PCMSequenceCatchResponse,
+    PCMCatchResponse,
+    PCMMainResponse,
+    RatingPracticeResponse,
+    RatingMainResponse,
+)
+
+RATING_RESPONSE_MODELS = (
+    RatingPractice,
+    RatingResponse,
+)
+
+
+# حذف پاسخ‌ها (مثلاً ریست شرکت‌کننده از پنل ادمین) یا ویرایش آن‌ها (مثلاً غیرفعال کردن is_active یا تغییر
+# is_correct برای تکرار بلاک) پلن جلسه را باطل می‌کند؛ build_session_plan فقط پاسخ‌های فعال را می‌شمارد
+def invalidate_session_plan_on_delete(sender, instance, **kwargs):
+    PCMSessionPlan.invalidate(instance.user_id)
+
+
+def invalidate_session_plan_on_update(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        PCMSessionPlan.invalidate(instance.user_id)
+
+
+# شمارنده‌های ParticipantProgress فقط با درج پاسخ در endpointها جلو می‌روند؛
+# حذف یا ویرایش یک پاسخ ردیف را حذف می‌کند تا در خواندن بعدی از جداول خام بازسازی شود
+def invalidate_progress_on_delete(sender, instance, **kwargs):
+    ParticipantProgress.invalidate(instance.user_id)
+
+
+def invalidate_progress_on_update(sender, instance, created, **kwargs):
+    if not created:
+        ParticipantProgress.invalidate(instance.user_id)
+
+
+for model in PCM_RESPONSE_MODELS:
+    post_delete.connect(invalidate_session_plan_on_delete, sender=model)
+    post_save.connect(invalidate_session_plan_on_update, sender=model)
+
+for model in PCM_RESPONSE_MODELS + RATING_RESPONSE_MODELS:
+    post_delete.connect(invalidate_progress_on_delete, sender=model)
+    post_save.connect(invalidate_progress_on_update, sender=model)
+
+
+# هر تغییر در کاتالوگ محرک‌ها ایندکس درون‌حافظه‌ای همه پردازه‌ها را باطل می‌کند
+def invalidate_stimulus_catalog(sender, **kwargs):
+    invalidate_catalog()
+
+
+for model in (Stimulus, StimulusSet, StimulusSetMember):
+    post_save.connect(invalidate_stimulus_catalog, sender=model)
+    post_delete.connect(invalidate_stimulus_catalog, sender=model)
+
+
+# هر پاسخ رتبه‌بندی ذخیره‌شده سهم خود را به StimulusNorm اضافه می‌کند (bulk_create در save_trial_batch
+# مستقیماً StimulusNorm.record را صدا می‌زند)؛ ویرایش یا حذف، سهم قبلی پاسخ را کم می‌کند
+def remember_norm_contribution(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._norm_previous = sender.objects.filter(pk=instance.pk).first()
+
+
+def update_norm_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_norm_previous', None)
+    if previous is not None:
+        StimulusNorm.record([previous], sign=-1)
+        instance._norm_previous = None
+    StimulusNorm.record([instance])
+
+
+def update_norm_on_delete(sender, instance, **kwargs):
+    StimulusNorm.record([instance], sign=-1)
+
+
+for model in (RatingMainResponse, RatingResponse):
+    pre_save.connect(remember_norm_contribution, sender=model)
+    post_save.connect(update_norm_on_save, sender=model)
+    post_delete.connect(update_norm_on_delete, sender=model)
+
+
+# تعریف کش‌شده پرسشنامه‌ها (core.questionnaires) با هر ویرایش پرسشنامه، سؤال، گزینه یا ویژگی باطل می‌شود
+def invalidate_questionnaire_definitions(sender, **kwargs):
+    invalidate_definitions()
+
+
+for model in (Questionnaire, Question, Choice, Attribute):
+    post_save.connect(invalidate_questionnaire_definitions, sender=model)
+    post_delete.connect(invalidate_questionnaire_definitions, sender=model)
+
+
+# تنظیمات کش‌شده آزمون (core.config) با هر تغییر FeedbackSettings باطل می‌شود
+def invalidate_pcm_config(sender, **kwargs):
+    invalidate_config()
+
+
+post_save.connect(invalidate_pcm_config, sender=FeedbackSettings)
+post_delete.connect(invalidate_pcm_config, sender=FeedbackSettings)
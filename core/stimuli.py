@@ -0,0 +1,165 @@
+"""
+کاتالوگ محرک‌های صوتی.
+
+جداول Stimulus / StimulusSet یک‌بار در هر پردازه خوانده و به یک ایندکس فقط‌خواندنی در حافظه
+تبدیل می‌شوند؛ ویوها فقط از همین ایندکس URLها را می‌گیرند و در هر درخواست لیستی ساخته نمی‌شود.
+تغییر کاتالوگ (مثلاً از پنل ادمین) نسخه کاتالوگ را در کش مشترک بالا می‌برد و هر پردازه در درخواست‌های
+بعدی ایندکس را دوباره می‌سازد؛ در هر حال ایندکس حداکثر پس از STIMULUS_CATALOG_MAX_AGE ثانیه تازه
+می‌شود (core.versioned).
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import Stimulus, StimulusSetMember
+from .storage import hashed_audio_name, unhashed_audio_name
+from .versioned import VersionedProcessCache
+
+CATALOG_VERSION_KEY = 'stimulus_catalog_version'
+
+
+def sounds_dir() -> Path:
+    return Path(getattr(settings, 'STIMULUS_SOUNDS_DIR', settings.BASE_DIR / 'static' / 'sounds'))
+
+
+def manifest_path() -> Path:
+    """مانیفست JSON خروجی build_stimulus_manifest"""
+    return Path(getattr(settings, 'STIMULUS_MANIFEST_PATH', sounds_dir() / 'manifest.json'))
+
+
+SOUNDS_URL_PREFIX = '/static/sounds/'
+
+
+def build_audio_url(filename: str, content_hash: str = '') -> str:
+    """
+    URL فایل صوتی. با STIMULUS_HASHED_URLS و هش محتوای معلوم، نام هش‌دار ساخته‌شده توسط
+    StimulusStaticFilesStorage برمی‌گردد که قابل کش دائمی است.
+    """
+    if content_hash and getattr(settings, 'STIMULUS_HASHED_URLS', False):
+        filename = hashed_audio_name(filename, content_hash)
+    return f"{SOUNDS_URL_PREFIX}{filename}"
+
+
+def stimulus_path(url: Optional[str]) -> Optional[str]:
+    """مسیر کاتالوگ از روی URL صدا (با یا بدون هش): '/static/sounds/5-MP-MA/102.<hash>.mp3' -> '5-MP-MA/102.mp3'"""
+    if not url:
+        return None
+    if url.startswith(SOUNDS_URL_PREFIX):
+        url = url[len(SOUNDS_URL_PREFIX):]
+    return unhashed_audio_name(url)
+
+
+def canonical_audio_url(url: Optional[str]) -> Optional[str]:
+    """URL بدون هش؛ برای ذخیره در جداول پاسخ تا ردیف‌ها به نسخه فایل وابسته نباشند"""
+    path = stimulus_path(url)
+    return f"{SOUNDS_URL_PREFIX}{path}" if path else url
+
+
+def extract_stimulus_number(url: Optional[str]) -> Optional[int]:
+    """استخراج شماره stimulus از URL فایل صوتی (مثل 102 از 102.mp3)"""
+    if not url:
+        return None
+    try:
+        filename = url.split('/')[-1]
+        number_str = filename.split('.')[0]
+        return int(number_str)
+    except (IndexError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class StimulusEntry:
+    path: str
+    category: str
+    valence_class: str
+    arousal_class: str
+    duration: Optional[float]
+    byte_size: Optional[int]
+    content_hash: str
+    sample_rate: Optional[int]
+    lufs: Optional[float]
+    url: str
+
+
+class StimulusCatalog:
+    """ایندکس فقط‌خواندنی: مسیر -> محرک و نام مجموعه -> محرک‌های مرتب آن"""
+
+    def __init__(self, entries, sets: Dict[str, tuple]):
+        self._by_path = MappingProxyType({entry.path: entry for entry in entries})
+        self._sets = MappingProxyType({name: tuple(members) for name, members in sets.items()})
+        self._urls = MappingProxyType({name: tuple(entry.url for entry in members) for name, members in self._sets.items()})
+
+    def __contains__(self, path) -> bool:
+        return path in self._by_path
+
+    def get(self, path: str) -> Optional[StimulusEntry]:
+        return self._by_path.get(path)
+
+    def url(self, path: str) -> str:
+        """URL فعلی یک فایل (مثلاً برای cueهای ذخیره‌شده در PCMCueMapping)"""
+        entry = self._by_path.get(path)
+        return entry.url if entry else build_audio_url(path)
+
+    def set_names(self) -> Tuple[str, ...]:
+        return tuple(self._sets)
+
+    def stimuli(self, name: str) -> Tuple[StimulusEntry, ...]:
+        try:
+            return self._sets[name]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f"مجموعه محرک «{name}» در کاتالوگ وجود ندارد (migrate اجرا شده است؟)"
+            ) from None
+
+    def urls(self, name: str) -> Tuple[str, ...]:
+        self.stimuli(name)
+        return self._urls[name]
+
+    @classmethod
+    def load(cls) -> 'StimulusCatalog':
+        entries = [
+            StimulusEntry(
+                path=s.path,
+                category=s.category,
+                valence_class=s.valence_class,
+                arousal_class=s.arousal_class,
+                duration=s.duration,
+                byte_size=s.byte_size,
+                content_hash=s.content_hash,
+                sample_rate=s.sample_rate,
+                lufs=s.lufs,
+                url=build_audio_url(s.path, s.content_hash),
+            )
+            for s in Stimulus.objects.filter(is_active=True)
+        ]
+        by_path = {entry.path: entry for entry in entries}
+
+        sets = {}
+        members = (
+            StimulusSetMember.objects
+            .order_by('stimulus_set__name', 'position', 'pk')
+            .values_list('stimulus_set__name', 'stimulus__path')
+        )
+        for name, path in members:
+            members_of_set = sets.setdefault(name, [])
+            # محرک غیرفعال از همه مجموعه‌ها کنار گذاشته می‌شود
+            if path in by_path:
+                members_of_set.append(by_path[path])
+        return cls(entries, sets)
+
+
+_cache = VersionedProcessCache(CATALOG_VERSION_KEY, 'STIMULUS_CATALOG_MAX_AGE')
+
+
+def stimulus_catalog() -> StimulusCatalog:
+    """ایندکس کاتالوگ همین پردازه؛ فقط در صورت تغییر نسخه یا گذشتن MAX_AGE دوباره خوانده می‌شود"""
+    return _cache.get(None, lambda key, version: StimulusCatalog.load())
+
+
+def invalidate_catalog() -> None:
+    """بعد از commit تغییرات کاتالوگ صدا زده می‌شود تا همه پردازه‌ها ایندکس را دوباره بسازند"""
+    _cache.invalidate()
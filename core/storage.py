@@ -0,0 +1,53 @@
+import hashlib
+import posixpath
+import re
+
+from django.contrib.staticfiles.storage import StaticFilesStorage
+
+AUDIO_HASH_LENGTH = 12
+HASHED_AUDIO_PREFIX = 'sounds/'
+HASHED_AUDIO_EXTENSIONS = ('.mp3',)
+HASHED_NAME_RE = re.compile(r'^(?P<stem>.+)\.[0-9a-f]{%d}(?P<ext>\.[A-Za-z0-9]+)$' % AUDIO_HASH_LENGTH)
+
+
+def hashed_audio_name(name: str, content_hash: str) -> str:
+    """'5-MP-MA/102.mp3' + sha256 -> '5-MP-MA/102.<12 کاراکتر اول هش>.mp3'"""
+    root, ext = posixpath.splitext(name)
+    return f"{root}.{content_hash[:AUDIO_HASH_LENGTH]}{ext}"
+
+
+def unhashed_audio_name(name: str) -> str:
+    """عکس hashed_audio_name؛ نام بدون هش بدون تغییر برمی‌گردد"""
+    directory, filename = posixpath.split(name)
+    match = HASHED_NAME_RE.match(filename)
+    if match:
+        filename = match.group('stem') + match.group('ext')
+    return posixpath.join(directory, filename) if directory else filename
+
+
+class StimulusStaticFilesStorage(StaticFilesStorage):
+    """
+    مشابه ManifestStaticFilesStorage ولی فقط برای صداهای محرک.
+    collectstatic از هر فایل sounds/**.mp3 یک کپی با نام هش‌دار (sha256 محتوا، مثل ستون
+    Stimulus.content_hash) کنار نسخه اصلی می‌سازد؛ نسخه‌های قبلی پاک نمی‌شوند تا صفحه‌های باز
+    شرکت‌کنندگان در حین deploy خراب نشوند. نام‌های هش‌دار هرگز تغییر محتوا ندارند و وب‌سرور
+    می‌تواند آن‌ها را با Cache-Control: immutable سرو کند. بقیه فایل‌های static دست نمی‌خورند.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for name in sorted(paths):
+            if not (name.startswith(HASHED_AUDIO_PREFIX) and name.lower().endswith(HASHED_AUDIO_EXTENSIONS)):
+                continue
+            if HASHED_NAME_RE.match(posixpath.basename(name)):
+                continue
+            digest = hashlib.sha256()
+            with self.open(name) as f:
+                for chunk in f.chunks():
+                    digest.update(chunk)
+            hashed_name = hashed_audio_name(name, digest.hexdigest())
+            if not self.exists(hashed_name):
+                with self.open(name) as f:
+                    self._save(hashed_name, f)
+            yield name, hashed_name, True
@@ -0,0 +1,277 @@
+"""
+نوشتن دسته‌ای لاگ‌های دستگاه و حجم صدا (DeviceLog / VolumeLog).
+
+endpointهای لاگ فقط ردیف اعتبارسنجی‌شده را به بافر همین پردازه اضافه می‌کنند و هیچ کوئری‌ای روی مسیر
+درخواست اجرا نمی‌شود. یک thread پس‌زمینه بافر را با bulk_create می‌نویسد: وقتی TELEMETRY_BATCH_SIZE ردیف
+جمع شود یا TELEMETRY_FLUSH_INTERVAL ثانیه از اولین ردیف گذشته باشد، و یک‌بار هم هنگام خروج پردازه (atexit).
+
+اگر TELEMETRY_SPILL_DIR تنظیم شده باشد، ردیف‌هایی که نوشتنشان با خطای پایگاه داده مواجه شود یا بافر از
+TELEMETRY_MAX_PENDING بیشتر شود، به صورت JSON Lines به فایل append-only همین پردازه اضافه می‌شوند و بعد از
+اولین نوشتن موفق بعدی (توسط هر پردازه‌ای) دوباره در پایگاه داده درج می‌شوند. بدون آن، ردیف‌ها در حافظه
+برای تلاش بعدی نگه داشته می‌شوند و مازاد بر TELEMETRY_MAX_PENDING دور ریخته و در لاگ ثبت می‌شود.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+SPILL_SUFFIX = '.jsonl'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def serialize(instance) -> str:
+    fields = {}
+    for field in instance._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        value = getattr(instance, field.attname)
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        fields[field.attname] = value
+    return json.dumps({'model': instance._meta.label_lower, 'fields': fields}, ensure_ascii=False)
+
+
+def deserialize(line: str):
+    data = json.loads(line)
+    model = apps.get_model(data['model'])
+    fields = data['fields']
+    for field in model._meta.concrete_fields:
+        if field.get_internal_type() == 'DateTimeField' and isinstance(fields.get(field.attname), str):
+            fields[field.attname] = parse_datetime(fields[field.attname])
+    return model(**fields)
+
+
+def write_rows(rows) -> int:
+    """
+    درج ردیف‌ها (احتمالاً از چند مدل) با یک bulk_create برای هر مدل.
+    اگر دسته‌ای به خاطر داده نامعتبر (مثلاً کاربر حذف‌شده) رد شود، ردیف‌ها تک‌تک درج و ردیف‌های خراب کنار
+    گذاشته می‌شوند. خطاهای دیگر پایگاه داده (قطعی، timeout) به فراخواننده می‌رسند.
+    """
+    by_model: Dict[type, list] = {}
+    for row in rows:
+        by_model.setdefault(type(row), []).append(row)
+    written = 0
+    for model, instances in by_model.items():
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(instances)
+            written += len(instances)
+        except (IntegrityError, DataError):
+            for instance in instances:
+                instance.pk = None
+                try:
+                    with transaction.atomic():
+                        instance.save(force_insert=True)
+                    written += 1
+                except (IntegrityError, DataError) as exc:
+                    logger.warning('telemetry row dropped (%s): %s', exc, serialize(instance))
+    return written
+
+
+class TelemetryBuffer:
+    def __init__(self, batch_size=None, flush_interval=None, max_pending=None, spill_dir=None):
+        self.batch_size = batch_size or _setting('TELEMETRY_BATCH_SIZE', 200)
+        self.flush_interval = flush_interval or _setting('TELEMETRY_FLUSH_INTERVAL', 2.0)
+        self.max_pending = max_pending or _setting('TELEMETRY_MAX_PENDING', 10000)
+        spill_dir = spill_dir or _setting('TELEMETRY_SPILL_DIR', None)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+
+        self._rows: List = []
+        self._first_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    # ---------- مسیر درخواست ----------
+    def add(self, instance) -> None:
+        """افزودن یک ردیف ذخیره‌نشده؛ فقط حافظه، بدون کوئری"""
+        overflow = []
+        with self._lock:
+            if not self._rows:
+                self._first_at = time.monotonic()
+            self._rows.append(instance)
+            full = len(self._rows) >= self.batch_size
+            if len(self._rows) > self.max_pending:
+                # پایگاه داده از نوشتن عقب مانده است
+                overflow = self._rows[:-self.max_pending] if self.spill_dir is None else self._rows[:]
+                del self._rows[:len(overflow)]
+                if not self._rows:
+                    self._first_at = None
+        if overflow:
+            self._overflow(overflow)
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # بعد از fork (مثلاً preload در gunicorn) thread پردازه والد در فرزند وجود ندارد
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='telemetry-flusher', daemon=True)
+            self._thread.start()
+
+    # ---------- thread پس‌زمینه ----------
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                with self._lock:
+                    due = self._rows and (
+                        len(self._rows) >= self.batch_size
+                        or time.monotonic() - self._first_at >= self.flush_interval
+                    )
+                if due:
+                    self.flush()
+            except Exception:
+                # thread نباید بمیرد؛ در غیر این صورت بافر تا پایان پردازه دیگر نوشته نمی‌شود
+                logger.exception('telemetry flusher failed')
+
+    def flush(self) -> int:
+        """نوشتن همه ردیف‌های بافر؛ خروجی: تعداد ردیف‌های درج‌شده"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows, self._first_at = self._rows, [], None
+            if not rows:
+                return 0
+            close_old_connections()
+            try:
+                written = write_rows(rows)
+            except DatabaseError as exc:
+                logger.warning('telemetry flush of %d rows failed: %s', len(rows), exc)
+                self._keep(rows)
+                return 0
+            finally:
+                close_old_connections()
+            self.replay_spilled()
+            return written
+
+    def _keep(self, rows):
+        """ردیف‌های نوشته‌نشده برای تلاش بعدی به ابتدای بافر برمی‌گردند (یا به فایل spill)"""
+        if self.spill_dir is not None:
+            self.spill(rows)
+            return
+        with self._lock:
+            self._rows[:0] = rows
+            overflow = self._rows[:max(len(self._rows) - self.max_pending, 0)]
+            del self._rows[:len(overflow)]
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+        if overflow:
+            self._overflow(overflow)
+
+    def _overflow(self, rows):
+        if self.spill_dir is not None:
+            self.spill(rows)
+        else:
+            logger.error('telemetry buffer full, %d rows dropped', len(rows))
+
+    # ---------- spill ----------
+    def spill_path(self) -> Path:
+        return self.spill_dir / f'telemetry-{os.getpid()}{SPILL_SUFFIX}'
+
+    def spill(self, rows) -> None:
+        lines = ''.join(serialize(row) + '\n' for row in rows)
+        with self._spill_lock:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path(), 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def replay_spilled(self) -> int:
+        """
+        درج دوباره فایل‌های spill همه پردازه‌ها؛ هر فایل با rename توسط فقط یک پردازه برداشته می‌شود.
+        اگر درج فایل ناموفق باشد، فایل برداشته‌شده با نام spill تازه برمی‌گردد تا در نوبت بعد دوباره خوانده شود.
+        """
+        if self.spill_dir is None or not self.spill_dir.is_dir():
+            return 0
+        written = 0
+        for path in sorted(self.spill_dir.glob(f'*{SPILL_SUFFIX}')):
+            claimed = path.with_name(f'{path.name}.{os.getpid()}.replaying')
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                written += write_rows(self._read_spilled(claimed))
+            except Exception as exc:
+                # DatabaseError یعنی پایگاه داده هنوز در دسترس نیست؛ خطاهای دیگر در لاگ ثبت می‌شوند
+                if not isinstance(exc, DatabaseError):
+                    logger.exception('telemetry replay of %s failed', path.name)
+                # پردازه صاحب فایل ممکن است از نو در همان نام spill کرده باشد؛ نام تازه روی آن نمی‌نشیند
+                os.rename(claimed, path.with_name(f'telemetry-{os.getpid()}-{time.time_ns()}{SPILL_SUFFIX}'))
+                break
+            claimed.unlink()
+        return written
+
+    @staticmethod
+    def _read_spilled(path: Path) -> list:
+        """ردیف‌های یک فایل spill؛ خط خراب (مثلاً نیمه‌نوشته هنگام crash) در لاگ ثبت و کنار گذاشته می‌شود"""
+        rows = []
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(deserialize(line))
+                except (ValueError, LookupError, TypeError) as exc:
+                    logger.error('telemetry spill line %s:%d skipped (%s): %s', path.name, number, exc, line.strip())
+        return rows
+
+
+_buffer: Optional[TelemetryBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def telemetry_buffer() -> TelemetryBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = TelemetryBuffer()
+    return _buffer
+
+
+def record(instance) -> None:
+    """
+    ثبت یک ردیف لاگ. با TELEMETRY_BUFFERED=False (مثلاً در تست‌ها) همان لحظه ذخیره می‌شود.
+    """
+    if not _setting('TELEMETRY_BUFFERED', True):
+        instance.save()
+        return
+    telemetry_buffer().add(instance)
+
+
+async def arecord(instance) -> None:
+    """نسخه async برای ویوهای ASGI؛ بافر فقط حافظه است و ذخیره مستقیم با asave انجام می‌شود"""
+    if not _setting('TELEMETRY_BUFFERED', True):
+        await instance.asave()
+        return
+    telemetry_buffer().add(instance)
+
+
+@atexit.register
+def flush_on_exit():
+    if _buffer is not None:
+        _buffer.flush()
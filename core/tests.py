@@ -1,3 +1,435 @@
-from django.test import TestCase
+import datetime
+import importlib.util
+import json
+import random
+import tempfile
+import unittest
+from collections import Counter
 
-# Create your tests here.
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core import planning
+from core.models import (
+    CustomUser, ParticipantProgress, PCMCueAssignment, PCMCueMapping, PCMMainResponse, PCMSequencePracticeResponse,
+    PCMSessionPlan, RatingMainResponse, RatingResponse, StimulusNorm, validate_seq_practice_trials,
+)
+from core.views import MAPPING_CUES, get_or_create_cue_mapping
+
+CUES = {
+    '/static/sounds/CUE/1/1.mp3': 'Negative-Neutral',
+    '/static/sounds/CUE/1/2.mp3': 'Neutral-Negative',
+    '/static/sounds/CUE/1/3.mp3': 'Neutral-Neutral',
+}
+SEEDS = range(300)
+
+
+def usage_of(trials, actual_key):
+    """CueUsage معادل پاسخ‌های ثبت‌شده برای یک پیشوند پلن"""
+    usage = planning.CueUsage()
+    for t in trials:
+        usage.total[t['cue']] += 1
+        if t[actual_key] != CUES[t['cue']]:
+            usage.inconsistent[t['cue']] += 1
+            usage.inconsistent_seqs.setdefault(t['cue'], set()).add(t[actual_key])
+    return usage
+
+
+def rating_trial(trial, stimulus, valence, arousal=None):
+    """payload رتبه‌بندی نهایی (مرحله ۵ یا صفحه rating_2)"""
+    url = f'/static/sounds/5-MP-MA/{stimulus}.mp3'
+    return {
+        'is_rerating': True, 'trial': trial, 'stimulus_number': url, 'stimulus_file': url,
+        'valence': valence, 'valence_rt': 700 + trial, 'arousal': arousal, 'arousal_rt': 900 if arousal else None,
+    }
+
+
+class SeqPracticePlanTests(SimpleTestCase):
+    trials = planning.SEQ_PER_CUE * len(CUES)
+
+    def assert_valid_block(self, block):
+        self.assertEqual(len(block), self.trials)
+        self.assertEqual(Counter(t['cue'] for t in block), Counter({cue: planning.SEQ_PER_CUE for cue in CUES}))
+        for cue, expected in CUES.items():
+            actual = [t['expected_seq'] for t in block if t['cue'] == cue and not t['is_consistent']]
+            self.assertEqual(len(actual), planning.SEQ_INCONSISTENT_PER_CUE)
+            self.assertEqual(len(set(actual)), len(actual))
+            self.assertNotIn(expected, actual)
+        for t in block:
+            self.assertEqual(t['is_consistent'], t['expected_seq'] == CUES[t['cue']])
+        self.assertTrue(all(t['is_consistent'] for t in block[:planning.SEQ_CONSISTENT_FIRST]))
+
+    def test_fresh_block(self):
+        for seed in SEEDS:
+            self.assert_valid_block(planning.seq_practice_trials(CUES, planning.CueUsage(), self.trials, 0, seed))
+
+    def test_resumed_block(self):
+        """بعد از رفرش در هر نقطه از بلاک، ادامه پلن همان قیود را برای کل بلاک حفظ می‌کند"""
+        for seed in SEEDS:
+            rng = random.Random(seed)
+            plan = planning.seq_practice_trials(CUES, planning.CueUsage(), self.trials, 0, rng)
+            done = plan[:rng.randint(0, self.trials)]
+            rest = planning.seq_practice_trials(
+                CUES, usage_of(done, 'expected_seq'), self.trials - len(done), len(done), rng
+            )
+            self.assert_valid_block(done + rest)
+
+    def test_same_seed_same_plan(self):
+        usage = planning.CueUsage()
+        for seed in SEEDS:
+            self.assertEqual(
+                planning.seq_practice_trials(CUES, usage, self.trials, 0, seed),
+                planning.seq_practice_trials(CUES, usage, self.trials, 0, seed),
+            )
+
+
+    def test_configured_block_length(self):
+        """تعداد تریال تمرین از FeedbackSettings؛ per_cue = تعداد / تعداد کیوها"""
+        for trials in (12, 24, 36):
+            per_cue = trials // len(CUES)
+            for seed in SEEDS:
+                block = planning.seq_practice_trials(CUES, planning.CueUsage(), trials, 0, seed, per_cue=per_cue)
+                self.assertEqual(Counter(t['cue'] for t in block), Counter({cue: per_cue for cue in CUES}))
+                self.assertTrue(all(t['is_consistent'] for t in block[:planning.SEQ_CONSISTENT_FIRST]))
+
+    def test_block_length_validator(self):
+        for value in (12, 24, 30, 36):
+            validate_seq_practice_trials(value)
+        for value in (0, 9, 25, 31):
+            with self.assertRaises(ValidationError):
+                validate_seq_practice_trials(value)
+
+
+class CatchPlanTests(SimpleTestCase):
+    def test_catch_cues_balanced(self):
+        count = planning.CATCH_PER_CUE * len(CUES)
+        for seed in SEEDS:
+            rng = random.Random(seed)
+            plan = planning.practice_catch_cues(list(CUES), {}, count, rng)
+            self.assertEqual(Counter(plan), Counter({cue: planning.CATCH_PER_CUE for cue in CUES}))
+            done = plan[:rng.randint(0, count)]
+            rest = planning.remaining_catch_cues(list(CUES), Counter(done), count - len(done), rng)
+            self.assertEqual(Counter(done + rest), Counter(plan))
+
+
+class MainPlanTests(SimpleTestCase):
+    def assert_valid_plan(self, blocks):
+        trials = [t for block in blocks for t in block]
+        self.assertEqual(Counter(t['cue'] for t in trials), Counter({cue: planning.MAIN_PER_CUE for cue in CUES}))
+        mismatches = [(t['expected_seq'], t['actual_seq']) for t in trials if t['actual_seq'] != t['expected_seq']]
+        self.assertEqual(len(mismatches), len(set(mismatches)))
+        for t in trials:
+            self.assertEqual(t['expected_seq'], CUES[t['cue']])
+        for cue in CUES:
+            actual = [t['actual_seq'] for t in trials if t['cue'] == cue and t['actual_seq'] != t['expected_seq']]
+            self.assertEqual(len(actual), planning.MAIN_INCONSISTENT_PER_CUE)
+        for block in blocks:
+            self.assertEqual(len(block), planning.MAIN_TRIALS_PER_BLOCK)
+            incons = sum(t['actual_seq'] != t['expected_seq'] for t in block)
+            self.assertEqual(incons, planning.MAIN_INCONSISTENT_PER_BLOCK)
+
+    def plan(self, done, rng, catch_done=planning.MAIN_CATCH_PER_BLOCK):
+        """ادامه پلن بعد از ثبت done (لیست تریال‌های ثبت‌شده هر بلاک)"""
+        blocks = [
+            planning.MainBlockState(
+                block=b, catch_done=catch_done, main_done=len(trials),
+                inconsistent_done=sum(t['actual_seq'] != t['expected_seq'] for t in trials),
+            )
+            for b, trials in enumerate(done, start=1)
+        ]
+        used_mismatches = {
+            (t['expected_seq'], t['actual_seq']) for trials in done for t in trials
+            if t['actual_seq'] != t['expected_seq']
+        }
+        flat = [t for trials in done for t in trials]
+        return planning.main_tracks(CUES, usage_of(flat, 'actual_seq'), used_mismatches, blocks, rng)
+
+    def test_fresh_plan(self):
+        for seed in SEEDS:
+            tracks, current = self.plan([[]] * planning.MAIN_BLOCKS, seed, catch_done=0)
+            self.assertEqual(current, 1)
+            self.assert_valid_plan([tracks[f'main:{b}'] for b in range(1, planning.MAIN_BLOCKS + 1)])
+            for b in range(1, planning.MAIN_BLOCKS + 1):
+                self.assertEqual(len(tracks[f'catch:{b}']), planning.MAIN_CATCH_PER_BLOCK)
+
+    def test_resumed_plan(self):
+        for seed in SEEDS:
+            rng = random.Random(seed)
+            tracks, _ = self.plan([[]] * planning.MAIN_BLOCKS, rng)
+            full = [tracks[f'main:{b}'] for b in range(1, planning.MAIN_BLOCKS + 1)]
+            block = rng.randrange(planning.MAIN_BLOCKS)
+            done = full[:block] + [full[block][:rng.randint(0, planning.MAIN_TRIALS_PER_BLOCK - 1)]]
+            done += [[]] * (planning.MAIN_BLOCKS - len(done))
+
+            tracks, current = self.plan(done, rng)
+            self.assertEqual(current, block + 1)
+            resumed = [
+                trials + tracks.get(f'main:{b}', [])
+                for b, trials in enumerate(done, start=1)
+            ]
+            self.assert_valid_plan(resumed)
+
+    def test_same_seed_same_plan(self):
+        for seed in SEEDS:
+            self.assertEqual(self.plan([[]] * planning.MAIN_BLOCKS, seed), self.plan([[]] * planning.MAIN_BLOCKS, seed))
+
+
+class CueAssignmentTests(TestCase):
+    def test_permutations_counterbalance_cues(self):
+        """در مجموع ۶ شرط، هر کیو هر توالی را دقیقاً در ۲ شرط می‌گیرد"""
+        self.assertEqual(len(set(planning.CUE_PERMUTATIONS)), 6)
+        for position in range(len(MAPPING_CUES)):
+            self.assertEqual(Counter(p[position] for p in planning.CUE_PERMUTATIONS), Counter({s: 2 for s in planning.SEQUENCES}))
+
+    def test_new_users_get_least_used_permutation(self):
+        PCMCueAssignment.objects.all().delete()
+        PCMCueAssignment.objects.bulk_create([PCMCueAssignment(permutation=i, assigned=3) for i in range(6)])
+        PCMCueAssignment.objects.filter(pk=4).update(assigned=1)
+
+        mappings = []
+        for i in range(14):
+            user = CustomUser.objects.create(username=f'09{i:09d}')
+            mappings.append(get_or_create_cue_mapping(user))
+            self.assertEqual(get_or_create_cue_mapping(user), mappings[-1])
+        counts = Counter(tuple(m[cue] for cue in MAPPING_CUES) for m in mappings)
+        self.assertEqual(counts[planning.CUE_PERMUTATIONS[4]], 4)
+        self.assertEqual(set(PCMCueAssignment.objects.values_list('assigned', flat=True)), {5})
+        self.assertEqual(PCMCueMapping.objects.count(), 14)
+
+
+class TrialBatchIdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='09120000001')
+        self.client.force_login(self.user)
+
+    def post(self, items):
+        response = self.client.post('/pcm/save/', data=json.dumps(items), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return [item['status'] for item in response.json()['results']]
+
+    def main_trial(self, trial):
+        return {'block': 1, 'trial': trial, 'cue': '/static/sounds/CUE/1/1.mp3', 'is_consistent': True}
+
+    def practice_trial(self, trial):
+        return {
+            'is_seq_practice': True, 'block': 1, 'trial': trial, 'cue': '/static/sounds/CUE/1/1.mp3',
+            'user_response': 'Neutral-Neutral', 'response_rt': 800, 'delay_number': 0,
+            'response_input_method': 'keyboard', 'is_correct': True,
+        }
+
+    def test_replay_and_in_batch_duplicates(self):
+        self.assertEqual(self.post([self.main_trial(1), self.main_trial(2), self.main_trial('2')]),
+                         ['created', 'created', 'duplicate'])
+        self.assertEqual(self.post([self.main_trial(2), self.main_trial(3)]), ['duplicate', 'created'])
+        self.assertEqual(PCMMainResponse.objects.filter(user=self.user).count(), 3)
+
+    def test_inactive_row_with_unique_key_does_not_abort_batch(self):
+        """(user, block, trial) یکتاست؛ تریال غیرفعال تکراری است و بقیه دسته ذخیره می‌شود"""
+        self.post([self.main_trial(1)])
+        PCMMainResponse.objects.filter(user=self.user).update(is_active=False)
+        self.assertEqual(self.post([self.main_trial(99), self.main_trial(1)]), ['created', 'duplicate'])
+        self.assertTrue(PCMMainResponse.objects.filter(user=self.user, trial=99).exists())
+
+    def test_expired_session_gets_401(self):
+        self.client.logout()
+        for url in ('/pcm/save/', '/rating/save/'):
+            for body in ([self.main_trial(1)], self.main_trial(1)):
+                response = self.client.post(url, data=json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.json()['status'], 'error')
+
+    def test_inactive_row_without_unique_key_can_be_redone(self):
+        self.post([self.practice_trial(1)])
+        PCMSequencePracticeResponse.objects.filter(user=self.user).update(is_active=False)
+        self.assertEqual(self.post([self.practice_trial(1)]), ['created'])
+        self.assertEqual(self.post([self.practice_trial(1)]), ['duplicate'])
+        self.assertEqual(PCMSequencePracticeResponse.objects.filter(user=self.user).count(), 2)
+
+
+class SavedResponsesTestCase(TestCase):
+    """ذخیره تریال‌ها از مسیر endpointها (تکی یا دسته‌ای) با انتظار ثبت همه آن‌ها"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='09120000006')
+        self.client.force_login(self.user)
+
+    def save(self, url, body):
+        response = self.client.post(url, data=json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        for item in response.json().get('results', ()):
+            self.assertEqual(item['status'], 'created')
+
+
+class StimulusNormSyncTests(SavedResponsesTestCase):
+    """جدول materialize شده StimulusNorm بعد از هر مسیر نوشتن با محاسبه از جداول خام برابر است"""
+
+    def assert_in_sync(self):
+        fields = [f.name for f in StimulusNorm._meta.concrete_fields if f.name not in ('id', 'updated_at')]
+        stored = {
+            tuple(getattr(norm, f) for f in fields)
+            for norm in StimulusNorm.objects.filter(n_responses__gt=0)
+        }
+        expected = {
+            tuple(getattr(norm, f) for f in fields)
+            for source in StimulusNorm.SOURCES for norm in StimulusNorm.from_responses(source)
+        }
+        self.assertEqual(stored, expected)
+
+    def test_batch_single_edit_delete(self):
+        self.save('/pcm/save/', [
+            rating_trial(1, 101, 3, 5), rating_trial(2, 102, -2), rating_trial(3, 103, 4, 1),
+            {'block': 1, 'trial': 1, 'cue': '/static/sounds/CUE/1/1.mp3'},
+        ])
+        self.assert_in_sync()
+        self.save('/pcm/save/', rating_trial(4, 104, 1, 2))
+        self.save('/rating/save/', rating_trial(1, 101, -4, 3))
+        self.assert_in_sync()
+
+        response = RatingMainResponse.objects.get(user=self.user, stimulus_number='102')
+        response.valence, response.arousal = 6, 2
+        response.save()
+        self.assert_in_sync()
+
+        RatingMainResponse.objects.get(user=self.user, stimulus_number='103').delete()
+        RatingResponse.objects.get(user=self.user).delete()
+        self.assert_in_sync()
+
+
+class ParticipantProgressSyncTests(SavedResponsesTestCase):
+    """شمارنده‌های ParticipantProgress (record یا بازسازی بعد از invalidate) با محاسبه از جداول خام برابرند"""
+
+    def assert_in_sync(self, progress):
+        expected = ParticipantProgress.from_responses(self.user)
+        for field in ParticipantProgress._meta.concrete_fields:
+            if field.name not in ('user', 'updated_at'):
+                self.assertEqual(getattr(progress, field.name), getattr(expected, field.name), field.name)
+
+    def assert_stored_in_sync(self):
+        self.assert_in_sync(ParticipantProgress.objects.get(user=self.user))
+
+    def practice_trial(self, trial, correct=True):
+        return {
+            'is_seq_practice': True, 'block': 1, 'trial': trial, 'cue': '/static/sounds/CUE/1/1.mp3',
+            'user_response': 'Neutral-Neutral', 'response_rt': 800, 'delay_number': 0,
+            'response_input_method': 'keyboard', 'is_correct': correct,
+        }
+
+    def main_trial(self, trial):
+        return {'block': 1, 'trial': trial, 'cue': '/static/sounds/CUE/1/1.mp3', 'is_consistent': True}
+
+    def test_batch_single_edit_delete(self):
+        self.save('/pcm/save/', [
+            self.main_trial(1), self.main_trial(2), self.practice_trial(1), self.practice_trial(2, correct=False),
+            rating_trial(1, 101, 3, 5), rating_trial(2, 102, -2),
+        ])
+        self.assert_stored_in_sync()
+        self.save('/pcm/save/', self.practice_trial(3))
+        self.save('/rating/save/', rating_trial(1, 101, -4, 3))
+        self.assert_stored_in_sync()
+
+        # ویرایش و حذف ردیف را invalidate می‌کنند؛ خواندن بعدی و ذخیره بعدی آن را از نو می‌سازند
+        response = PCMSequencePracticeResponse.objects.get(user=self.user, trial=2)
+        response.is_correct = True
+        response.save()
+        self.assert_in_sync(ParticipantProgress.for_user(self.user))
+        response.is_active = False
+        response.save()
+        self.save('/pcm/save/', self.main_trial(3))
+        self.assert_stored_in_sync()
+
+        PCMMainResponse.objects.get(user=self.user, trial=1).delete()
+        self.assert_in_sync(ParticipantProgress.for_user(self.user))
+        self.save('/pcm/save/', [self.main_trial(4), rating_trial(3, 103, 1, 1)])
+        self.assert_stored_in_sync()
+
+
+class PayloadValidationTests(SavedResponsesTestCase):
+    """payload نامعتبر با 400 و فهرست خطای فیلدها رد می‌شود و ردیفی ذخیره نمی‌شود"""
+
+    def post(self, body):
+        return self.client.post('/pcm/save/', data=body if isinstance(body, str) else json.dumps(body),
+                                content_type='application/json')
+
+    def assert_rejected(self, body, fields=()):
+        response = self.post(body)
+        self.assertEqual(response.status_code, 400)
+        payload = response.json()
+        self.assertEqual(payload['status'], 'error')
+        self.assertEqual({error['field'] for error in payload.get('errors', ())}, set(fields))
+
+    def main_trial(self, **values):
+        return {'block': 1, 'trial': 1, 'cue': '/static/sounds/CUE/1/1.mp3', **values}
+
+    def test_invalid_single_payloads(self):
+        self.assert_rejected('{"block": 1,', ())
+        catch = {'is_catch_pcm': True, 'block': 1, 'cue': '/static/sounds/CUE/1/1.mp3', 'response_rt': 500}
+        self.assert_rejected(catch, {'trial'})
+        self.assert_rejected(self.main_trial(trial='abc', block=[1], valence_stim1='x'),
+                             {'trial', 'block', 'valence_stim1'})
+        self.assert_rejected(self.main_trial(trial=-1, valence_rt_stim1=2 ** 63), {'trial', 'valence_rt_stim1'})
+        self.assert_rejected(self.main_trial(audio_engine='flash', valence_input_method_stim1='pen'),
+                             {'audio_engine', 'valence_input_method_stim1'})
+        self.assert_rejected({'unknown_stage': True}, ())
+        self.assertFalse(PCMMainResponse.objects.exists())
+
+    def test_bad_item_inside_batch(self):
+        response = self.post([self.main_trial(), self.main_trial(trial='x'), 'trial', {'unknown_stage': True}])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([item['status'] for item in results], ['created', 'error', 'error', 'error'])
+        self.assertEqual([error['field'] for error in results[1]['errors']], ['trial'])
+        self.assertEqual(PCMMainResponse.objects.count(), 1)
+
+
+class RatingResultRowsTests(TestCase):
+    def test_staff_only(self):
+        participant = CustomUser.objects.create(username='09120000002')
+        url = f'/result/rating/{participant.pk}/rows/'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(participant)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = CustomUser.objects.create(username='09120000003', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user'], participant.username)
+
+
+class SessionPlanInvalidationTests(TestCase):
+    def test_editing_a_response_invalidates_plan(self):
+        user = CustomUser.objects.create(username='09120000004')
+        plan = PCMSessionPlan.objects.create(user=user, seed=1, stage='seq_practice')
+        response = PCMSequencePracticeResponse.objects.create(user=user, block=1, trial=1, cue='1')
+        plan.refresh_from_db()
+        self.assertEqual(plan.version, PCMSessionPlan.CURRENT_VERSION)
+
+        response.is_active = False
+        response.save()
+        plan.refresh_from_db()
+        self.assertEqual(plan.version, 0)
+
+
+@unittest.skipIf(importlib.util.find_spec('pyarrow') is None, 'pyarrow نصب نیست')
+class ParquetExportBoundTests(TestCase):
+    def test_incremental_export_waits_for_recent_rows(self):
+        """ردیف جوان (شاید هنوز هم‌ردیف‌های کوچک‌ترش commit نشده‌اند) و هر چه بعد از آن است به اجرای بعد می‌ماند"""
+        from core.columnar import export_stage
+        from core.export import EXPORT_TABLES
+
+        user = CustomUser.objects.create(username='09120000005')
+        old = timezone.now() - datetime.timedelta(hours=1)
+        ids = [PCMMainResponse.objects.create(user=user, block=1, trial=t, cue='1').pk for t in (1, 2, 3)]
+        PCMMainResponse.objects.filter(pk__in=[ids[0], ids[2]]).update(created_at=old)
+
+        table, state = EXPORT_TABLES['pcm_main'], {}
+        with tempfile.TemporaryDirectory() as root:
+            result = export_stage(table, Path(root), state, lag=300)
+            self.assertEqual((result['rows'], result['last_id']), (1, ids[0]))
+
+            PCMMainResponse.objects.filter(pk=ids[1]).update(created_at=old)
+            result = export_stage(table, Path(root), state, lag=300)
+            self.assertEqual((result['rows'], result['last_id']), (2, ids[2]))
+            self.assertEqual(state['pcm_main']['rows'], 3)
@@ -0,0 +1,77 @@
+"""
+کش پردازه‌ای نسخه‌دار برای داده‌های کم‌تغییر (تنظیمات PCM، کاتالوگ محرک‌ها، تعریف پرسشنامه‌ها).
+
+هر پردازه مقدار ساخته‌شده را در حافظه خودش نگه می‌دارد و کنار آن نسخه‌ای را که از کش مشترک
+(CACHES['default'] که بین همه workerها مشترک است) خوانده ثبت می‌کند. تغییر داده (سیگنال‌ها) بعد از commit
+نسخه را در کش مشترک بالا می‌برد و هر worker در اولین درخواست پس از VERSIONED_CACHE_CHECK_INTERVAL ثانیه
+مقدار را دوباره می‌سازد. خود نسخه هم حداکثر هر VERSIONED_CACHE_CHECK_INTERVAL ثانیه یک‌بار از کش مشترک
+خوانده می‌شود تا مسیر داغ درخواست‌ها به ازای هر فراخوانی یک رفت‌وبرگشت به کش نداشته باشد. MAX_AGE هر
+کش فقط سقف اطمینان برای تغییراتی است که از مسیر سیگنال‌ها نمی‌گذرند (مثلاً update مستقیم یا SQL دستی).
+"""
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class VersionedProcessCache:
+    """
+    مقدارهای همین پردازه به ازای هر کلید، معتبر تا وقتی نسخه کش مشترک تغییر نکرده و max_age نگذشته.
+    loader(key, version) مقدار را می‌سازد؛ None ذخیره نمی‌شود.
+    """
+
+    def __init__(self, version_key: str, max_age_setting: str, default_max_age: int = 300):
+        self.version_key = version_key
+        self.max_age_setting = max_age_setting
+        self.default_max_age = default_max_age
+        self._entries: Dict[Hashable, Tuple[object, object, float]] = {}
+        self._lock = threading.Lock()
+        # (نسخه، زمان آخرین خواندن از کش مشترک)
+        self._version: Optional[Tuple[object, float]] = None
+
+    def max_age(self) -> float:
+        return getattr(settings, self.max_age_setting, self.default_max_age)
+
+    def version(self):
+        checked = self._version
+        now = time.monotonic()
+        if checked is not None and now - checked[1] < getattr(settings, 'VERSIONED_CACHE_CHECK_INTERVAL', 2):
+            return checked[0]
+        version = cache.get(self.version_key)
+        self._version = (version, now)
+        return version
+
+    def _fresh(self, entry, version, max_age) -> bool:
+        return entry is not None and entry[1] == version and time.monotonic() - entry[2] < max_age
+
+    def get(self, key: Hashable, loader: Callable[[Hashable, object], object]):
+        version = self.version()
+        max_age = self.max_age()
+        entry = self._entries.get(key)
+        if self._fresh(entry, version, max_age):
+            return entry[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._fresh(entry, version, max_age):
+                return entry[0]
+            value = loader(key, version)
+            if value is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (value, version, time.monotonic())
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._version = None
+
+    def invalidate(self) -> None:
+        """بعد از commit تراکنش جاری نسخه مشترک را بالا می‌برد تا همه پردازه‌ها مقدارها را دوباره بسازند"""
+        def bump():
+            cache.set(self.version_key, time.time_ns(), None)
+            self.clear()
+
+        transaction.on_commit(bump)
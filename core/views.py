@@ -7,41 +7,67 @@ from django.contrib.staticfiles.storage import staticfiles_storage
 from django.urls import reverse_lazy
 from django.contrib.auth.views import LoginView
 from django.contrib.auth import login
-from .decorators import questionnaires_required
+from . import planning, telemetry
+from .config import pcm_config
+from .decorators import mark_questionnaires_completed, questionnaires_required
+from .progress import PCMProgress
+from .stimuli import extract_stimulus_number, stimulus_catalog, stimulus_path
+from .export import EXPORT_FORMATS, EXPORT_TABLES, iter_lines
+from .questionnaires import questionnaire_definition
+from .payloads import PCM_PAYLOADS, RATING_PAYLOADS, PayloadError, decode
 import json
 from django.utils import timezone
 import os
 import random
 from django.templatetags.static import static
-from django.http import JsonResponse
-from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied, ValidationError
 from typing import Dict, List, Tuple, Optional
 from django.views.decorators.csrf import csrf_exempt
 from collections import defaultdict, Counter
 from jdatetime import datetime as jdatetime
 from django.views.decorators.http import require_POST
 import datetime
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, Q
+from django.core.paginator import Paginator
+from django.db import DataError, IntegrityError, transaction
+from asgiref.sync import sync_to_async
 
 import json
 
+def device_log_from_payload(user, data: dict) -> DeviceLog:
+    """ساخت و اعتبارسنجی ردیف لاگ دستگاه (بدون ذخیره)؛ درج در بافر telemetry و به صورت دسته‌ای انجام می‌شود"""
+    log = DeviceLog(
+        user=user,
+        stage=data.get('stage', 'unknown'),
+        device_type=data.get('device_type', 'Unknown'),
+        os=data.get('os', 'Unknown'),
+        browser=data.get('browser', 'Unknown'),
+        screen_width=data.get('screen_width'),
+        screen_height=data.get('screen_height'),
+        is_touch=data.get('is_touch', False),
+        audio_volume=data.get('audio_volume'),
+    )
+    log.full_clean(exclude=['user'])
+    return log
+
+
+def volume_log_from_payload(user, data: dict) -> VolumeLog:
+    log = VolumeLog(
+        user=user,
+        volume=data.get("volume")
+    )
+    log.full_clean(exclude=['user'])
+    return log
+
+
 @login_required
 @require_POST
 def save_device_log(request):
     try:
         data = json.loads(request.body)
-
-        DeviceLog.objects.create(
-            user=request.user,
-            stage=data.get('stage', 'unknown'),
-            device_type=data.get('device_type', 'Unknown'),
-            os=data.get('os', 'Unknown'),
-            browser=data.get('browser', 'Unknown'),
-            screen_width=data.get('screen_width'),
-            screen_height=data.get('screen_height'),
-            is_touch=data.get('is_touch', False),
-            audio_volume=data.get('audio_volume'),
-        )
+        telemetry.record(device_log_from_payload(request.user, data))
 
         return JsonResponse({'status': 'success'})
 
@@ -53,11 +79,7 @@ def save_device_log(request):
 def save_volume_log(request):
     try:
         data = json.loads(request.body)
-
-        VolumeLog.objects.create(
-            user=request.user,
-            volume=data.get("volume")
-        )
+        telemetry.record(volume_log_from_payload(request.user, data))
 
         return JsonResponse({"status": "success"})
 
@@ -66,7 +88,34 @@ def save_volume_log(request):
             {"status": "error", "message": str(e)},
             status=400
         )
-    
+
+
+# نسخه‌های async همین endpointها برای اجرا زیر ASGI (ASYNC_SAVE_ENDPOINTS در تنظیمات)
+@login_required
+@require_POST
+async def save_device_log_async(request):
+    try:
+        data = json.loads(request.body)
+        await telemetry.arecord(device_log_from_payload(await request.auser(), data))
+
+        return JsonResponse({'status': 'success'})
+
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+
+@login_required
+@require_POST
+async def save_volume_log_async(request):
+    try:
+        data = json.loads(request.body)
+        await telemetry.arecord(volume_log_from_payload(await request.auser(), data))
+
+        return JsonResponse({"status": "success"})
+
+    except Exception as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
 # _LATIN_TO_PERSIAN_DIGITS = str.maketrans('0123456789', '۰۱۲۳۴۵۶۷۸۹')
 
 def convert_birth_to_jalali_view(user):
@@ -206,62 +255,83 @@ def complete_profile(request):
 ###################################################################################################### 
 ###################################################################################################### 
 
+def optional_int(value):
+    return int(value) if value not in (None, '') else None
+
+
+def score_answers(answers, questions, choices, attributes):
+    """
+    امتیاز هر ویژگی در یک گذر روی پاسخ‌های حافظه: ویژگی -> (raw_score, num_questions, sum_rt).
+    فقط سؤال‌های چندگزینه‌ای و مقیاس در نمره خام حساب می‌شوند؛ تعداد و RT شامل همه پاسخ‌هاست.
+    """
+    totals = {attribute_id: [0, 0, 0] for attribute_id in attributes}
+    for answer in answers:
+        attribute_id, question_type = questions[answer.question_id]
+        total = totals[attribute_id]
+        if question_type in ('MC', 'SC'):
+            if answer.choice_id is not None:
+                total[0] += choices[answer.choice_id][1]
+            else:
+                total[0] += answer.scale_value or 0
+        total[1] += 1
+        total[2] += answer.RT or 0
+    return totals
+
+
 @login_required(login_url='login_or_signup')
 def respond_questionnaire(request, pk):
-    questionnaire = get_object_or_404(Questionnaire, pk=pk, is_active=True)
-    questions = questionnaire.questions.all().prefetch_related('choices')
+    questionnaire = questionnaire_definition(pk)
+    if questionnaire is None:
+        raise Http404('پرسشنامه یافت نشد.')
     if request.method == 'POST' and 'submit_final' in request.POST:
         answers_data = json.loads(request.POST.get('answers_data', '[]'))
-        response = Response.objects.create(
-            questionnaire=questionnaire,
-            respondent=request.user,
-            is_completed=True,
-            completed_at=timezone.now()
-        )
+        question_map, choice_map = questionnaire.question_map, questionnaire.choice_map
+
+        answers = []
         for ans in answers_data:
-            Answer.objects.create(
-                response=response,
-                question_id=ans['question_id'],
-                choice_id=ans.get('choice_id'),
+            question_id = optional_int(ans.get('question_id'))
+            if question_id not in question_map:
+                continue  # سؤال متعلق به این آزمون نیست
+            choice_id = optional_int(ans.get('choice_id'))
+            if choice_id is not None and choice_map.get(choice_id, (None,))[0] != question_id:
+                choice_id = None  # گزینه متعلق به این سؤال نیست
+            answers.append(Answer(
+                question_id=question_id,
+                choice_id=choice_id,
                 text_answer=ans.get('text_answer') or '',
-                scale_value=ans.get('scale_value'),
-                RT=ans.get('rt')
-            )
-        
-
-        attributes = Attribute.objects.filter(
-            questions__questionnaire=questionnaire
-        ).distinct()
-        
-        for attribute in attributes:
-            answers = response.answers.filter(question__attribute=attribute)
-            num_questions = answers.count()
-            if num_questions > 0:
-                raw_score = sum(
-                    (ans.choice.value if ans.choice else ans.scale_value or 0) 
-                    for ans in answers if ans.question.question_type in ['MC', 'SC']  # فقط برای انواع امتیازدار
-                )
-                average_score = raw_score / num_questions
-                sum_rt = sum(ans.RT or 0 for ans in answers)
-                average_rt = sum_rt / num_questions
-            else:
-                raw_score = 0
-                average_score = 0
-                sum_rt = 0
-                average_rt = 0
-            
-            Result.objects.create(
-                user=request.user,
-                questionnaire=questionnaire,
-                response=response,
-                attribute=attribute,
-                raw_score=raw_score,
-                num_questions=num_questions,
-                average_score=average_score,
-                sum_rt=sum_rt,
-                average_rt=average_rt
+                scale_value=optional_int(ans.get('scale_value')),
+                RT=optional_int(ans.get('rt')),
+            ))
+
+        with transaction.atomic():
+            response = Response.objects.create(
+                questionnaire_id=questionnaire.id,
+                respondent=request.user,
+                is_completed=True,
+                completed_at=timezone.now()
             )
-        
+            for answer in answers:
+                answer.response = response
+            Answer.objects.bulk_create(answers)
+
+            results = []
+            for attribute_id, (raw_score, num_questions, sum_rt) in score_answers(
+                answers, question_map, choice_map, questionnaire.attributes
+            ).items():
+                results.append(Result(
+                    user=request.user,
+                    questionnaire_id=questionnaire.id,
+                    response=response,
+                    attribute_id=attribute_id,
+                    raw_score=raw_score,
+                    num_questions=num_questions,
+                    average_score=raw_score / num_questions if num_questions else 0,
+                    sum_rt=sum_rt,
+                    average_rt=sum_rt / num_questions if num_questions else 0,
+                ))
+            Result.objects.bulk_create(results)
+        mark_questionnaires_completed(request, [questionnaire.id])
+
         messages.success(request, 'پاسخ‌های شما با موفقیت ثبت شد. خوش آمدید!')
         next_url = request.session.pop('next_url', None)  # pop برای پاک کردن سشن
         if next_url:
@@ -269,7 +339,7 @@ def respond_questionnaire(request, pk):
         return redirect('home')
     return render(request, 'respond.html', {
         'questionnaire': questionnaire,
-        'questions': questions,
+        'questions': questionnaire.questions,
     })
 
 ###################################################################################################### 
@@ -281,21 +351,11 @@ def respond_questionnaire(request, pk):
 @questionnaires_required([1,2,3])
 def rating_view(request):
     user = request.user
-    RATING_PRACTICE_TRIALS = 10
-    PRACTICE_FILES_RAW = [
-        '0-practice/1.mp3',
-        '0-practice/2.mp3',
-        '0-practice/3.mp3',
-        '0-practice/4.mp3',
-        '0-practice/5.mp3',
-        '0-practice/6.mp3',
-        '0-practice/7.mp3',
-        '0-practice/8.mp3',
-        '0-practice/9.mp3',
-        '0-practice/10.mp3',
-    ]
-    practice_files = [build_audio_url(f) for f in PRACTICE_FILES_RAW[:RATING_PRACTICE_TRIALS]]
-    rating_practice_count = RatingPractice.objects.filter(user=user).count()
+    RATING_PRACTICE_TRIALS = pcm_config().rating_practice_trials
+    catalog = stimulus_catalog()
+    practice_files = catalog.urls('rating_practice')[:RATING_PRACTICE_TRIALS]
+    progress = ParticipantProgress.for_user(user)
+    rating_practice_count = progress.rating_practice
     progress_percentage = (rating_practice_count / RATING_PRACTICE_TRIALS) * 100
     if rating_practice_count < RATING_PRACTICE_TRIALS:
         remaining_files = practice_files[rating_practice_count:]
@@ -309,49 +369,21 @@ def rating_view(request):
         return render(request, 'rating_1.html', context)
 
     # --- مرحله ۵: رتبه‌بندی نهایی همه صداها (لیست ثابت مشخص‌شده) ---
-    MAIN_RATING_FILES_RAW = [
-        '1-HP-HA/110.mp3','1-HP-HA/200.mp3','1-HP-HA/201.mp3','1-HP-HA/202.mp3','1-HP-HA/205.mp3','1-HP-HA/215.mp3','1-HP-HA/220.mp3','1-HP-HA/311.mp3','1-HP-HA/352.mp3','1-HP-HA/353.mp3','1-HP-HA/355.mp3','1-HP-HA/360.mp3','1-HP-HA/363.mp3','1-HP-HA/365.mp3','1-HP-HA/366.mp3','1-HP-HA/367.mp3','1-HP-HA/378.mp3','1-HP-HA/415.mp3','1-HP-HA/716.mp3','1-HP-HA/717.mp3','1-HP-HA/808.mp3','1-HP-HA/815.mp3','1-HP-HA/817.mp3',
-
-        '2-HP-MA/109.mp3','2-HP-MA/111.mp3','2-HP-MA/112.mp3','2-HP-MA/150.mp3','2-HP-MA/151.mp3','2-HP-MA/206.mp3','2-HP-MA/221.mp3','2-HP-MA/224.mp3','2-HP-MA/226.mp3','2-HP-MA/230.mp3','2-HP-MA/254.mp3','2-HP-MA/270.mp3','2-HP-MA/351.mp3','2-HP-MA/400.mp3','2-HP-MA/601.mp3','2-HP-MA/721.mp3','2-HP-MA/725.mp3','2-HP-MA/726.mp3','2-HP-MA/802.mp3','2-HP-MA/810.mp3','2-HP-MA/811.mp3','2-HP-MA/813.mp3','2-HP-MA/816.mp3','2-HP-MA/820.mp3','2-HP-MA/826.mp3',
-
-        '3-HP-LA/172.mp3','3-HP-LA/809.mp3','3-HP-LA/812.mp3',
-
-        '4-MP-HA/114.mp3','4-MP-HA/204.mp3','4-MP-HA/210.mp3','4-MP-HA/216.mp3','4-MP-HA/610.mp3','4-MP-HA/704.mp3','4-MP-HA/710.mp3','4-MP-HA/715.mp3',
-
-        '5-MP-MA/102.mp3','5-MP-MA/104.mp3','5-MP-MA/107.mp3','5-MP-MA/111.mp3','5-MP-MA/113.mp3','5-MP-MA/120.mp3','5-MP-MA/130.mp3','5-MP-MA/132.mp3','5-MP-MA/152.mp3','5-MP-MA/170.mp3','5-MP-MA/225.mp3','5-MP-MA/245.mp3','5-MP-MA/246.mp3','5-MP-MA/251.mp3','5-MP-MA/252.mp3','5-MP-MA/320.mp3','5-MP-MA/322.mp3','5-MP-MA/358.mp3','5-MP-MA/361.mp3','5-MP-MA/364.mp3','5-MP-MA/368.mp3','5-MP-MA/370.mp3','5-MP-MA/373.mp3','5-MP-MA/374.mp3','5-MP-MA/375.mp3','5-MP-MA/376.mp3','5-MP-MA/382.mp3','5-MP-MA/403.mp3','5-MP-MA/410.mp3','5-MP-MA/425.mp3','5-MP-MA/500.mp3','5-MP-MA/627.mp3','5-MP-MA/698.mp3','5-MP-MA/700.mp3','5-MP-MA/701.mp3','5-MP-MA/702.mp3','5-MP-MA/705.mp3','5-MP-MA/706.mp3','5-MP-MA/720.mp3','5-MP-MA/722.mp3','5-MP-MA/723.mp3','5-MP-MA/724.mp3','5-MP-MA/728.mp3','5-MP-MA/729.mp3',
-
-        '6-MP-LA/171.mp3','6-MP-LA/262.mp3','6-MP-LA/377.mp3','6-MP-LA/602.mp3','6-MP-LA/708.mp3',
-
-        '7-LP-HA/105.mp3','7-LP-HA/106.mp3','7-LP-HA/115.mp3','7-LP-HA/116.mp3','7-LP-HA/133.mp3','7-LP-HA/134.mp3','7-LP-HA/244.mp3','7-LP-HA/255.mp3','7-LP-HA/260.mp3','7-LP-HA/261.mp3','7-LP-HA/275.mp3','7-LP-HA/276.mp3','7-LP-HA/277.mp3','7-LP-HA/278.mp3','7-LP-HA/279.mp3','7-LP-HA/281.mp3','7-LP-HA/282.mp3','7-LP-HA/283.mp3','7-LP-HA/284.mp3','7-LP-HA/285.mp3','7-LP-HA/286.mp3','7-LP-HA/288.mp3','7-LP-HA/289.mp3','7-LP-HA/290.mp3','7-LP-HA/292.mp3','7-LP-HA/296.mp3','7-LP-HA/310.mp3','7-LP-HA/312.mp3','7-LP-HA/319.mp3','7-LP-HA/380.mp3','7-LP-HA/420.mp3','7-LP-HA/422.mp3','7-LP-HA/423.mp3','7-LP-HA/424.mp3','7-LP-HA/501.mp3','7-LP-HA/502.mp3','7-LP-HA/600.mp3','7-LP-HA/624.mp3','7-LP-HA/625.mp3','7-LP-HA/626.mp3','7-LP-HA/699.mp3','7-LP-HA/709.mp3','7-LP-HA/711.mp3','7-LP-HA/712.mp3','7-LP-HA/713.mp3','7-LP-HA/714.mp3','7-LP-HA/719.mp3','7-LP-HA/730.mp3','7-LP-HA/732.mp3','7-LP-HA/910.mp3',
-
-        '8-LP-MA/241.mp3','8-LP-MA/242.mp3','8-LP-MA/243.mp3','8-LP-MA/250.mp3','8-LP-MA/280.mp3','8-LP-MA/293.mp3','8-LP-MA/295.mp3','8-LP-MA/611.mp3','8-LP-MA/703.mp3',
-
-    ]
-
-    # حذف تکراری‌ها
-    MAIN_RATING_FILES_RAW = list(set(MAIN_RATING_FILES_RAW))
-    # تبدیل به URL کامل
-    main_rating_files = [build_audio_url(f) for f in MAIN_RATING_FILES_RAW]
+    main_rating_files = catalog.urls('rating_main')
     # تعداد کل محرک‌ها
     TOTAL_MAIN_RATING_TRIALS = len(main_rating_files)
     # تعداد رتبه‌بندی‌های تکمیل‌شده (هر دو valence و arousal پر باشند)
-    rating_main_done = RatingResponse.objects.filter(
-        user=user
-    ).exclude(
-        valence__isnull=True
-    ).exclude(
-        arousal__isnull=True
-    ).count()
+    rating_main_done = progress.rating_main
     progress_percentage = (rating_main_done / TOTAL_MAIN_RATING_TRIALS) * 100 if TOTAL_MAIN_RATING_TRIALS > 0 else 100
     if rating_main_done < TOTAL_MAIN_RATING_TRIALS:
-        completed_stimuli_urls = set(
-            RatingResponse.objects.filter(
+        completed_paths = {
+            stimulus_path(f) for f in RatingResponse.objects.filter(
                 user=user,
                 valence__isnull=False,
                 arousal__isnull=False
             ).values_list('stimulus_file', flat=True)
-        )
-        remaining_files = [f for f in main_rating_files if f not in completed_stimuli_urls]
+        }
+        remaining_files = [f for f in main_rating_files if stimulus_path(f) not in completed_paths]
         random.shuffle(remaining_files)
         context = {
             'current_trial': rating_main_done + 1,
@@ -364,228 +396,195 @@ def rating_view(request):
     # --- پایان آزمون ---
     return redirect('/final/')
 
-@csrf_exempt
-def rating_save_response(request):
-    if request.method != 'POST':
-        return JsonResponse({'status': 'error', 'message': 'فقط POST'}, status=405)
-
-    try:
-        data = json.loads(request.body)
-    except json.JSONDecodeError:
-        return JsonResponse({'status': 'error', 'message': 'JSON نامعتبر'}, status=400)
+# کلید یکتایی هر تریال در هر جدول پاسخ؛ برای idempotent بودن ارسال‌های تکراری (retry) کلاینت
+TRIAL_IDENTITY = {
+    PCMValencePracticeResponse: ('trial',),
+    PCMSequencePracticeResponse: ('block', 'trial'),
+    PCMSequenceCatchResponse: ('block', 'trial'),
+    PCMCatchResponse: ('block', 'trial'),
+    PCMMainResponse: ('block', 'trial'),
+    RatingPracticeResponse: ('trial',),
+    RatingMainResponse: ('stimulus_number',),
+    RatingPractice: ('trial',),
+    RatingResponse: ('stimulus',),
+}
+
+
+def trial_identity(model, values) -> tuple:
+    """نرمال‌سازی کلید تریال با نوع فیلدهای مدل (مثلاً '3' و 3 یکی شوند)"""
+    return tuple(
+        model._meta.get_field(field).to_python(value)
+        for field, value in zip(TRIAL_IDENTITY[model], values)
+    )
 
-    user = request.user
 
-    
-    # مرحله ۱: تمرین تشخیص توالی
-
-    if data.get('is_rating_practice'):
-        RatingPractice.objects.create(
-            user=user,
-            trial=data['trial'],
-            stimulus=extract_stimulus_number(data.get('stimulus')),
-            valence=data.get('valence'),
-            valence_rt=data.get('valence_rt'),
-            valence_delay_number = data.get('valence_delay_number', 0),
-            valence_input_method = data.get('valence_input_method'),
-            arousal=data.get('arousal'),
-            arousal_rt=data.get('arousal_rt'),
-            arousal_delay_number = data.get('arousal_delay_number', 0),
-            arousal_input_method = data.get('arousal_input_method'),
-        )
+def identity_is_unique(model) -> bool:
+    """
+    آیا قید یکتایی پایگاه داده همین کلید تریال را (بدون توجه به is_active) پوشش می‌دهد؟
+    در این جدول‌ها ردیف غیرفعال هم جای تریال را گرفته است و درج دوباره IntegrityError می‌دهد.
+    """
+    identity = {'user', *TRIAL_IDENTITY[model]}
+    return any(set(fields) <= identity for fields in model._meta.unique_together)
 
-    elif data.get('is_rerating'):
-        RatingResponse.objects.create(
-            user=user,
-            trial=data['trial'],
-            stimulus=extract_stimulus_number(data.get('stimulus_number')),
-            stimulus_file=data['stimulus_file'],
-            valence=data.get('valence'),
-            valence_rt=data.get('valence_rt'),
-            valence_delay_number = data.get('valence_delay_number', 0),
-            valence_input_method = data.get('valence_input_method'),
-            arousal=data.get('arousal'),
-            arousal_rt=data.get('arousal_rt'),
-            arousal_delay_number = data.get('arousal_delay_number', 0),
-            arousal_input_method = data.get('arousal_input_method'),
-        )
 
-    else:
-        return JsonResponse({'status': 'error', 'message': 'نوع داده نامعتبر'}, status=400)
+def insert_trials(model, items) -> list:
+    """
+    درج ردیف‌های (index, response, plan_entry) یک مدل در savepoint جدا؛ خروجی: آیتم‌های درج‌نشده.
+    اگر bulk_create رد شود ردیف‌ها تک‌تک درج می‌شوند تا خطای یک تریال بقیه دسته را برنگرداند.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([response for _, response, _ in items])
+        return []
+    except (IntegrityError, DataError):
+        pass
+    failed = []
+    for item in items:
+        response = item[1]
+        response.pk = None
+        try:
+            with transaction.atomic():
+                response.save(force_insert=True)
+        except (IntegrityError, DataError):
+            failed.append(item)
+    return failed
+
+
+def lock_participant(user) -> None:
+    """
+    قفل ردیف کاربر تا پایان تراکنش جاری: ذخیره‌های هم‌زمان یک شرکت‌کننده (تکی و دسته‌ای، retry / sendBeacon)
+    پشت سر هم اجرا شوند و شمارنده‌های ParticipantProgress را هم‌زمان نسازند.
+    """
+    CustomUser.objects.select_for_update().only('pk').get(pk=user.pk)
 
-    return JsonResponse({'status': 'success'})
 
-###################################################################################################### 
-###################################################################################################### 
-###################################################################################################### 
-###################################################################################################### 
-def extract_stimulus_number(url: Optional[str]) -> Optional[int]:
-    """استخراج شماره stimulus از URL فایل صوتی (مثل 102 از 102.mp3)"""
-    if not url:
-        return None
+def save_trial_batch(user, payloads: list, build) -> Tuple[list, list]:
+    """
+    ذخیره دسته‌ای چند تریال در یک تراکنش.
+    build(user, data) -> (response, plan_entry) سازنده ردیف هر آیتم است (StageTable.build).
+    خروجی: (وضعیت هر آیتم، plan_entry های تریال‌های ذخیره‌شده)
+    """
+    results = [None] * len(payloads)
+    groups = defaultdict(list)  # model -> [(index, response, plan_entry)]
+
+    for index, data in enumerate(payloads):
+        try:
+            response, plan_entry = build(user, data)
+        except PayloadError as e:
+            results[index] = {'index': index, **e.as_dict()}
+            continue
+        groups[type(response)].append((index, response, plan_entry))
+
+    created_entries = []
+    created_rows = []
+    with transaction.atomic():
+        lock_participant(user)
+        for model, items in groups.items():
+            fields = TRIAL_IDENTITY[model]
+            rows = model.objects.filter(user=user)
+            if not identity_is_unique(model):
+                # تریال غیرفعال‌شده (مثلاً تکرار بلاک) دوباره قابل ثبت است
+                rows = rows.filter(is_active=True)
+            existing = {trial_identity(model, row) for row in rows.values_list(*fields)}
+            to_create = []
+            for index, response, plan_entry in items:
+                try:
+                    key = trial_identity(model, [getattr(response, f) for f in fields])
+                except ValidationError as e:
+                    results[index] = {'index': index, 'status': 'error', 'message': str(e)}
+                    continue
+                if key in existing:
+                    results[index] = {'index': index, 'status': 'duplicate'}
+                    continue
+                existing.add(key)
+                to_create.append((index, response, plan_entry))
+            failed = {index for index, _, _ in insert_trials(model, to_create)} if to_create else set()
+            for index, response, plan_entry in to_create:
+                if index in failed:
+                    results[index] = {'index': index, 'status': 'error', 'message': 'ثبت تریال در پایگاه داده رد شد'}
+                    continue
+                results[index] = {'index': index, 'status': 'created'}
+                created_rows.append(response)
+                if plan_entry:
+                    created_entries.append(plan_entry)
+        if created_rows:
+            ParticipantProgress.record(user, created_rows)
+            # bulk_create سیگنال post_save نمی‌فرستد
+            StimulusNorm.record(created_rows)
+
+    return results, created_entries
+
+
+def batch_payload(results: list) -> dict:
+    return {'status': 'success', 'results': results}
+
+
+def parse_save_request(request) -> Tuple[object, Optional[JsonResponse]]:
+    """(payload، پاسخ خطا)؛ بدنه درخواست ذخیره تریال(ها)"""
+    if request.method != 'POST':
+        return None, JsonResponse({'status': 'error', 'message': 'فقط POST'}, status=405)
     try:
-        filename = url.split('/')[-1]
-        number_str = filename.split('.')[0]
-        return int(number_str)
-    except (IndexError, ValueError):
-        return None
+        return decode(request.body), None
+    except json.JSONDecodeError:
+        return None, JsonResponse({'status': 'error', 'message': 'JSON نامعتبر'}, status=400)
 
 
-def get_cues_mapping() -> Dict[str, str]:
-    """ساخت mapping بین فایل‌های cue و sequence مورد انتظار"""
-    CUE_CATEGORIES = {
-        '1': ['CUE/1/1.mp3'],
-        '2': ['CUE/2/2.mp3'],
-        '3': ['CUE/3/3.mp3'],
-    }
+def unauthenticated_response(user) -> Optional[JsonResponse]:
+    """endpointهای ذخیره csrf_exempt هستند و login_required ندارند؛ بدون نشست معتبر پاسخ 401"""
+    if user.is_authenticated:
+        return None
+    return JsonResponse({'status': 'error', 'message': 'نشست منقضی شده است؛ دوباره وارد شوید'}, status=401)
 
-    POSSIBLE_SEQUENCES = ['Neutral-Neutral', 'Negative-Neutral', 'Neutral-Negative']
-    sequences_shuffled = POSSIBLE_SEQUENCES.copy()
-    random.shuffle(sequences_shuffled)
-
-    category_to_sequence = dict(zip(CUE_CATEGORIES.keys(), sequences_shuffled))
-    
-    cues_mapping = {}
-    for category, sequence in category_to_sequence.items():
-        for cue_file in CUE_CATEGORIES[category]:
-            cues_mapping[cue_file] = sequence
-
-    return {build_audio_url(key): value for key, value in cues_mapping.items()}
-
-
-def get_stimuli_lists() -> Tuple[List[str], List[str]]:
-    """لیست صداهای خنثی و منفی + shuffle"""
-    neutral_files = [
-        # '4-MP-HA/114.mp3',
-        # '4-MP-HA/204.mp3',
-        # '4-MP-HA/210.mp3',
-        # '4-MP-HA/216.mp3',
-        # '4-MP-HA/610.mp3',
-        # '4-MP-HA/704.mp3',
-        # '4-MP-HA/710.mp3',
-        # '4-MP-HA/715.mp3',
-        '5-MP-MA/102.mp3',
-        # '5-MP-MA/104.mp3',
-        # '5-MP-MA/107.mp3',
-        # '5-MP-MA/111.mp3',
-        # '5-MP-MA/113.mp3',
-        # '5-MP-MA/120.mp3',
-        # '5-MP-MA/130.mp3',
-        # '5-MP-MA/132.mp3',
-        '5-MP-MA/152.mp3',
-        '5-MP-MA/170.mp3',
-        # '5-MP-MA/225.mp3',
-        # '5-MP-MA/245.mp3',
-        '5-MP-MA/246.mp3',
-        # '5-MP-MA/251.mp3',
-        # '5-MP-MA/252.mp3',
-        '5-MP-MA/320.mp3',
-        '5-MP-MA/322.mp3',
-        '5-MP-MA/358.mp3',
-        '5-MP-MA/361.mp3',
-        '5-MP-MA/364.mp3',
-        '5-MP-MA/368.mp3',
-        '5-MP-MA/370.mp3',
-        '5-MP-MA/373.mp3',
-        '5-MP-MA/374.mp3',
-        '5-MP-MA/375.mp3',
-        '5-MP-MA/376.mp3',
-        '5-MP-MA/382.mp3',
-        '5-MP-MA/403.mp3',
-        '5-MP-MA/410.mp3',
-        '5-MP-MA/425.mp3',
-        # '5-MP-MA/500.mp3',
-        # '5-MP-MA/627.mp3',
-        '5-MP-MA/698.mp3',
-        # '5-MP-MA/700.mp3',
-        '5-MP-MA/701.mp3',
-        # '5-MP-MA/702.mp3',
-        '5-MP-MA/705.mp3',
-        # '5-MP-MA/706.mp3',
-        # '5-MP-MA/720.mp3',
-        '5-MP-MA/722.mp3',
-        # '5-MP-MA/723.mp3',
-        '5-MP-MA/724.mp3',
-        # '5-MP-MA/728.mp3',
-        # '5-MP-MA/729.mp3',
-    ]
 
-    negative_files = [
-        # '7-LP-HA/105.mp3',
-        '7-LP-HA/106.mp3',
-        '7-LP-HA/115.mp3',
-        '7-LP-HA/116.mp3',
-        '7-LP-HA/133.mp3',
-        # '7-LP-HA/134.mp3',
-        '7-LP-HA/244.mp3',
-        '7-LP-HA/255.mp3',
-        '7-LP-HA/260.mp3',
-        '7-LP-HA/261.mp3',
-        '7-LP-HA/275.mp3',
-        '7-LP-HA/276.mp3',
-        '7-LP-HA/277.mp3',
-        '7-LP-HA/278.mp3',
-        '7-LP-HA/279.mp3',
-        # '7-LP-HA/281.mp3',
-        '7-LP-HA/282.mp3',
-        '7-LP-HA/283.mp3',
-        '7-LP-HA/284.mp3',
-        '7-LP-HA/285.mp3',
-        '7-LP-HA/286.mp3',
-        '7-LP-HA/288.mp3',
-        '7-LP-HA/289.mp3',
-        '7-LP-HA/290.mp3',
-        '7-LP-HA/292.mp3',
-        '7-LP-HA/296.mp3',
-        '7-LP-HA/310.mp3',
-        # '7-LP-HA/312.mp3',
-        # '7-LP-HA/319.mp3',
-        '7-LP-HA/380.mp3',
-        '7-LP-HA/420.mp3',
-        '7-LP-HA/422.mp3',
-        '7-LP-HA/423.mp3',
-        '7-LP-HA/424.mp3',
-        '7-LP-HA/501.mp3',
-        '7-LP-HA/502.mp3',
-        '7-LP-HA/600.mp3',
-        '7-LP-HA/624.mp3',
-        '7-LP-HA/625.mp3',
-        '7-LP-HA/626.mp3',
-        '7-LP-HA/699.mp3',
-        # '7-LP-HA/709.mp3',
-        '7-LP-HA/711.mp3',
-        '7-LP-HA/712.mp3',
-        '7-LP-HA/713.mp3',
-        '7-LP-HA/714.mp3',
-        # '7-LP-HA/719.mp3',
-        '7-LP-HA/730.mp3',
-        '7-LP-HA/732.mp3',
-        # '7-LP-HA/910.mp3',
-        '8-LP-MA/241.mp3',
-        '8-LP-MA/242.mp3',
-        # '8-LP-MA/243.mp3',
-        # '8-LP-MA/250.mp3',
-        '8-LP-MA/280.mp3',
-        '8-LP-MA/293.mp3',
-        '8-LP-MA/295.mp3',
-        '8-LP-MA/611.mp3',
-        # '8-LP-MA/703.mp3',
-    ]
+def save_rating_payload(user, data) -> Tuple[dict, int]:
+    """ذخیره یک تریال یا دسته‌ای از تریال‌های رتبه‌بندی؛ خروجی: (بدنه JSON، کد وضعیت)"""
+    # حالت دسته‌ای: آرایه‌ای از تریال‌ها
+    if isinstance(data, list):
+        results, _ = save_trial_batch(user, data, RATING_PAYLOADS.build)
+        return batch_payload(results), 200
+
+    try:
+        response, _ = RATING_PAYLOADS.build(user, data)
+    except PayloadError as e:
+        return e.as_dict(), 400
+    with transaction.atomic():
+        lock_participant(user)
+        response.save()
+        ParticipantProgress.record(user, [response])
 
-    neutral_files = list(set(neutral_files))
-    negative_files = list(set(negative_files))
-    random.shuffle(neutral_files)
-    random.shuffle(negative_files)
+    return {'status': 'success'}, 200
 
-    return neutral_files, negative_files
 
+@csrf_exempt
+def rating_save_response(request):
+    data, error = parse_save_request(request)
+    if error:
+        return error
+    error = unauthenticated_response(request.user)
+    if error:
+        return error
+    payload, status = save_rating_payload(request.user, data)
+    return JsonResponse(payload, status=status)
 
-def build_audio_url(filename: str) -> str:
-    return f"/static/sounds/{filename}"
 
-# متغیرهای مشترک برای همه مراحل
-CUE_URLS = list(get_cues_mapping().keys())
+@csrf_exempt
+async def rating_save_response_async(request):
+    data, error = parse_save_request(request)
+    if error:
+        return error
+    # ذخیره و شمارنده‌های پیشرفت باید در یک تراکنش باشند و ORM async تراکنش ندارد؛
+    # کل واحد نوشتن در thread همین درخواست اجرا می‌شود
+    user = await request.auser()
+    error = unauthenticated_response(user)
+    if error:
+        return error
+    payload, status = await sync_to_async(save_rating_payload)(user, data)
+    return JsonResponse(payload, status=status)
 
+###################################################################################################### 
+###################################################################################################### 
+###################################################################################################### 
+###################################################################################################### 
 # لیست همه صداهای استفاده‌شده در آزمون اصلی (برای مرحله ۵)
 def get_used_stimuli_urls(user):
     stimuli = set()
@@ -644,23 +643,22 @@ def get_used_stimuli_urls(user):
 
 
 SEQUENCES = ['Negative-Neutral', 'Neutral-Negative', 'Neutral-Neutral']
+MAPPING_CUES = ("/static/sounds/CUE/1/1.mp3", "/static/sounds/CUE/2/2.mp3", "/static/sounds/CUE/3/3.mp3")
 def get_or_create_cue_mapping(user):
     try:
         return PCMCueMapping.objects.get(user=user).mapping
     except PCMCueMapping.DoesNotExist:
         pass
 
-    # تخصیص ثابت و بدون رندم برای همه کاربران
-    mapping = {
-        "/static/sounds/CUE/1/1.mp3": "Negative-Neutral",
-        "/static/sounds/CUE/2/2.mp3": "Neutral-Negative",
-        "/static/sounds/CUE/3/3.mp3": "Neutral-Neutral",
-    }
-    # اگر CUE_URLS از جای دیگری می‌آید و ممکن است ترتیب یا تعدادش فرق کند:
+    # counterbalancing: کاربر جدید کم‌استفاده‌ترین جایگشت cue → sequence را می‌گیرد
+    permutation = PCMCueAssignment.allocate(len(planning.CUE_PERMUTATIONS))
     obj, created = PCMCueMapping.objects.get_or_create(
         user=user,
-        defaults={'mapping': mapping}
+        defaults={'mapping': planning.cue_mapping(MAPPING_CUES, permutation)}
     )
+    if not created:
+        # درخواست هم‌زمان دیگری از همین کاربر نگاشت را زودتر ساخته است
+        PCMCueAssignment.release(permutation)
     return obj.mapping
 
 def get_sequence_order(user, total_trials: int) -> List[str]:
@@ -687,153 +685,123 @@ def normalize_cue_to_full(cue, cues_mapping) -> Optional[str]:
     if cue in cues_mapping:
         return cue
 
-    # ۲. اگر فقط عدد است (مثل "1" یا 1)
-    if cue.isdigit():
-        candidate = f"/static/sounds/CUE/{cue}/{cue}.mp3"
-        if candidate in cues_mapping:
-            return candidate
+    # کلیدها ممکن است URL هش‌دار باشند؛ مقایسه روی مسیر کاتالوگ انجام می‌شود
+    paths = {stimulus_path(full): full for full in cues_mapping}
 
-    # ۳. اگر فقط نام فایل است (مثل "1.mp3")
-    if cue.endswith('.mp3'):
-        number = cue.split('.')[0]
-        if number.isdigit():
-            candidate = f"/static/sounds/CUE/{number}/{number}.mp3"
-            if candidate in cues_mapping:
-                return candidate
+    # ۲. اگر فقط عدد است (مثل "1" یا 1) یا ۳. فقط نام فایل (مثل "1.mp3")
+    number = cue[:-len('.mp3')] if cue.endswith('.mp3') else cue
+    if number.isdigit():
+        candidate = paths.get(f"CUE/{number}/{number}.mp3")
+        if candidate:
+            return candidate
 
     # ۴. جستجوی آخرین بخش مسیر
-    for full in cues_mapping:
-        if full.endswith(f"/{cue}") or full.endswith(f"/{cue}.mp3"):
+    cue_path = stimulus_path(cue)
+    for path, full in paths.items():
+        if path == cue_path or path.endswith(f"/{cue_path}") or path.endswith(f"/{cue}.mp3"):
             return full
 
     return None
 
 
-@login_required(login_url='login_or_signup')
-@questionnaires_required([1, 2, 3])
-def pcm_view(request):
-    user = request.user
-    cues_mapping = get_or_create_cue_mapping(user)
-    neutral_raw, negative_raw = get_stimuli_lists()
-    NEUTRAL_URLS = [build_audio_url(f) for f in neutral_raw]
-    NEGATIVE_URLS = [build_audio_url(f) for f in negative_raw]
+def normalized_cue_counts(counts, cues_mapping) -> Counter:
+    """شمارش به تفکیک کیو ذخیره‌شده -> شمارش به تفکیک کلید cues_mapping (کیوهای ناشناخته کنار گذاشته می‌شوند)"""
+    normalized = Counter()
+    for cue, n in counts.items():
+        full = normalize_cue_to_full(cue, cues_mapping)
+        if full:
+            normalized[full] += n
+    return normalized
 
-    # --- مرحله 1: تمرین رتبه‌بندی خوشایندی ---
-    VALENCE_PRACTICE_TRIALS = 9
-    valence_practice_responses = PCMValencePracticeResponse.objects.filter(user=user)
-    valence_practice_count = valence_practice_responses.count()
-    RESPONSE_TIMEOUT = 3000
-    progress_percentage = (valence_practice_count / VALENCE_PRACTICE_TRIALS) * 100
 
-    if valence_practice_count < VALENCE_PRACTICE_TRIALS:
-        remain_trials = VALENCE_PRACTICE_TRIALS - valence_practice_count
+######################################################################################################
+# پلن جلسه PCM
+# پلن هر مرحله/بلاک فقط یک‌بار (با RNG دارای seed) از روی پاسخ‌های ذخیره‌شده ساخته می‌شود؛
+# pcm_save_response فقط cursor پلن را جلو می‌برد و رفرش صفحه یک خواندن ساده از PCMSessionPlan است.
+######################################################################################################
+
+def stimulus_key(url) -> Optional[str]:
+    """کلید یکتای صدا به همان شکلی که در جدول پاسخ‌ها ذخیره می‌شود (شماره فایل)"""
+    number = extract_stimulus_number(url)
+    return str(number) if number is not None else None
 
-        possible_sequences = ["Neutral-Neutral", "Neutral-Negative", "Negative-Neutral"]
 
-        # شمارش توالی‌های استفاده‌شده تا الان
-        used_sequences = [
-            f"{r.category_stim1}-{r.category_stim2}"
-            for r in valence_practice_responses
-            if r.category_stim1 and r.category_stim2
-        ]
-        counts = Counter(used_sequences)
+def remaining_stimuli(urls, used) -> List[str]:
+    """صداهای مصرف‌نشده؛ اگر همه مصرف شده باشند اجازه تکرار داده می‌شود"""
+    remaining = [url for url in urls if stimulus_key(url) not in used]
+    return remaining or urls[:]
 
-        target_per_seq = VALENCE_PRACTICE_TRIALS // len(possible_sequences)  # 3
-        remainder_total = VALENCE_PRACTICE_TRIALS % len(possible_sequences)  # 0
 
-        remaining_per_seq = {}
-        for i, seq in enumerate(possible_sequences):
-            target = target_per_seq + (1 if i < remainder_total else 0)
-            remaining_per_seq[seq] = max(0, target - counts.get(seq, 0))
+def build_session_plan(user, rng: random.Random) -> dict:
+    """
+    ساخت پلن مرحله جاری PCM از روی پاسخ‌های ذخیره‌شده.
+    خروجی شامل stage، block، tracks (تریال‌های باقی‌مانده هر بخش)، pools (صداها)،
+    base (شمارش‌ها در لحظه ساخت) و context ثابت قالب است.
+    """
+    catalog = stimulus_catalog()
+    # کلیدهای نگاشت ذخیره‌شده URL بدون هش هستند؛ در پلن با URL فعلی (هش‌دار) جایگزین می‌شوند
+    cues_mapping = {
+        catalog.url(stimulus_path(cue)): sequence
+        for cue, sequence in get_or_create_cue_mapping(user).items()
+    }
+    progress = PCMProgress(user)
+    config = pcm_config()
+
+    def _norm_cue(c):
+        return normalize_cue_to_full(c, cues_mapping) or c
 
-        # ساخت لیست بر اساس کمبودها
-        sequence_order = []
-        for seq, rem in remaining_per_seq.items():
-            sequence_order.extend([seq] * rem)
+    CUE_URLS = list(catalog.urls('cues'))
+    NEUTRAL_URLS = list(catalog.urls('pcm_neutral'))
+    NEGATIVE_URLS = list(catalog.urls('pcm_negative'))
 
-        # اگر به هر دلیلی کمبود داشتیم
-        if len(sequence_order) < remain_trials:
-            extra_needed = remain_trials - len(sequence_order)
-            for _ in range(extra_needed):
-                sequence_order.append(random.choice(possible_sequences))
+    # --- مرحله 1: تمرین رتبه‌بندی خوشایندی ---
+    VALENCE_PRACTICE_TRIALS = config.valence_practice_trials
+    valence_practice_count = progress.valence_practice_count
 
-        # فقط shuffle ساده (بدون محدودیت پشت‌سرهم)
-        random.shuffle(sequence_order)
+    if valence_practice_count < VALENCE_PRACTICE_TRIALS:
+        sequence_order = planning.valence_practice_sequences(
+            VALENCE_PRACTICE_TRIALS, valence_practice_count, progress.valence_practice_sequences, rng
+        )
 
         # ========== جلوگیری از تکرار صدا ==========
-        used_stimuli = set()
-        for r in valence_practice_responses:
-            if getattr(r, 'stimulus1', None):
-                used_stimuli.add(r.stimulus1)
-            if getattr(r, 'stimulus2', None):
-                used_stimuli.add(r.stimulus2)
-
-        remaining_neutral = [url for url in NEUTRAL_URLS if url not in used_stimuli]
-        remaining_negative = [url for url in NEGATIVE_URLS if url not in used_stimuli]
-
-        # اگر همه صداها مصرف شده‌اند → اجازه تکرار
-        if not remaining_neutral:
-            remaining_neutral = NEUTRAL_URLS[:]
-        if not remaining_negative:
-            remaining_negative = NEGATIVE_URLS[:]
-
-        random.shuffle(remaining_neutral)
-        random.shuffle(remaining_negative)
+        used_stimuli = progress.valence_practice_used_stimuli
+
+        remaining_neutral = remaining_stimuli(NEUTRAL_URLS, used_stimuli)
+        remaining_negative = remaining_stimuli(NEGATIVE_URLS, used_stimuli)
+        rng.shuffle(remaining_neutral)
+        rng.shuffle(remaining_negative)
         # ==========================================
 
-        context = {
-            'current_trial': valence_practice_count,
-            'total_trials': VALENCE_PRACTICE_TRIALS,
-            'progress_percentage': round(progress_percentage, 1),
-            'cue_urls': json.dumps(CUE_URLS),
-            'neutral_urls': json.dumps(remaining_neutral),
-            'negative_urls': json.dumps(remaining_negative),
-            'cues_mapping': json.dumps(cues_mapping),
-            "RESPONSE_TIMEOUT": RESPONSE_TIMEOUT,
-            'remaining_sequences': json.dumps(sequence_order),
+        return {
+            'stage': 'valence_practice',
+            'block': 1,
+            'tracks': {'trials': sequence_order},
+            'pools': {'neutral': remaining_neutral, 'negative': remaining_negative},
+            'base': {'done': valence_practice_count, 'total': VALENCE_PRACTICE_TRIALS},
+            'context': {
+                'total_trials': VALENCE_PRACTICE_TRIALS,
+                'cue_urls': CUE_URLS,
+                'cues_mapping': cues_mapping,
+            },
         }
-        return render(request, '1_valence_practice.html', context)
-    
 
     # --- مرحله 2: تمرین تشخیص توالی ---
-    PRACTICE_TRIALS = 30
+    PRACTICE_TRIALS = config.seq_practice_trials
     CATCH_TRIALS_PER_BLOCK = 6
     TOTAL_PER_BLOCK = PRACTICE_TRIALS + CATCH_TRIALS_PER_BLOCK  # 36
-    SEQ_THRESHOLD = 0.80
-    MAX_BLOCKS = 3
+    SEQ_THRESHOLD = config.seq_threshold
+    MAX_BLOCKS = config.seq_max_blocks
 
     # پیدا کردن آخرین بلاک استفاده‌شده
-    last_practice = (
-        PCMSequencePracticeResponse.objects
-        .filter(user=user, is_active=True)
-        .order_by('-block', '-trial')
-        .first()
-    )
-    last_catch = (
-        PCMSequenceCatchResponse.objects
-        .filter(user=user, is_active=True)
-        .order_by('-block', '-trial')
-        .first()
-    )
-
-    max_block_practice = last_practice.block if last_practice and last_practice.block else 0
-    max_block_catch = last_catch.block if last_catch and last_catch.block else 0
-    current_block = max(max_block_practice, max_block_catch, 1)
+    current_block = max(progress.last_seq_block, 1)
 
     def is_block_fully_done(block_num):
-        p_count = PCMSequencePracticeResponse.objects.filter(
-            user=user, block=block_num, is_active=True
-        ).count()
-        c_count = PCMSequenceCatchResponse.objects.filter(
-            user=user, block=block_num, is_active=True
-        ).count()
-        return p_count >= PRACTICE_TRIALS and c_count >= CATCH_TRIALS_PER_BLOCK
+        stats = progress.seq_block(block_num)
+        return stats['practice'] >= PRACTICE_TRIALS and stats['catch'] >= CATCH_TRIALS_PER_BLOCK
 
     show_retry_modal = False
     while current_block <= MAX_BLOCKS and is_block_fully_done(current_block):
-        c_correct = PCMSequenceCatchResponse.objects.filter(
-            user=user, block=current_block, is_active=True, is_correct=True
-        ).count()
+        c_correct = progress.seq_block(current_block)['catch_correct']
         accuracy = c_correct / CATCH_TRIALS_PER_BLOCK if CATCH_TRIALS_PER_BLOCK > 0 else 0
 
         if accuracy >= SEQ_THRESHOLD:
@@ -844,993 +812,426 @@ def pcm_view(request):
 
     if current_block > MAX_BLOCKS:
         text = "متاسفانه با توجه به نتایج کسب‌شده حائز شرکت در ادامه آزمون نبودید"
-        return render(request, 'failed.html', {'text': text})
+        return {'stage': 'failed', 'block': MAX_BLOCKS, 'context': {'text': text}}
 
     # ------------------------------------------------------------------
-    practice_responses = PCMSequencePracticeResponse.objects.filter(
-        user=user, block=current_block, is_active=True
-    )
-    practice_count = practice_responses.count()
-    practice_correct = practice_responses.filter(is_correct=True).count()
-
-    catch_responses = PCMSequenceCatchResponse.objects.filter(
-        user=user, block=current_block, is_active=True
-    )
-    catch_count = catch_responses.count()
-    catch_correct = catch_responses.filter(is_correct=True).count()
-
-    feedback = FeedbackSettings.objects.first()
-
-    completed_in_block = practice_count + catch_count
-    progress_percentage = (completed_in_block / TOTAL_PER_BLOCK) * 100
+    block_stats = progress.seq_block(current_block)
+    practice_count = block_stats['practice']
+    practice_correct = block_stats['practice_correct']
+    catch_count = block_stats['catch']
+    catch_correct = block_stats['catch_correct']
+
+    seq_practice_plan = {
+        'stage': 'seq_practice',
+        'block': current_block,
+        'base': {
+            'practice': practice_count,
+            'practice_correct': practice_correct,
+            'catch': catch_count,
+            'catch_correct': catch_correct,
+            'total': TOTAL_PER_BLOCK,
+        },
+        'context': {
+            'total_trials': TOTAL_PER_BLOCK,
+            'cue_urls': CUE_URLS,
+            'cues_mapping': cues_mapping,
+            'current_block': current_block,
+            'show_retry_modal': show_retry_modal,
+        },
+    }
 
     # ========== اگر هنوز تمرین تمام نشده ==========
     if practice_count < PRACTICE_TRIALS:
-        remain_trials = PRACTICE_TRIALS - practice_count
-        cue_list = list(cues_mapping.keys())
-        ALL_SEQUENCES = ["Neutral-Neutral", "Neutral-Negative", "Negative-Neutral"]
-
-        # ---------- شمارش دقیق وضعیت فعلی از پاسخ‌های ذخیره‌شده ----------
-        def _norm_cue(c):
-            return normalize_cue_to_full(c, cues_mapping) or c
-
-        used_total_per_cue = Counter()          # تعداد کل تریال هر کیو
-        used_incons_per_cue = Counter()         # تعداد inconsistent هر کیو
-        used_incons_seqs_per_cue = {}           # cue -> set از actual_seqهای inconsistent
-
-        for r in practice_responses:
-            if not r.cue:
-                continue
-            cue = _norm_cue(r.cue)
-            used_total_per_cue[cue] += 1
-            if not r.is_consistent:
-                used_incons_per_cue[cue] += 1
-                if r.category_stim1 and r.category_stim2:
-                    actual = f"{r.category_stim1}-{r.category_stim2}"
-                    used_incons_seqs_per_cue.setdefault(cue, set()).add(actual)
-
-        # ---------- هدف نهایی بلاک: دقیقاً ۱۰ تا از هر کیو، ۸ consistent + ۲ inconsistent ----------
-        # inconsistentهای هر کیو = دو توالی دیگر (هر کدام یک‌بار)
-        target_total = 10
-        target_incons = 2
-
-        need_total = {}
-        need_incons = {}
-        need_incons_seqs = {}  # لیست actual_seqهایی که هنوز باید بیایند
-
-        for cue in cue_list:
-            expected = cues_mapping[cue]
-            other_seqs = [s for s in ALL_SEQUENCES if s != expected]
-
-            need_total[cue] = max(0, target_total - used_total_per_cue[cue])
-            already_incons = used_incons_per_cue[cue]
-            need_incons[cue] = max(0, target_incons - already_incons)
-
-            already_seqs = used_incons_seqs_per_cue.get(cue, set())
-            missing_incons = [s for s in other_seqs if s not in already_seqs]
-            need_incons_seqs[cue] = missing_incons[:need_incons[cue]]
-
-        # ---------- ساخت لیست کامل inconsistentهای باقی‌مانده ----------
-        remaining_incons = []
-        for cue in cue_list:
-            for actual_seq in need_incons_seqs[cue]:
-                remaining_incons.append({
-                    "cue": cue,
-                    "expected_seq": actual_seq,   # actual sequence که باید پخش شود
-                    "is_consistent": False,
-                })
-
-        if len(remaining_incons) > remain_trials:
-            random.shuffle(remaining_incons)
-            remaining_incons = remaining_incons[:remain_trials]
-
-        # ---------- ساخت consistentهای باقی‌مانده برای رسیدن به ۱۰ تا از هر کیو ----------
-        remaining_cons = []
-        for cue in cue_list:
-            cons_needed = need_total[cue] - len(need_incons_seqs[cue])
-            for _ in range(max(0, cons_needed)):
-                remaining_cons.append({
-                    "cue": cue,
-                    "expected_seq": cues_mapping[cue],
-                    "is_consistent": True,
-                })
-
-        # ---------- ادغام و تنظیم تعداد کل به remain_trials ----------
-        remaining_plan = remaining_incons[:]
-        cons_pool = remaining_cons[:]
-        random.shuffle(cons_pool)
-
-        while len(remaining_plan) < remain_trials and cons_pool:
-            remaining_plan.append(cons_pool.pop())
-
-        # اگر هنوز کم است (نباید)، از کم‌استفاده‌ترین کیو consistent اضافه کن
-        while len(remaining_plan) < remain_trials:
-            candidates = [
-                c for c in cue_list
-                if used_total_per_cue[c] + sum(1 for t in remaining_plan if t["cue"] == c) < target_total
-            ]
-            if not candidates:
-                candidates = cue_list
-            cue = min(
-                candidates,
-                key=lambda c: used_total_per_cue[c] + sum(1 for t in remaining_plan if t["cue"] == c)
-            )
-            remaining_plan.append({
-                "cue": cue,
-                "expected_seq": cues_mapping[cue],
-                "is_consistent": True,
-            })
-
-        # اگر بیشتر شد، فقط consistentها را کم کن
-        if len(remaining_plan) > remain_trials:
-            incons = [t for t in remaining_plan if not t["is_consistent"]]
-            cons = [t for t in remaining_plan if t["is_consistent"]]
-            needed_cons = max(0, remain_trials - len(incons))
-            random.shuffle(cons)
-            remaining_plan = incons + cons[:needed_cons]
-
-        # ========== قانون ۶ تای اول (حتی بعد از رفرش) ==========
-        already_done = practice_count
-        first_6_remaining = max(0, 6 - already_done)
-
-        if first_6_remaining > 0:
-            cons = [t for t in remaining_plan if t["is_consistent"]]
-            incons = [t for t in remaining_plan if not t["is_consistent"]]
-
-            # فقط در حالت اضطراری inconsistent را موقتاً به consistent تبدیل کن
-            while len(cons) < first_6_remaining and incons:
-                item = incons.pop(0)
-                cons.append({
-                    "cue": item["cue"],
-                    "expected_seq": cues_mapping[item["cue"]],
-                    "is_consistent": True,
-                })
-
-            random.shuffle(cons)
-            random.shuffle(incons)
-
-            forced_first = cons[:first_6_remaining]
-            rest = cons[first_6_remaining:] + incons
-            random.shuffle(rest)
-            remaining_plan = forced_first + rest
-        else:
-            random.shuffle(remaining_plan)
-
-        remaining_sequences = [t["expected_seq"] for t in remaining_plan]
-        remaining_cues = [t["cue"] for t in remaining_plan]
-        remaining_consistent = [t["is_consistent"] for t in remaining_plan]
-
-        # --- پلان catch ---
-        catch_plan = []
-        for cue in cue_list:
-            catch_plan.extend([cue] * 2)
-        random.shuffle(catch_plan)
-
-        used_cues = [r.cue for r in catch_responses]
-        used_counter = Counter(used_cues)
-        final_catch_cues = []
-        for cue in catch_plan:
-            if used_counter[cue] > 0:
-                used_counter[cue] -= 1
-            else:
-                final_catch_cues.append(cue)
-
-        while len(final_catch_cues) < CATCH_TRIALS_PER_BLOCK:
-            least_used = min(cue_list, key=lambda c: used_counter[c])
-            final_catch_cues.append(least_used)
-            used_counter[least_used] += 1
-        final_catch_cues = final_catch_cues[:CATCH_TRIALS_PER_BLOCK]
+        usage = planning.CueUsage.from_groups(progress.seq_practice_block_groups(current_block), _norm_cue)
+        remaining_plan = planning.seq_practice_trials(
+            cues_mapping, usage, PRACTICE_TRIALS - practice_count, practice_count, rng,
+            per_cue=PRACTICE_TRIALS // len(cues_mapping),
+        )
+        final_catch_cues = planning.practice_catch_cues(
+            list(cues_mapping), normalized_cue_counts(progress.seq_catch_cues(current_block), cues_mapping),
+            CATCH_TRIALS_PER_BLOCK, rng,
+        )
 
         # جلوگیری از تکرار صدا
-        used_stimuli = set()
-        for r in practice_responses:
-            if getattr(r, 'stimulus1', None):
-                used_stimuli.add(r.stimulus1)
-            if getattr(r, 'stimulus2', None):
-                used_stimuli.add(r.stimulus2)
-
-        remaining_neutral = [url for url in NEUTRAL_URLS if url not in used_stimuli]
-        remaining_negative = [url for url in NEGATIVE_URLS if url not in used_stimuli]
+        used_stimuli = progress.seq_practice_used_stimuli(current_block)
 
-        if not remaining_neutral:
-            remaining_neutral = NEUTRAL_URLS[:]
-        if not remaining_negative:
-            remaining_negative = NEGATIVE_URLS[:]
-
-        random.shuffle(remaining_neutral)
-        random.shuffle(remaining_negative)
-
-        context = {
-            'current_trial': completed_in_block,
-            'total_trials': TOTAL_PER_BLOCK,
-            'trial_number_for_save': practice_count,
-            'progress_percentage': round(progress_percentage, 1),
-            'cue_urls': json.dumps(CUE_URLS),
-            'neutral_urls': json.dumps(remaining_neutral),
-            'negative_urls': json.dumps(remaining_negative),
-            'cues_mapping': json.dumps(cues_mapping),
-            'remaining_sequences': json.dumps(remaining_sequences),
-            'remaining_cues': json.dumps(remaining_cues),
-            'remaining_consistent': json.dumps(remaining_consistent),
-            'catch_cues_plan': json.dumps(final_catch_cues),
-            'current_block': current_block,
-            'is_catch_stage': False,
-            'practice_trials_done': practice_count,
-            'catch_trials_done': catch_count,
+        remaining_neutral = remaining_stimuli(NEUTRAL_URLS, used_stimuli)
+        remaining_negative = remaining_stimuli(NEGATIVE_URLS, used_stimuli)
+        rng.shuffle(remaining_neutral)
+        rng.shuffle(remaining_negative)
 
-            'feedback_mode': feedback.feedback_mode if feedback else 'always',
-            'feedback_first_n': feedback.feedback_first_n if feedback else 5,
-            'feedback_until_correct': feedback.feedback_until_correct if feedback else 5,
-            'feedback_correct_consecutive': feedback.feedback_correct_consecutive if feedback else False,
-            'correct_so_far': practice_correct,
-            'show_retry_modal': show_retry_modal,
-        }
-        return render(request, '2_seq_practice.html', context)
+        seq_practice_plan['tracks'] = {'practice': remaining_plan, 'catch': final_catch_cues}
+        seq_practice_plan['pools'] = {'neutral': remaining_neutral, 'negative': remaining_negative}
+        return seq_practice_plan
 
     # ========== مرحله Catch ==========
     if catch_count < CATCH_TRIALS_PER_BLOCK:
-        remain_catch = CATCH_TRIALS_PER_BLOCK - catch_count
-        cue_list = list(cues_mapping.keys())
-
-        used_cues = []
-        for r in catch_responses:
-            full = normalize_cue_to_full(r.cue, cues_mapping)
-            if full:
-                used_cues.append(full)
-        used_counter = Counter(used_cues)
-
-        remaining_cues = []
-        for cue in cue_list:
-            used = used_counter.get(cue, 0)
-            still_need = max(0, 2 - used)
-            remaining_cues.extend([cue] * still_need)
-
-        if len(remaining_cues) < remain_catch:
-            for cue in cue_list:
-                if used_counter.get(cue, 0) < 2:
-                    remaining_cues.append(cue)
-                    used_counter[cue] = used_counter.get(cue, 0) + 1
-                    if len(remaining_cues) >= remain_catch:
-                        break
-        elif len(remaining_cues) > remain_catch:
-            random.shuffle(remaining_cues)
-            remaining_cues = remaining_cues[:remain_catch]
-
-        random.shuffle(remaining_cues)
+        remaining_cues = planning.remaining_catch_cues(
+            list(cues_mapping), normalized_cue_counts(progress.seq_catch_cues(current_block), cues_mapping),
+            CATCH_TRIALS_PER_BLOCK - catch_count, rng,
+        )
+        seq_practice_plan['tracks'] = {'practice': [], 'catch': remaining_cues}
+        seq_practice_plan['pools'] = {'neutral': NEUTRAL_URLS, 'negative': NEGATIVE_URLS}
+        return seq_practice_plan
 
-        context = {
-            'current_trial': completed_in_block,
-            'total_trials': TOTAL_PER_BLOCK,
-            'trial_number_for_save': catch_count,
-            'progress_percentage': round(progress_percentage, 1),
-            'cue_urls': json.dumps(CUE_URLS),
-            'neutral_urls': json.dumps(NEUTRAL_URLS),
-            'negative_urls': json.dumps(NEGATIVE_URLS),
-            'cues_mapping': json.dumps(cues_mapping),
-            'remaining_sequences': json.dumps([]),
-            'remaining_cues': json.dumps(remaining_cues),
-            'remaining_consistent': json.dumps([]),
-            'catch_cues_plan': json.dumps([]),
-            'current_block': current_block,
-            'is_catch_stage': True,
-            'practice_trials_done': practice_count,
-            'catch_trials_done': catch_count,
 
-            'feedback_mode': feedback.feedback_mode if feedback else 'always',
-            'feedback_first_n': feedback.feedback_first_n if feedback else 5,
-            'feedback_until_correct': feedback.feedback_until_correct if feedback else 5,
-            'feedback_correct_consecutive': feedback.feedback_correct_consecutive if feedback else False,
-            'correct_so_far': catch_correct,
-            'show_retry_modal': show_retry_modal,
-        }
-        return render(request, '2_seq_practice.html', context)
+    # --- مرحله ۳: آزمون اصلی PCM ---
+    NUM_BLOCKS = planning.MAIN_BLOCKS
+    CATCH_TRIALS_PER_BLOCK = planning.MAIN_CATCH_PER_BLOCK
+    MAIN_TRIALS_PER_BLOCK = planning.MAIN_TRIALS_PER_BLOCK
+    total_trials_all = NUM_BLOCKS * (CATCH_TRIALS_PER_BLOCK + MAIN_TRIALS_PER_BLOCK)
 
-    # ========== مرحله Catch (۶ تریال) ==========
-    if catch_count < CATCH_TRIALS_PER_BLOCK:
-        remain_catch = CATCH_TRIALS_PER_BLOCK - catch_count
-        cue_list = list(cues_mapping.keys())
-
-        used_cues = []
-        for r in catch_responses:
-            full = normalize_cue_to_full(r.cue, cues_mapping)
-            if full:
-                used_cues.append(full)
-        used_counter = Counter(used_cues)
-
-        remaining_cues = []
-        for cue in cue_list:
-            used = used_counter.get(cue, 0)
-            still_need = max(0, 2 - used)
-            remaining_cues.extend([cue] * still_need)
-
-        if len(remaining_cues) < remain_catch:
-            for cue in cue_list:
-                if used_counter.get(cue, 0) < 2:
-                    remaining_cues.append(cue)
-                    used_counter[cue] = used_counter.get(cue, 0) + 1
-                    if len(remaining_cues) >= remain_catch:
-                        break
-        elif len(remaining_cues) > remain_catch:
-            random.shuffle(remaining_cues)
-            remaining_cues = remaining_cues[:remain_catch]
-
-        random.shuffle(remaining_cues)
+    used_mismatches = [
+        (g['expected_sequence'], f"{g['category_stim1']}-{g['category_stim2']}")
+        for g in progress.main_groups
+        if g['is_consistent'] is False and g['expected_sequence'] and g['category_stim1'] and g['category_stim2']
+    ]
+    blocks = [
+        planning.MainBlockState(
+            block=block_num,
+            catch_done=progress.pcm_catch_count(block_num),
+            main_done=progress.main_count(block_num),
+            inconsistent_done=progress.main_inconsistent_count(block_num),
+            catch_cues=normalized_cue_counts(progress.pcm_catch_cues(block_num), cues_mapping),
+        )
+        for block_num in range(1, NUM_BLOCKS + 1)
+    ]
+    total_completed = sum(b.catch_done + b.main_done for b in blocks)
+    main_tracks, current_block = planning.main_tracks(
+        cues_mapping, planning.CueUsage.from_groups(progress.main_groups, _norm_cue), used_mismatches, blocks, rng
+    )
 
-        context = {
-            'current_trial': completed_in_block,
-            'total_trials': TOTAL_PER_BLOCK,
-            'trial_number_for_save': catch_count,          # از ۰ → در JS می‌شود ۱
-            'progress_percentage': round(progress_percentage, 1),
-            'cue_urls': json.dumps(CUE_URLS),
-            'neutral_urls': json.dumps(NEUTRAL_URLS),
-            'negative_urls': json.dumps(NEGATIVE_URLS),
-            'cues_mapping': json.dumps(cues_mapping),
-            'remaining_sequences': json.dumps([]),
-            'remaining_cues': json.dumps(remaining_cues),
-            'remaining_consistent': json.dumps([]),
-            'catch_cues_plan': json.dumps([]),
-            'current_block': current_block,
-            'is_catch_stage': True,
-            'practice_trials_done': practice_count,
-            'catch_trials_done': catch_count,
+    # ========== جلوگیری از تکرار صدا در کل ۳ بلاک ==========
+    used_stimuli_global = progress.main_used_stimuli
 
-            'feedback_mode': feedback.feedback_mode if feedback else 'always',
-            'feedback_first_n': feedback.feedback_first_n if feedback else 5,
-            'feedback_until_correct': feedback.feedback_until_correct if feedback else 5,
-            'feedback_correct_consecutive': feedback.feedback_correct_consecutive if feedback else False,
-            'correct_so_far': catch_correct,
-            'show_retry_modal': show_retry_modal,
+    remaining_neutral_global = remaining_stimuli(NEUTRAL_URLS, used_stimuli_global)
+    remaining_negative_global = remaining_stimuli(NEGATIVE_URLS, used_stimuli_global)
+    rng.shuffle(remaining_neutral_global)
+    rng.shuffle(remaining_negative_global)
+    # ========================================================
+
+    last_block, last_trial = progress.main_last or (0, 0)
+
+    # اگر همه بلاک‌ها تمام نشده → پلن آزمون اصلی
+    if current_block is not None:
+        return {
+            'stage': 'pcm_main',
+            'block': current_block,
+            'tracks': main_tracks,
+            'pools': {'neutral': remaining_neutral_global, 'negative': remaining_negative_global},
+            'base': {
+                'completed': total_completed,
+                'total': total_trials_all,
+                'last_trial': last_trial,
+                'last_block': last_block,
+                'blocks': NUM_BLOCKS,
+            },
+            'context': {
+                'total_blocks': NUM_BLOCKS,
+                'catch_trials_per_block': CATCH_TRIALS_PER_BLOCK,
+                'trials_per_block': MAIN_TRIALS_PER_BLOCK,
+                'trials': total_trials_all,
+                'cue_urls': CUE_URLS,
+                'cues_mapping': cues_mapping,
+            },
         }
-        return render(request, '2_seq_practice.html', context)
 
 
-    # --- مرحله ۳: آزمون اصلی PCM ---
-    NUM_BLOCKS = 3
-    CATCH_TRIALS_PER_BLOCK = 6
-    MAIN_TRIALS_PER_BLOCK = 14
-    TARGET_PER_CUE = 14          # در مجموع ۳ بلاک
-    TARGET_INCONS_PER_CUE = 2    # از ۱۴ تا → ۱۲ consistent + ۲ inconsistent
-    INCONS_PER_BLOCK = 2
+    # --- مرحله 4: تمرین رتبه بندی خوشایندی و برانگیختگی---
+    RATING_PRACTICE_TRIALS = config.rating_practice_trials
+    practice_files = catalog.urls('rating_practice')[:RATING_PRACTICE_TRIALS]
+    rating_practice_count = progress.rating_practice_count
+    if rating_practice_count < RATING_PRACTICE_TRIALS:
+        return {
+            'stage': 'rating_practice',
+            'block': 1,
+            'tracks': {'trials': practice_files[rating_practice_count:]},
+            'base': {'done': rating_practice_count, 'total': RATING_PRACTICE_TRIALS},
+            'context': {'total_trials': RATING_PRACTICE_TRIALS},
+        }
 
-    current_block = None
-    all_catch_sequences = {}  # {block_num: [ {cue, expected_seq}, ... ]}
-    all_main_trials = {}      # {block_num: [ {actual_seq, cue, expected_seq}, ... ]}
+    # --- مرحله ۵: رتبه‌بندی  همه صداهای ارائه شده (خوشایندی و برانگیختگی) ---
+    main_rating_files = catalog.urls('pcm_rating')
+    # تعداد کل محرک‌ها
+    TOTAL_MAIN_RATING_TRIALS = len(main_rating_files)
+    # تعداد رتبه‌بندی‌های تکمیل‌شده (هر دو valence و arousal پر باشند)
+    completed_paths = {stimulus_path(f) for f in progress.rating_main_completed_files}
+    rating_main_done = len(completed_paths)
 
-    total_completed = 0
-    total_trials_all = NUM_BLOCKS * (CATCH_TRIALS_PER_BLOCK + MAIN_TRIALS_PER_BLOCK)
+    if rating_main_done < TOTAL_MAIN_RATING_TRIALS:
+        remaining_files = [f for f in main_rating_files if stimulus_path(f) not in completed_paths]
+        rng.shuffle(remaining_files)
+
+        return {
+            'stage': 'rating_main',
+            'block': 1,
+            'tracks': {'trials': remaining_files},
+            'base': {'done': rating_main_done, 'total': TOTAL_MAIN_RATING_TRIALS},
+            'context': {'total_trials': TOTAL_MAIN_RATING_TRIALS},
+        }
 
-    cue_list = list(cues_mapping.keys())
-    ALL_SEQUENCES = ["Neutral-Neutral", "Neutral-Negative", "Negative-Neutral"]
-
-    # --- تعریف تمام mismatchهای ممکن (۶ ترکیب = ۲ تا برای هر کیو) ---
-    ALL_MISMATCHES = [
-        {"expected_seq": "Neutral-Neutral",  "actual_seq": "Neutral-Negative"},
-        {"expected_seq": "Neutral-Neutral",  "actual_seq": "Negative-Neutral"},
-        {"expected_seq": "Neutral-Negative", "actual_seq": "Neutral-Neutral"},
-        {"expected_seq": "Neutral-Negative", "actual_seq": "Negative-Neutral"},
-        {"expected_seq": "Negative-Neutral", "actual_seq": "Neutral-Neutral"},
-        {"expected_seq": "Negative-Neutral", "actual_seq": "Neutral-Negative"},
-    ]
+    # --- پایان آزمون ---
+    return {'stage': 'done', 'block': 1}
 
-    # ========== شمارش سراسری از دیتابیس (برای رفرش) ==========
-    def _norm_cue(c):
-        return normalize_cue_to_full(c, cues_mapping) or c
 
-    used_total_per_cue = Counter()
-    used_incons_per_cue = Counter()
-    used_incons_seqs_per_cue = {}  # cue -> set(actual_seq)
+def get_session_plan(user) -> PCMSessionPlan:
+    """پلن ذخیره‌شده کاربر؛ اگر وجود نداشته، باطل شده یا تمام شده باشد از نو ساخته می‌شود"""
+    session_plan = PCMSessionPlan.objects.filter(user=user).first()
+    if session_plan is not None and session_plan.is_usable():
+        return session_plan
 
-    for r in PCMMainResponse.objects.filter(user=user):
-        if not r.cue:
-            continue
-        cue = _norm_cue(r.cue)
-        used_total_per_cue[cue] += 1
-        if not r.is_consistent:
-            used_incons_per_cue[cue] += 1
-            if r.category_stim1 and r.category_stim2:
-                actual = f"{r.category_stim1}-{r.category_stim2}"
-                used_incons_seqs_per_cue.setdefault(cue, set()).add(actual)
-
-    # شمارندهٔ برنامه‌ریزی‌شده در همین درخواست (تا بلاک‌های بعدی هم تعادل را ببینند)
-    planned_total_per_cue = Counter()
-    planned_incons_per_cue = Counter()
-
-    # mismatchهای باقی‌مانده (سراسری)
-    used_mismatches = set()
-    for r in PCMMainResponse.objects.filter(user=user, is_consistent=False):
-        if r.expected_sequence and r.category_stim1 and r.category_stim2:
-            actual = f"{r.category_stim1}-{r.category_stim2}"
-            used_mismatches.add((r.expected_sequence, actual))
-
-    remaining_mismatches = [
-        m for m in ALL_MISMATCHES
-        if (m["expected_seq"], m["actual_seq"]) not in used_mismatches
-    ]
-    random.shuffle(remaining_mismatches)
-    mismatch_idx = 0
+    if session_plan is None:
+        session_plan = PCMSessionPlan(user=user, seed=random.SystemRandom().randrange(1, 2 ** 62))
+    else:
+        session_plan.revision += 1
 
-    # ========== جلوگیری از تکرار صدا در کل ۳ بلاک ==========
-    used_stimuli_global = set()
-    for r in PCMMainResponse.objects.filter(user=user):
-        if getattr(r, 'stimulus1', None):
-            used_stimuli_global.add(r.stimulus1)
-        if getattr(r, 'stimulus2', None):
-            used_stimuli_global.add(r.stimulus2)
-
-    remaining_neutral_global = [url for url in NEUTRAL_URLS if url not in used_stimuli_global]
-    remaining_negative_global = [url for url in NEGATIVE_URLS if url not in used_stimuli_global]
-
-    if not remaining_neutral_global:
-        remaining_neutral_global = NEUTRAL_URLS[:]
-    if not remaining_negative_global:
-        remaining_negative_global = NEGATIVE_URLS[:]
-
-    random.shuffle(remaining_neutral_global)
-    random.shuffle(remaining_negative_global)
-    # ========================================================
+    # هر بازسازی RNG مخصوص خودش را دارد تا پلن با (seed, revision) قابل بازتولید باشد
+    rng = random.Random(f"{session_plan.seed}:{session_plan.revision}")
+    built = build_session_plan(user, rng)
 
+    session_plan.version = PCMSessionPlan.CURRENT_VERSION
+    session_plan.stage = built.pop('stage')
+    session_plan.block = built.pop('block')
+    session_plan.plan = built
+    session_plan.cursor = {}
     try:
-        last_response = PCMMainResponse.objects.filter(user=user).order_by("created_at").last()
-        last_trial = last_response.trial if last_response else 0
-        last_block = last_response.block if last_response else 0
-    except Exception:
-        last_trial = 0
-        last_block = 0
-
-    def current_cue_count(cue):
-        return used_total_per_cue[cue] + planned_total_per_cue[cue]
-
-    def current_incons_count(cue):
-        return used_incons_per_cue[cue] + planned_incons_per_cue[cue]
+        with transaction.atomic():
+            session_plan.save()
+    except IntegrityError:
+        # درخواست همزمان دیگری پلن را ساخته است
+        return PCMSessionPlan.objects.get(user=user)
+    return session_plan
 
-    for block_num in range(1, NUM_BLOCKS + 1):
-        catch_count = PCMCatchResponse.objects.filter(user=user, block=block_num).count()
-        main_count = PCMMainResponse.objects.filter(user=user, block=block_num).count()
 
-        completed_in_block = catch_count + main_count
-        total_completed += completed_in_block
-
-        if catch_count < CATCH_TRIALS_PER_BLOCK or main_count < MAIN_TRIALS_PER_BLOCK:
-            if current_block is None:
+def session_plan_context(session_plan: PCMSessionPlan) -> Tuple[str, dict]:
+    """
+    ساخت قالب و context صفحه از روی پلن ذخیره‌شده و cursor آن (بدون هیچ کوئری).
+    تنظیمات نمایشی (فیدبک و مهلت پاسخ) از pcm_config خوانده می‌شوند تا تغییر آن‌ها فوراً اعمال شود.
+    """
+    plan = session_plan.plan
+    cursor = session_plan.cursor
+    tracks = plan.get('tracks', {})
+    base = plan.get('base', {})
+    context = dict(plan.get('context', {}))
+
+    position = {name: min(cursor.get(name, 0), len(items)) for name, items in tracks.items()}
+    remaining = {name: items[position[name]:] for name, items in tracks.items()}
+
+    used = set(cursor.get('used', []))
+    pools = plan.get('pools', {})
+    neutral_urls = remaining_stimuli(pools.get('neutral', []), used)
+    negative_urls = remaining_stimuli(pools.get('negative', []), used)
+
+    for key in ('cue_urls', 'cues_mapping'):
+        if key in context:
+            context[key] = json.dumps(context[key])
+
+    stage = session_plan.stage
+
+    if stage == 'valence_practice':
+        done = base['done'] + position['trials']
+        context.update({
+            'RESPONSE_TIMEOUT': pcm_config().response_timeout,
+            'current_trial': done,
+            'progress_percentage': round((done / base['total']) * 100, 1),
+            'neutral_urls': json.dumps(neutral_urls),
+            'negative_urls': json.dumps(negative_urls),
+            'remaining_sequences': json.dumps(remaining['trials']),
+        })
+        return '1_valence_practice.html', context
+
+    if stage == 'seq_practice':
+        practice_count = base['practice'] + position['practice']
+        catch_count = base['catch'] + position['catch']
+        completed_in_block = practice_count + catch_count
+        context.update(pcm_config().feedback_context())
+        context.update({
+            'current_trial': completed_in_block,
+            'progress_percentage': round((completed_in_block / base['total']) * 100, 1),
+            'practice_trials_done': practice_count,
+            'catch_trials_done': catch_count,
+        })
+
+        if remaining['practice']:
+            context.update({
+                'trial_number_for_save': practice_count,
+                'neutral_urls': json.dumps(neutral_urls),
+                'negative_urls': json.dumps(negative_urls),
+                'remaining_sequences': json.dumps([t["expected_seq"] for t in remaining['practice']]),
+                'remaining_cues': json.dumps([t["cue"] for t in remaining['practice']]),
+                'remaining_consistent': json.dumps([t["is_consistent"] for t in remaining['practice']]),
+                'catch_cues_plan': json.dumps(remaining['catch']),
+                'is_catch_stage': False,
+                'correct_so_far': base['practice_correct'] + cursor.get('practice:correct', 0),
+            })
+        else:
+            context.update({
+                'trial_number_for_save': catch_count,          # از ۰ → در JS می‌شود ۱
+                'neutral_urls': json.dumps(pools.get('neutral', [])),
+                'negative_urls': json.dumps(pools.get('negative', [])),
+                'remaining_sequences': json.dumps([]),
+                'remaining_cues': json.dumps(remaining['catch']),
+                'remaining_consistent': json.dumps([]),
+                'catch_cues_plan': json.dumps([]),
+                'is_catch_stage': True,
+                'correct_so_far': base['catch_correct'] + cursor.get('catch:correct', 0),
+            })
+        return '2_seq_practice.html', context
+
+    if stage == 'pcm_main':
+        all_catch_sequences = {}
+        all_main_trials = {}
+        current_block = None
+        for block_num in range(1, base['blocks'] + 1):
+            catch_trials = remaining.get(f'catch:{block_num}')
+            main_trials = remaining.get(f'main:{block_num}')
+            if catch_trials:
+                all_catch_sequences[block_num] = catch_trials
+            if main_trials:
+                all_main_trials[block_num] = main_trials
+            if current_block is None and (catch_trials or main_trials):
                 current_block = block_num
 
-        # --- ساخت ترایال‌های catch برای این بلاک ---
-        if catch_count < CATCH_TRIALS_PER_BLOCK:
-            remain_catch = CATCH_TRIALS_PER_BLOCK - catch_count
-
-            used_cues = []
-            for r in PCMCatchResponse.objects.filter(user=user, block=block_num):
-                full = normalize_cue_to_full(r.cue, cues_mapping)
-                if full:
-                    used_cues.append(full)
-            used_counter = Counter(used_cues)
-
-            remaining_cues = []
-            for cue in cue_list:
-                used = used_counter.get(cue, 0)
-                still_need = max(0, 2 - used)
-                remaining_cues.extend([cue] * still_need)
-
-            if len(remaining_cues) < remain_catch:
-                for cue in cue_list:
-                    if used_counter.get(cue, 0) < 2:
-                        remaining_cues.append(cue)
-                        used_counter[cue] = used_counter.get(cue, 0) + 1
-                        if len(remaining_cues) >= remain_catch:
-                            break
-            elif len(remaining_cues) > remain_catch:
-                random.shuffle(remaining_cues)
-                remaining_cues = remaining_cues[:remain_catch]
-
-            random.shuffle(remaining_cues)
-
-            catch_trials = []
-            for cue in remaining_cues:
-                catch_trials.append({
-                    'cue': cue,
-                    'expected_seq': cues_mapping.get(cue),
-                })
-
-            all_catch_sequences[block_num] = catch_trials
-
-        # --- ساخت توالی‌های main برای این بلاک ---
-        if main_count < MAIN_TRIALS_PER_BLOCK:
-            remain_main = MAIN_TRIALS_PER_BLOCK - main_count
-
-            used_inconsistent_in_block = PCMMainResponse.objects.filter(
-                user=user, block=block_num, is_consistent=False
-            ).count()
-            remain_inconsistent = max(0, INCONS_PER_BLOCK - used_inconsistent_in_block)
-            remain_consistent = remain_main - remain_inconsistent
-
-            final_trials = []
-
-            # --- inconsistentها (هدف سراسری: ۲ تا برای هر کیو) ---
-            for _ in range(remain_inconsistent):
-                chosen = None
-
-                while mismatch_idx < len(remaining_mismatches):
-                    m = remaining_mismatches[mismatch_idx]
-                    mismatch_idx += 1
-                    expected_seq = m["expected_seq"]
-                    actual_seq = m["actual_seq"]
-
-                    cue_candidates = [
-                        c for c, exp in cues_mapping.items() if exp == expected_seq
-                    ]
-                    cue_candidates = [
-                        c for c in cue_candidates
-                        if current_incons_count(c) < TARGET_INCONS_PER_CUE
-                        and actual_seq not in used_incons_seqs_per_cue.get(c, set())
-                    ]
-                    if cue_candidates:
-                        cue = min(cue_candidates, key=lambda c: current_cue_count(c))
-                        chosen = {
-                            'actual_seq': actual_seq,
-                            'cue': cue,
-                            'expected_seq': expected_seq,
-                        }
-                        break
-
-                if chosen is None:
-                    # fallback: کیویی که هنوز inconsistent کم دارد
-                    needy = [
-                        c for c in cue_list
-                        if current_incons_count(c) < TARGET_INCONS_PER_CUE
-                    ]
-                    if not needy:
-                        needy = cue_list[:]
-                    cue = min(needy, key=lambda c: current_cue_count(c))
-                    expected_seq = cues_mapping[cue]
-                    other_seqs = [s for s in ALL_SEQUENCES if s != expected_seq]
-                    already = used_incons_seqs_per_cue.get(cue, set())
-                    missing = [s for s in other_seqs if s not in already]
-                    actual_seq = missing[0] if missing else random.choice(other_seqs)
-                    chosen = {
-                        'actual_seq': actual_seq,
-                        'cue': cue,
-                        'expected_seq': expected_seq,
-                    }
-
-                final_trials.append(chosen)
-                planned_total_per_cue[chosen['cue']] += 1
-                planned_incons_per_cue[chosen['cue']] += 1
-                used_incons_seqs_per_cue.setdefault(chosen['cue'], set()).add(chosen['actual_seq'])
-
-            # --- consistentها: اولویت با کیوهایی که هنوز زیر ۱۴ تا هستند ---
-            for _ in range(remain_consistent):
-                candidates = [
-                    c for c in cue_list
-                    if current_cue_count(c) < TARGET_PER_CUE
-                ]
-                if not candidates:
-                    candidates = cue_list[:]
-
-                cue = min(candidates, key=lambda c: current_cue_count(c))
-                seq = cues_mapping[cue]
-
-                final_trials.append({
-                    'actual_seq': seq,
-                    'cue': cue,
-                    'expected_seq': seq,
-                })
-                planned_total_per_cue[cue] += 1
-
-            random.shuffle(final_trials)
-            all_main_trials[block_num] = final_trials
-
-    progress_percentage = (total_completed / total_trials_all) * 100 if total_trials_all > 0 else 0
-
-    # اگر همه بلاک‌ها تمام شد → به مرحله بعدی برو
-    if current_block is None:
-        # ادامه کد مراحل بعدی (rating practice و ...)
-        pass
-    else:
-        context = {
+        completed = base['completed'] + sum(position.values())
+        last_block, last_trial = cursor.get('last_main', [base['last_block'], base['last_trial']])
+        context.update({
             'current_block': current_block,
-            'total_blocks': NUM_BLOCKS,
-            'catch_trials_per_block': CATCH_TRIALS_PER_BLOCK,
-            'trials_per_block': MAIN_TRIALS_PER_BLOCK,
-            'progress_percentage': round(progress_percentage, 1),
-            'completed': total_completed,
-            'trials': total_trials_all,
-
-            'cue_urls': json.dumps(CUE_URLS),
-            'neutral_urls': json.dumps(remaining_neutral_global),
-            'negative_urls': json.dumps(remaining_negative_global),
-            'cues_mapping': json.dumps(cues_mapping),
-
+            'progress_percentage': round((completed / base['total']) * 100, 1),
+            'completed': completed,
+            'neutral_urls': json.dumps(neutral_urls),
+            'negative_urls': json.dumps(negative_urls),
             'last_trial': last_trial,
             'last_block': last_block,
             'next_block': last_block + 1,
-
             'all_catch_sequences': json.dumps(all_catch_sequences),
             'all_main_trials': json.dumps(all_main_trials),
-        }
-        return render(request, '3_pcm_main.html', context)
-    
+        })
+        return '3_pcm_main.html', context
+
+    if stage == 'rating_practice':
+        done = base['done'] + position['trials']
+        context.update({
+            'current_trial': done + 1,
+            'count': done,
+            'progress_percentage': (done / base['total']) * 100,
+            'remaining_practice_files': json.dumps(remaining['trials']),
+        })
+        return '4_rating_practice.html', context
+
+    # rating_main
+    done = base['done'] + position['trials']
+    context.update({
+        'current_trial': done + 1,
+        'count': done,
+        'progress_percentage': (done / base['total']) * 100 if base['total'] > 0 else 100,
+        'remaining_main_files': json.dumps(remaining['trials']),
+    })
+    return '5_rating_main.html', context
 
-    # --- مرحله 4: تمرین رتبه بندی خوشایندی و برانگیختگی---
-    RATING_PRACTICE_TRIALS = 10
-    PRACTICE_FILES_RAW = [
-        '0-practice/1.mp3',
-        '0-practice/2.mp3',
-        '0-practice/3.mp3',
-        '0-practice/4.mp3',
-        '0-practice/5.mp3',
-        '0-practice/6.mp3',
-        '0-practice/7.mp3',
-        '0-practice/8.mp3',
-        '0-practice/9.mp3',
-        '0-practice/10.mp3',
-    ]
-    practice_files = [build_audio_url(f) for f in PRACTICE_FILES_RAW[:RATING_PRACTICE_TRIALS]]
-    rating_practice_count = RatingPracticeResponse.objects.filter(user=user).count()
-    progress_percentage = (rating_practice_count / RATING_PRACTICE_TRIALS) * 100
-    if rating_practice_count < RATING_PRACTICE_TRIALS:
-        remaining_files = practice_files[rating_practice_count:]
-        context = {
-            'current_trial': rating_practice_count + 1,
-            'count':rating_practice_count,
-            'total_trials': RATING_PRACTICE_TRIALS,
-            'progress_percentage': progress_percentage,
-            'remaining_practice_files': json.dumps(remaining_files),
-        }
-        return render(request, '4_rating_practice.html', context)
 
-    # --- مرحله ۵: رتبه‌بندی  همه صداهای ارائه شده (خوشایندی و برانگیختگی) ---
-    MAIN_RATING_FILES_RAW = [
-        '5-MP-MA/102.mp3',
-        '5-MP-MA/152.mp3',
-        '5-MP-MA/170.mp3',
-        '5-MP-MA/246.mp3',
-        '5-MP-MA/320.mp3',
-        '5-MP-MA/322.mp3',
-        '5-MP-MA/358.mp3',
-        '5-MP-MA/361.mp3',
-        '5-MP-MA/364.mp3',
-        '5-MP-MA/368.mp3',
-        '5-MP-MA/370.mp3',
-        '5-MP-MA/373.mp3',
-        '5-MP-MA/374.mp3',
-        '5-MP-MA/375.mp3',
-        '5-MP-MA/376.mp3',
-        '5-MP-MA/382.mp3',
-        '5-MP-MA/403.mp3',
-        '5-MP-MA/410.mp3',
-        '5-MP-MA/425.mp3',
-        '5-MP-MA/698.mp3',
-        '5-MP-MA/701.mp3',
-        '5-MP-MA/705.mp3',
-        '5-MP-MA/722.mp3',
-        '5-MP-MA/724.mp3',
-        '7-LP-HA/106.mp3',
-        '7-LP-HA/115.mp3',
-        '7-LP-HA/116.mp3',
-        '7-LP-HA/133.mp3',
-        '7-LP-HA/244.mp3',
-        '7-LP-HA/255.mp3',
-        '7-LP-HA/260.mp3',
-        '7-LP-HA/261.mp3',
-        '7-LP-HA/275.mp3',
-        '7-LP-HA/276.mp3',
-        '7-LP-HA/277.mp3',
-        '7-LP-HA/278.mp3',
-        '7-LP-HA/279.mp3',
-        '7-LP-HA/282.mp3',
-        '7-LP-HA/283.mp3',
-        '7-LP-HA/284.mp3',
-        '7-LP-HA/285.mp3',
-        '7-LP-HA/286.mp3',
-        '7-LP-HA/288.mp3',
-        '7-LP-HA/289.mp3',
-        '7-LP-HA/290.mp3',
-        '7-LP-HA/292.mp3',
-        '7-LP-HA/296.mp3',
-        '7-LP-HA/310.mp3',
-        '7-LP-HA/380.mp3',
-        '7-LP-HA/420.mp3',
-        '7-LP-HA/422.mp3',
-        '7-LP-HA/423.mp3',
-        '7-LP-HA/424.mp3',
-        '7-LP-HA/501.mp3',
-        '7-LP-HA/502.mp3',
-        '7-LP-HA/600.mp3',
-        '7-LP-HA/624.mp3',
-        '7-LP-HA/625.mp3',
-        '7-LP-HA/626.mp3',
-        '7-LP-HA/699.mp3',
-        '7-LP-HA/711.mp3',
-        '7-LP-HA/712.mp3',
-        '7-LP-HA/713.mp3',
-        '7-LP-HA/714.mp3',
-        '7-LP-HA/730.mp3',
-        '7-LP-HA/732.mp3',
-        '8-LP-MA/241.mp3',
-        '8-LP-MA/242.mp3',
-        '8-LP-MA/280.mp3',
-        '8-LP-MA/293.mp3',
-        '8-LP-MA/295.mp3',
-        '8-LP-MA/611.mp3',
-    ]
+def advance_session_plan(user, entries: List[Tuple[str, str, dict]]) -> None:
+    """
+    جلو بردن cursor پلن بعد از ذخیره پاسخ‌ها؛ هر entry به شکل (stage, track, payload) است.
+    اگر پاسخی با پلن جاری نخواند (مثلاً تب قدیمی)، پلن باطل می‌شود تا در درخواست بعدی از دیتابیس بازسازی شود.
+    """
+    if not entries:
+        return
+
+    with transaction.atomic():
+        session_plan = PCMSessionPlan.objects.select_for_update().filter(user=user).first()
+        if session_plan is None or session_plan.version != PCMSessionPlan.CURRENT_VERSION:
+            return
+
+        tracks = session_plan.plan.get('tracks', {})
+        cursor = session_plan.cursor
+        for stage, track, data in entries:
+            block_mismatch = stage == 'seq_practice' and data.get('block', 1) != session_plan.block
+            if session_plan.stage != stage or track not in tracks or block_mismatch:
+                session_plan.version = 0
+                session_plan.save(update_fields=['version', 'updated_at'])
+                return
+
+            cursor[track] = cursor.get(track, 0) + 1
+            if data.get('is_correct'):
+                cursor[f'{track}:correct'] = cursor.get(f'{track}:correct', 0) + 1
+            for key in ('stimulus1', 'stimulus2'):
+                used = stimulus_key(data.get(key))
+                if used is not None:
+                    cursor.setdefault('used', []).append(used)
+            if track.startswith('main:'):
+                cursor['last_main'] = [data['block'], data['trial']]
+
+        session_plan.save(update_fields=['cursor', 'updated_at'])
 
-    # حذف تکراری‌ها
-    MAIN_RATING_FILES_RAW = list(set(MAIN_RATING_FILES_RAW))
-    # تبدیل به URL کامل
-    main_rating_files = [build_audio_url(f) for f in MAIN_RATING_FILES_RAW]
-    # تعداد کل محرک‌ها
-    TOTAL_MAIN_RATING_TRIALS = len(main_rating_files)
-    # تعداد رتبه‌بندی‌های تکمیل‌شده (هر دو valence و arousal پر باشند)
-    rating_main_done = RatingMainResponse.objects.filter(
-        user=user
-    ).exclude(
-        valence__isnull=True
-    ).exclude(
-        arousal__isnull=True
-    ).count()
 
-    progress_percentage = (rating_main_done / TOTAL_MAIN_RATING_TRIALS) * 100 if TOTAL_MAIN_RATING_TRIALS > 0 else 100
-    if rating_main_done < TOTAL_MAIN_RATING_TRIALS:
-        completed_stimuli_urls = set(
-            RatingMainResponse.objects.filter(
-                user=user,
-                valence__isnull=False,
-                arousal__isnull=False
-            ).values_list('stimulus_file', flat=True)
-        )
+@login_required(login_url='login_or_signup')
+@questionnaires_required([1, 2, 3])
+def pcm_view(request):
+    session_plan = get_session_plan(request.user)
 
-        remaining_files = [f for f in main_rating_files if f not in completed_stimuli_urls]
-        random.shuffle(remaining_files)
+    if session_plan.stage == 'failed':
+        return render(request, 'failed.html', session_plan.plan['context'])
 
-        context = {
-            'current_trial': rating_main_done + 1,
-            'count':rating_main_done,
-            'total_trials': TOTAL_MAIN_RATING_TRIALS,
-            'progress_percentage': progress_percentage,
-            'remaining_main_files': json.dumps(remaining_files),
-        }
-        return render(request, '5_rating_main.html', context)
+    if session_plan.stage == 'done':
+        # --- پایان آزمون ---
+        return redirect('/final/')
 
-    # --- پایان آزمون ---
-    return redirect('/final/')
+    template, context = session_plan_context(session_plan)
+    return render(request, template, context)
 
 
-@csrf_exempt
-def pcm_save_response(request):
-    if request.method != 'POST':
-        return JsonResponse({'status': 'error', 'message': 'فقط POST'}, status=405)
+def save_pcm_payload(user, data) -> Tuple[dict, int]:
+    """ذخیره یک تریال یا دسته‌ای از تریال‌های PCM و جلو بردن پلن؛ خروجی: (بدنه JSON، کد وضعیت)"""
+    # حالت دسته‌ای: آرایه‌ای از تریال‌ها (ترکیبی از مراحل مختلف مجاز است)
+    if isinstance(data, list):
+        results, plan_entries = save_trial_batch(user, data, PCM_PAYLOADS.build)
+        if plan_entries:
+            advance_session_plan(user, plan_entries)
+        return batch_payload(results), 200
 
     try:
-        data = json.loads(request.body)
-    except json.JSONDecodeError:
-        return JsonResponse({'status': 'error', 'message': 'JSON نامعتبر'}, status=400)
-
-    user = request.user
-    # مرحله 1: تمرین رتبه‌بندی خوشایندی
-    if data.get('is_valence_practice'):
-            PCMValencePracticeResponse.objects.create(
-                user=user,
-                trial=data['trial'],
-                cue=extract_stimulus_number(data['cue']),
-                stimulus1=extract_stimulus_number(data.get('stimulus1')),
-                stimulus2=extract_stimulus_number(data.get('stimulus2')),
-                category_stim1=data.get('category_stim1'),
-                category_stim2=data.get('category_stim2'),
-                valence_stim1=data.get('valence_stim1'),
-                valence_rt_stim1=data.get('valence_rt_stim1') or data.get('rt_stim1'),
-                valence_delay_number_stim1=data.get('valence_delay_number_stim1', 0),
-                valence_input_method_stim1=data.get('valence_input_method_stim1'),
-                valence_stim2=data.get('valence_stim2'),
-                valence_rt_stim2=data.get('valence_rt_stim2') or data.get('rt_stim2'),
-                valence_delay_number_stim2=data.get('valence_delay_number_stim2', 0),
-                valence_input_method_stim2=data.get('valence_input_method_stim2'),
-                valence_sequence=data.get('valence_sequence'),
-                valence_rt_sequence=data.get('valence_rt_sequence') or data.get('rt_sequence'),
-                valence_delay_number_sequence=data.get('valence_delay_number_sequence', 0),
-                valence_input_method_sequence=data.get('valence_input_method_sequence'),
-            )
-    # مرحله 2: تمرین تشخیص توالی
-    elif data.get('is_catch'):
-        PCMSequenceCatchResponse.objects.create(
-            user=request.user,
-            block=data.get('block', 1),
-            trial=data['trial'],
-            cue=extract_stimulus_number(data['cue']),
-            user_response=data['user_response'],
-            response_rt=data.get('response_rt'),
-            delay_number=data.get('delay_number', 0),
-            response_input_method=data.get('response_input_method'),
-            is_correct=data.get('is_correct'),
-        )
-    
-    elif data.get('is_seq_practice'):
-        
-        PCMSequencePracticeResponse.objects.create(
-            user=user,
-            trial=data['trial'] ,
-            block=data.get('block', 1),
-            cue=extract_stimulus_number(data['cue']),
-            stimulus1=extract_stimulus_number(data.get('stimulus1')),
-            stimulus2=extract_stimulus_number(data.get('stimulus2')),
-            category_stim1=data.get('category_stim1'),
-            category_stim2=data.get('category_stim2'),
-            expected_sequence=data.get('expected_sequence'),
-            user_response=data['user_response'],
-            response_rt=data['response_rt'],
-            delay_number=data['delay_number'],
-            response_input_method=data['response_input_method'],
-            is_correct=data['is_correct'],
-            is_consistent=data.get('is_consistent', True),
-        )
-
-    # مرحله ۳: آزمون اصلی
-    elif data.get('is_catch_pcm'):
-        PCMCatchResponse.objects.create(
-            user=user,
-            block=data.get('block', None),
-            trial=data['trial'],
-            cue=extract_stimulus_number(data['cue']),
-            user_response=data.get('user_response'),
-            response_rt=data['response_rt'],
-            delay_number=data.get('delay_number', 0),
-            response_input_method=data.get('response_input_method'),
-            is_correct=data.get('is_correct')
-        )
-
-    # در create برای main، اضافه کردن category_stim1 و category_stim2
-    elif 'block' in data and 'trial' in data and not data.get('is_catch'):
-        PCMMainResponse.objects.create(
-            user=user,
-            block=data['block'],
-            trial=data['trial'],
-            cue=extract_stimulus_number(data['cue']),
-            stimulus1=extract_stimulus_number(data.get('stimulus1')),
-            stimulus2=extract_stimulus_number(data.get('stimulus2')),
-            expected_sequence=data.get('expected_sequence'),
-            is_consistent=data.get('is_consistent', True),
-            category_stim1=data.get('category_stim1'),
-            category_stim2=data.get('category_stim2'),
-            valence_stim1=data.get('valence_stim1'),
-            valence_rt_stim1=data.get('valence_rt_stim1'),
-            valence_delay_number_stim1=data.get('valence_delay_number_stim1', 0),
-            valence_input_method_stim1=data.get('valence_input_method_stim1'),
-            valence_stim2=data.get('valence_stim2'),
-            valence_rt_stim2=data.get('valence_rt_stim2'),
-            valence_delay_number_stim2=data.get('valence_delay_number_stim2', 0),
-            valence_input_method_stim2=data.get('valence_input_method_stim2'),
-            valence_sequence=data.get('valence_sequence'),
-            valence_rt_sequence=data.get('valence_rt_sequence'),
-            valence_delay_number_sequence=data.get('valence_delay_number_sequence', 0),
-            valence_input_method_sequence=data.get('valence_input_method_sequence'),
-        )
+        response, plan_entry = PCM_PAYLOADS.build(user, data)
+    except PayloadError as e:
+        return e.as_dict(), 400
+    with transaction.atomic():
+        lock_participant(user)
+        response.save()
+        ParticipantProgress.record(user, [response])
 
-    # مرحله ۴: تمرین رتبه‌بندی کامل
-    elif data.get('is_rating_practice'):
-        RatingPracticeResponse.objects.create(
-            user=user,
-            trial=data['trial'],
-            stimulus=extract_stimulus_number(data.get('stimulus')),
-            valence=data.get('valence'),
-            valence_rt=data.get('valence_rt'),
-            valence_delay_number = data.get('valence_delay_number', 0),
-            valence_input_method=data.get('valence_input_method'),
-            arousal=data.get('arousal'),
-            arousal_rt=data.get('arousal_rt'),
-            arousal_delay_number = data.get('arousal_delay_number', 0),
-            arousal_input_method=data.get('arousal_input_method'),
-        )
+    advance_session_plan(user, [plan_entry])
+    return {'status': 'success'}, 200
 
-    # مرحله ۵: رتبه‌بندی نهایی
-    elif data.get('is_rerating'):
-        RatingMainResponse.objects.create(
-            user=user,
-            trial=data['trial'],
-            stimulus_number=extract_stimulus_number(data.get('stimulus_number')),
-            stimulus_file=data['stimulus_file'],
-            valence=data.get('valence'),
-            valence_rt=data.get('valence_rt'),
-            valence_delay_number = data.get('valence_delay_number', 0),
-            valence_input_method=data.get('valence_input_method'),
-            arousal=data.get('arousal'),
-            arousal_rt=data.get('arousal_rt'),
-            arousal_delay_number = data.get('arousal_delay_number', 0),
-            arousal_input_method=data.get('arousal_input_method'),
-        )
 
-    else:
-        return JsonResponse({'status': 'error', 'message': 'نوع داده نامعتبر'}, status=400)
+@csrf_exempt
+def pcm_save_response(request):
+    data, error = parse_save_request(request)
+    if error:
+        return error
+    error = unauthenticated_response(request.user)
+    if error:
+        return error
+    payload, status = save_pcm_payload(request.user, data)
+    return JsonResponse(payload, status=status)
 
-    return JsonResponse({'status': 'success'})
 
+@csrf_exempt
+async def pcm_save_response_async(request):
+    data, error = parse_save_request(request)
+    if error:
+        return error
+    user = await request.auser()
+    error = unauthenticated_response(user)
+    if error:
+        return error
+    payload, status = await sync_to_async(save_pcm_payload)(user, data)
+    return JsonResponse(payload, status=status)
 
 def final_view(request):
     user = request.user
-    PCM_FILES_RAW = [
-        '5-MP-MA/102.mp3',
-        '5-MP-MA/152.mp3',
-        '5-MP-MA/170.mp3',
-        '5-MP-MA/246.mp3',
-        '5-MP-MA/320.mp3',
-        '5-MP-MA/322.mp3',
-        '5-MP-MA/358.mp3',
-        '5-MP-MA/361.mp3',
-        '5-MP-MA/364.mp3',
-        '5-MP-MA/368.mp3',
-        '5-MP-MA/370.mp3',
-        '5-MP-MA/373.mp3',
-        '5-MP-MA/374.mp3',
-        '5-MP-MA/375.mp3',
-        '5-MP-MA/376.mp3',
-        '5-MP-MA/382.mp3',
-        '5-MP-MA/403.mp3',
-        '5-MP-MA/410.mp3',
-        '5-MP-MA/425.mp3',
-        '5-MP-MA/698.mp3',
-        '5-MP-MA/701.mp3',
-        '5-MP-MA/705.mp3',
-        '5-MP-MA/722.mp3',
-        '5-MP-MA/724.mp3',
-        '7-LP-HA/106.mp3',
-        '7-LP-HA/115.mp3',
-        '7-LP-HA/116.mp3',
-        '7-LP-HA/133.mp3',
-        '7-LP-HA/244.mp3',
-        '7-LP-HA/255.mp3',
-        '7-LP-HA/260.mp3',
-        '7-LP-HA/261.mp3',
-        '7-LP-HA/275.mp3',
-        '7-LP-HA/276.mp3',
-        '7-LP-HA/277.mp3',
-        '7-LP-HA/278.mp3',
-        '7-LP-HA/279.mp3',
-        '7-LP-HA/282.mp3',
-        '7-LP-HA/283.mp3',
-        '7-LP-HA/284.mp3',
-        '7-LP-HA/285.mp3',
-        '7-LP-HA/286.mp3',
-        '7-LP-HA/288.mp3',
-        '7-LP-HA/289.mp3',
-        '7-LP-HA/290.mp3',
-        '7-LP-HA/292.mp3',
-        '7-LP-HA/296.mp3',
-        '7-LP-HA/310.mp3',
-        '7-LP-HA/380.mp3',
-        '7-LP-HA/420.mp3',
-        '7-LP-HA/422.mp3',
-        '7-LP-HA/423.mp3',
-        '7-LP-HA/424.mp3',
-        '7-LP-HA/501.mp3',
-        '7-LP-HA/502.mp3',
-        '7-LP-HA/600.mp3',
-        '7-LP-HA/624.mp3',
-        '7-LP-HA/625.mp3',
-        '7-LP-HA/626.mp3',
-        '7-LP-HA/699.mp3',
-        '7-LP-HA/711.mp3',
-        '7-LP-HA/712.mp3',
-        '7-LP-HA/713.mp3',
-        '7-LP-HA/714.mp3',
-        '7-LP-HA/730.mp3',
-        '7-LP-HA/732.mp3',
-        '8-LP-MA/241.mp3',
-        '8-LP-MA/242.mp3',
-        '8-LP-MA/280.mp3',
-        '8-LP-MA/293.mp3',
-        '8-LP-MA/295.mp3',
-        '8-LP-MA/611.mp3',
-    ]
-
-    # حذف تکراری‌ها
-    PCM_FILES_RAW = list(set(PCM_FILES_RAW))
-    main_pcm_files = [build_audio_url(f) for f in PCM_FILES_RAW]
-    TOTAL_MAIN_PCM_TRIALS = len(main_pcm_files)
-    rating_pcm_done = RatingMainResponse.objects.filter(
-        user=user
-    ).exclude(
-        valence__isnull=True
-    ).exclude(
-        arousal__isnull=True
-    ).count()
+    catalog = stimulus_catalog()
+    TOTAL_MAIN_PCM_TRIALS = len(catalog.urls('pcm_rating'))
+    progress = ParticipantProgress.for_user(user)
+    rating_pcm_done = progress.pcm_rating_main
     PCM_percentage = (rating_pcm_done / TOTAL_MAIN_PCM_TRIALS) * 100 if TOTAL_MAIN_PCM_TRIALS > 0 else 100
     print(PCM_percentage)
     if PCM_percentage == 100 :
@@ -1838,31 +1239,10 @@ def final_view(request):
     else:
         pcm_completed = False
 
-    RATING_FILES_RAW = [
-        '1-HP-HA/110.mp3','1-HP-HA/200.mp3','1-HP-HA/201.mp3','1-HP-HA/202.mp3','1-HP-HA/205.mp3','1-HP-HA/215.mp3','1-HP-HA/220.mp3','1-HP-HA/311.mp3','1-HP-HA/352.mp3','1-HP-HA/353.mp3','1-HP-HA/355.mp3','1-HP-HA/360.mp3','1-HP-HA/363.mp3','1-HP-HA/365.mp3','1-HP-HA/366.mp3','1-HP-HA/367.mp3','1-HP-HA/378.mp3','1-HP-HA/415.mp3','1-HP-HA/716.mp3','1-HP-HA/717.mp3','1-HP-HA/808.mp3','1-HP-HA/815.mp3','1-HP-HA/817.mp3',
-        '2-HP-MA/109.mp3','2-HP-MA/111.mp3','2-HP-MA/112.mp3','2-HP-MA/150.mp3','2-HP-MA/151.mp3','2-HP-MA/206.mp3','2-HP-MA/221.mp3','2-HP-MA/224.mp3','2-HP-MA/226.mp3','2-HP-MA/230.mp3','2-HP-MA/254.mp3','2-HP-MA/270.mp3','2-HP-MA/351.mp3','2-HP-MA/400.mp3','2-HP-MA/601.mp3','2-HP-MA/721.mp3','2-HP-MA/725.mp3','2-HP-MA/726.mp3','2-HP-MA/802.mp3','2-HP-MA/810.mp3','2-HP-MA/811.mp3','2-HP-MA/813.mp3','2-HP-MA/816.mp3','2-HP-MA/820.mp3','2-HP-MA/826.mp3',
-        '3-HP-LA/172.mp3','3-HP-LA/809.mp3','3-HP-LA/812.mp3',
-        '4-MP-HA/114.mp3','4-MP-HA/204.mp3','4-MP-HA/210.mp3','4-MP-HA/216.mp3','4-MP-HA/610.mp3','4-MP-HA/704.mp3','4-MP-HA/710.mp3','4-MP-HA/715.mp3',
-        '5-MP-MA/102.mp3','5-MP-MA/104.mp3','5-MP-MA/107.mp3','5-MP-MA/111.mp3','5-MP-MA/113.mp3','5-MP-MA/120.mp3','5-MP-MA/130.mp3','5-MP-MA/132.mp3','5-MP-MA/152.mp3','5-MP-MA/170.mp3','5-MP-MA/225.mp3','5-MP-MA/245.mp3','5-MP-MA/246.mp3','5-MP-MA/251.mp3','5-MP-MA/252.mp3','5-MP-MA/320.mp3','5-MP-MA/322.mp3','5-MP-MA/358.mp3','5-MP-MA/361.mp3','5-MP-MA/364.mp3','5-MP-MA/368.mp3','5-MP-MA/370.mp3','5-MP-MA/373.mp3','5-MP-MA/374.mp3','5-MP-MA/375.mp3','5-MP-MA/376.mp3','5-MP-MA/382.mp3','5-MP-MA/403.mp3','5-MP-MA/410.mp3','5-MP-MA/425.mp3','5-MP-MA/500.mp3','5-MP-MA/627.mp3','5-MP-MA/698.mp3','5-MP-MA/700.mp3','5-MP-MA/701.mp3','5-MP-MA/702.mp3','5-MP-MA/705.mp3','5-MP-MA/706.mp3','5-MP-MA/720.mp3','5-MP-MA/722.mp3','5-MP-MA/723.mp3','5-MP-MA/724.mp3','5-MP-MA/728.mp3','5-MP-MA/729.mp3',
-        '6-MP-LA/171.mp3','6-MP-LA/262.mp3','6-MP-LA/377.mp3','6-MP-LA/602.mp3','6-MP-LA/708.mp3',
-        '7-LP-HA/105.mp3','7-LP-HA/106.mp3','7-LP-HA/115.mp3','7-LP-HA/116.mp3','7-LP-HA/133.mp3','7-LP-HA/134.mp3','7-LP-HA/244.mp3','7-LP-HA/255.mp3','7-LP-HA/260.mp3','7-LP-HA/261.mp3','7-LP-HA/275.mp3','7-LP-HA/276.mp3','7-LP-HA/277.mp3','7-LP-HA/278.mp3','7-LP-HA/279.mp3','7-LP-HA/281.mp3','7-LP-HA/282.mp3','7-LP-HA/283.mp3','7-LP-HA/284.mp3','7-LP-HA/285.mp3','7-LP-HA/286.mp3','7-LP-HA/288.mp3','7-LP-HA/289.mp3','7-LP-HA/290.mp3','7-LP-HA/292.mp3','7-LP-HA/296.mp3','7-LP-HA/310.mp3','7-LP-HA/312.mp3','7-LP-HA/319.mp3','7-LP-HA/380.mp3','7-LP-HA/420.mp3','7-LP-HA/422.mp3','7-LP-HA/423.mp3','7-LP-HA/424.mp3','7-LP-HA/501.mp3','7-LP-HA/502.mp3','7-LP-HA/600.mp3','7-LP-HA/624.mp3','7-LP-HA/625.mp3','7-LP-HA/626.mp3','7-LP-HA/699.mp3','7-LP-HA/709.mp3','7-LP-HA/711.mp3','7-LP-HA/712.mp3','7-LP-HA/713.mp3','7-LP-HA/714.mp3','7-LP-HA/719.mp3','7-LP-HA/730.mp3','7-LP-HA/732.mp3','7-LP-HA/910.mp3',
-        '8-LP-MA/241.mp3','8-LP-MA/242.mp3','8-LP-MA/243.mp3','8-LP-MA/250.mp3','8-LP-MA/280.mp3','8-LP-MA/293.mp3','8-LP-MA/295.mp3','8-LP-MA/611.mp3','8-LP-MA/703.mp3',
-    ]
-
-    # حذف تکراری‌ها
-    RATING_FILES_RAW = list(set(RATING_FILES_RAW))
-    # تبدیل به URL کامل
-    main_rating_files = [build_audio_url(f) for f in RATING_FILES_RAW]
     # تعداد کل محرک‌ها
-    TOTAL_MAIN_RATING_TRIALS = len(main_rating_files)
+    TOTAL_MAIN_RATING_TRIALS = len(catalog.urls('rating_main'))
     # تعداد رتبه‌بندی‌های تکمیل‌شده (هر دو valence و arousal پر باشند)
-    rating_main_done = RatingResponse.objects.filter(
-        user=user
-    ).exclude(
-        valence__isnull=True
-    ).exclude(
-        arousal__isnull=True
-    ).count()
+    rating_main_done = progress.rating_main
     rating_percentage = (rating_main_done / TOTAL_MAIN_RATING_TRIALS) * 100 if TOTAL_MAIN_RATING_TRIALS > 0 else 100
     if rating_percentage == 100 :
         rating_completed = True
@@ -1878,181 +1258,246 @@ def result_view(request):
     return render(request, 'result.html')
 
 
+# میانگین‌های ارزیابی هر شرکت‌کننده (برای values('user').annotate)
+RATING_USER_AGGREGATES = {
+    'n_responses': Count('id'),
+    'avg_valence': Avg('valence'),
+    'avg_valence_rt': Avg('valence_rt'),
+    'avg_arousal': Avg('arousal'),
+    'avg_arousal_rt': Avg('arousal_rt'),
+}
+
+# کلید خروجی در قالب pcm_result.html -> فیلد PCMMainResponse
+PCM_SUMMARY_FIELDS = {
+    'valence_stim1': 'valence_stim1',
+    'valence_rt_stim1': 'valence_rt_stim1',
+    'valence_stim2': 'valence_stim2',
+    'valence_rt_stim2': 'valence_rt_stim2',
+    'valence_seq': 'valence_sequence',
+    'valence_rt_seq': 'valence_rt_sequence',
+}
+
+
+def pcm_user_aggregates():
+    """میانگین‌های شرطی تریال‌های قابل انتظار / غیرقابل انتظار در یک کوئری گروه‌بندی‌شده"""
+    aggregates = {}
+    for prefix, consistent in (('pcm_expected', True), ('pcm_unexpected', False)):
+        condition = Q(is_consistent=consistent)
+        aggregates[f'{prefix}_count'] = Count('id', filter=condition)
+        for key, field in PCM_SUMMARY_FIELDS.items():
+            aggregates[f'{prefix}_{key}'] = Avg(field, filter=condition)
+    return aggregates
+
+
+def aggregate_by_user(queryset, aggregates) -> Dict[int, dict]:
+    """یک کوئری GROUP BY user برای همه شرکت‌کنندگان؛ خروجی: user_id -> مقادیر گرد شده"""
+    rows = queryset.order_by().values('user').annotate(**aggregates)
+    return {
+        row.pop('user'): {
+            key: value if isinstance(value, int) else round(value or 0, 2)
+            for key, value in row.items()
+        }
+        for row in rows
+    }
+
+
+def results_by_user(user_ids) -> Dict[int, list]:
+    """نتایج پرسشنامه همه شرکت‌کنندگان با یک کوئری (به همراه attribute)"""
+    grouped = defaultdict(list)
+    for result in Result.objects.filter(user__in=user_ids).select_related('attribute').order_by('user_id', 'pk'):
+        grouped[result.user_id].append(result)
+    return grouped
+
+
+def user_profile_row(user) -> dict:
+    return {
+        'name': user.get_full_name() or user.username,
+        'email': user.email,
+        'mobile': user.username,
+        'birth_date': convert_birth_to_jalali_view(user),
+        'age': calculate_age_view(user),
+        'gender': dict(CustomUser.GENDER_CHOICES).get(user.gender, 'نامشخص'),
+        'hand': dict(CustomUser.HAND_CHOICES).get(user.hand, 'نامشخص'),
+        'disorder': user.disorder,
+        'drug': user.drug,
+    }
+
+
+def stimulus_norm_rates(source) -> List[dict]:
+    """جدول میانگین هر محرک از StimulusNorm (بدون GROUP BY روی جداول پاسخ)"""
+    rates = []
+    for norm in StimulusNorm.objects.filter(source=source, n_responses__gt=0).order_by('stimulus', 'stimulus_file'):
+        rates.append({
+            'stimulus': norm.stimulus,
+            'N': norm.n_responses,
+            'stimulus_file': norm.stimulus_file[17:22],
+            'valence': round(norm.mean('valence') or 0, 2),
+            'valence_rt': round(norm.mean('valence_rt') or 0, 2),
+            'arousal': round(norm.mean('arousal') or 0, 2),
+            'arousal_rt': round(norm.mean('arousal_rt') or 0, 2),
+        })
+    return rates
+
+
+def stimulus_norms_view(request):
+    """آمار هنجاری محرک‌ها (میانگین، SD و SE) به صورت JSON؛ ?source=pcm یا rating"""
+    norms = StimulusNorm.objects.filter(n_responses__gt=0)
+    source = request.GET.get('source')
+    if source:
+        if source not in StimulusNorm.SOURCES:
+            return JsonResponse({'status': 'error', 'message': 'منبع نامعتبر'}, status=400)
+        norms = norms.filter(source=source)
+    return JsonResponse({'status': 'success', 'norms': [norm.summary() for norm in norms]})
+
+
 def pcm_result_view(request):
-    users = CustomUser.objects.all().order_by('id')
+    """
+    خلاصه PCM همه شرکت‌کنندگان. هر جدول منبع فقط یک کوئری گروه‌بندی‌شده بر اساس user دارد
+    و نتایج در پایتون با دیکشنری به هم وصل می‌شوند؛ تعداد کوئری‌ها به تعداد کاربران بستگی ندارد.
+    """
     data = {
         'users': [],
-        'rates': [],
+        'rates': stimulus_norm_rates('pcm'),
     }
 
-    ratingresponse = (
-        RatingMainResponse.objects
-        .values('stimulus_number', 'stimulus_file')
-        .annotate(
-            avg_valence=Avg('valence'),
-            avg_valence_rt=Avg('valence_rt'),
-            avg_arousal=Avg('arousal'),
-            avg_arousal_rt=Avg('arousal_rt'),
-            n_responses=Count('id'),
-        )
-        .order_by('stimulus_number')
-    )
-    
-    for rate in ratingresponse:
-        
-        rate_data = {
-            'stimulus': rate['stimulus_number'],
-            'N': rate['n_responses'],
-            'stimulus_file': rate['stimulus_file'][17:22],
-            'valence': round(rate['avg_valence'] or 0, 2),
-            'valence_rt': round(rate['avg_valence_rt'] or 0, 2),
-            'arousal': round(rate['avg_arousal'] or 0, 2),
-            'arousal_rt': round(rate['avg_arousal_rt'] or 0, 2),
-        }
-        data['rates'].append(rate_data)
-
-    for user in users:
-        results = Result.objects.filter(user=user)
-        rating_response = RatingMainResponse.objects.filter(user=user)
-        PCM_main_response = PCMMainResponse.objects.filter(user=user)
-
-        # --- محاسبه میانگین‌های کلی (از RatingMainResponse) ---
-        avg_data = rating_response.aggregate(
-            avg_valence=Avg('valence'),
-            avg_valence_rt=Avg('valence_rt'),
-            avg_arousal=Avg('arousal'),
-            avg_arousal_rt=Avg('arousal_rt'),
-            n_responses=Count('id'),
-        )
+    # فقط کاربرانی که پاسخ PCM اصلی دارند نمایش داده می‌شوند
+    pcm_users = PCMMainResponse.objects.values('user')
+    pcm_summary = aggregate_by_user(PCMMainResponse.objects.all(), pcm_user_aggregates())
+    rating_summary = aggregate_by_user(RatingMainResponse.objects.filter(user__in=pcm_users), RATING_USER_AGGREGATES)
+    results = results_by_user(pcm_users)
+    empty_rating = {key: 0 for key in RATING_USER_AGGREGATES}
 
-        # --- محاسبه میانگین‌های PCM بر اساس انتظار ---
-        pcm_expected = PCM_main_response.filter(is_consistent=True).aggregate(
-            n_responses=Count('id'),
-            avg_valence_stim1=Avg('valence_stim1'),
-            avg_valence_rt_stim1=Avg('valence_rt_stim1'),
-            avg_valence_stim2=Avg('valence_stim2'),
-            avg_valence_rt_stim2=Avg('valence_rt_stim2'),
-            avg_valence_sequence=Avg('valence_sequence'),
-            avg_valence_rt_sequence=Avg('valence_rt_sequence'),
-        )
+    for user in CustomUser.objects.filter(pk__in=pcm_users).order_by('id'):
+        if user.pk not in pcm_summary:
+            continue
+        user_data = user_profile_row(user)
+        # داده‌های RatingMainResponse
+        user_data.update(rating_summary.get(user.pk, empty_rating))
+        # داده‌های PCM (قابل انتظار / غیرقابل انتظار)
+        user_data.update(pcm_summary[user.pk])
+        user_data['results'] = results.get(user.pk, [])
+        data['users'].append(user_data)
 
-        pcm_unexpected = PCM_main_response.filter(is_consistent=False).aggregate(
-            n_responses=Count('id'),
-            avg_valence_stim1=Avg('valence_stim1'),
-            avg_valence_rt_stim1=Avg('valence_rt_stim1'),
-            avg_valence_stim2=Avg('valence_stim2'),
-            avg_valence_rt_stim2=Avg('valence_rt_stim2'),
-            avg_valence_sequence=Avg('valence_sequence'),
-            avg_valence_rt_sequence=Avg('valence_rt_sequence'),
-        )
+    return render(request, 'pcm_result.html', data)
 
-        if PCM_main_response :
-            user_data = {
-                'name': user.get_full_name() or user.username,
-                'email': user.email,
-                'mobile': user.username,
-                'birth_date': convert_birth_to_jalali_view(user),
-                'age': calculate_age_view(user),
-                'gender': dict(CustomUser.GENDER_CHOICES).get(user.gender, 'نامشخص'),
-                'hand': dict(CustomUser.HAND_CHOICES).get(user.hand, 'نامشخص'),
-                'disorder': user.disorder,
-                'drug': user.drug,
-
-                # داده‌های RatingMainResponse
-                'n_responses': avg_data['n_responses'],
-                'avg_valence': round(avg_data['avg_valence'] or 0, 2),
-                'avg_valence_rt': round(avg_data['avg_valence_rt'] or 0, 2),
-                'avg_arousal': round(avg_data['avg_arousal'] or 0, 2),
-                'avg_arousal_rt': round(avg_data['avg_arousal_rt'] or 0, 2),
-
-                # داده‌های PCM (قابل انتظار)
-                'pcm_expected_count': pcm_expected['n_responses'],
-                'pcm_expected_valence_stim1': round(pcm_expected['avg_valence_stim1'] or 0, 2),
-                'pcm_expected_valence_rt_stim1': round(pcm_expected['avg_valence_rt_stim1'] or 0, 2),
-                'pcm_expected_valence_stim2': round(pcm_expected['avg_valence_stim2'] or 0, 2),
-                'pcm_expected_valence_rt_stim2': round(pcm_expected['avg_valence_rt_stim2'] or 0, 2),
-                'pcm_expected_valence_seq': round(pcm_expected['avg_valence_sequence'] or 0, 2),
-                'pcm_expected_valence_rt_seq': round(pcm_expected['avg_valence_rt_sequence'] or 0, 2),
-
-                # داده‌های PCM (غیرقابل انتظار)
-                'pcm_unexpected_count': pcm_unexpected['n_responses'],
-                'pcm_unexpected_valence_stim1': round(pcm_unexpected['avg_valence_stim1'] or 0, 2),
-                'pcm_unexpected_valence_rt_stim1': round(pcm_unexpected['avg_valence_rt_stim1'] or 0, 2),
-                'pcm_unexpected_valence_stim2': round(pcm_unexpected['avg_valence_stim2'] or 0, 2),
-                'pcm_unexpected_valence_rt_stim2': round(pcm_unexpected['avg_valence_rt_stim2'] or 0, 2),
-                'pcm_unexpected_valence_seq': round(pcm_unexpected['avg_valence_sequence'] or 0, 2),
-                'pcm_unexpected_valence_rt_seq': round(pcm_unexpected['avg_valence_rt_sequence'] or 0, 2),
-
-                'rating_response': rating_response,
-                'results': results,
-            }
-
-            data['users'].append(user_data)
+def years_ago(today, years):
+    """تاریخ همان روز در years سال قبل (۲۹ فوریه -> ۲۸ فوریه)"""
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
 
-    return render(request, 'pcm_result.html', data)
 
 def rating_result_view(request):
-    users = CustomUser.objects.all().order_by('id')
+    """
+    نتایج آزمون رتبه‌بندی. خلاصه هر شرکت‌کننده با یک کوئری گروه‌بندی‌شده روی RatingResponse
+    ساخته می‌شود و فیلتر (جنسیت، دست غالب، بازه سنی، وضعیت تکمیل)، مرتب‌سازی و صفحه‌بندی
+    در خود دیتابیس انجام می‌شوند. پاسخ‌های خام هر شرکت‌کننده فقط در صورت درخواست از
+    rating_result_rows_view خوانده می‌شوند.
+    """
     data = {
         'users': [],
-        'rates': [],
+        'rates': stimulus_norm_rates('rating'),
     }
-    ratingresponse = (
+
+    form = RatingResultFilterForm(request.GET)
+    form.is_valid()
+    filters = form.cleaned_data
+
+    complete = Q(ratingresponse__valence__isnull=False, ratingresponse__arousal__isnull=False)
+    participants = CustomUser.objects.annotate(
+        n_responses=Count('ratingresponse'),
+        n_complete=Count('ratingresponse', filter=complete),
+        avg_valence=Avg('ratingresponse__valence'),
+        avg_valence_rt=Avg('ratingresponse__valence_rt'),
+        avg_arousal=Avg('ratingresponse__arousal'),
+        avg_arousal_rt=Avg('ratingresponse__arousal_rt'),
+    ).filter(n_responses__gt=0)
+
+    if filters.get('gender'):
+        participants = participants.filter(gender=filters['gender'])
+    if filters.get('hand'):
+        participants = participants.filter(hand=filters['hand'])
+    today = date.today()
+    if filters.get('age_min') is not None:
+        participants = participants.filter(birth_date__lte=years_ago(today, filters['age_min']))
+    if filters.get('age_max') is not None:
+        participants = participants.filter(birth_date__gt=years_ago(today, filters['age_max'] + 1))
+    total_trials = len(stimulus_catalog().urls('rating_main'))
+    if filters.get('status') == 'complete':
+        participants = participants.filter(n_complete__gte=total_trials)
+    elif filters.get('status') == 'incomplete':
+        participants = participants.filter(n_complete__lt=total_trials)
+
+    paginator = Paginator(participants.order_by(*form.ordering()), filters.get('per_page') or 50)
+    page = paginator.get_page(request.GET.get('page'))
+    results = results_by_user([user.pk for user in page])
+
+    for user in page:
+        user_data = user_profile_row(user)
+        user_data.update({
+            'id': user.pk,
+            'n_responses': user.n_responses,
+            'is_complete': user.n_complete >= total_trials,
+            'avg_valence': round(user.avg_valence or 0, 2),
+            'avg_valence_rt': round(user.avg_valence_rt or 0, 2),
+            'avg_arousal': round(user.avg_arousal or 0, 2),
+            'avg_arousal_rt': round(user.avg_arousal_rt or 0, 2),
+            'results': results.get(user.pk, []),
+        })
+        data['users'].append(user_data)
+
+    # پارامترهای فعلی برای ساخت لینک‌های صفحه‌بندی (بدون page) و مرتب‌سازی (بدون page و sort)
+    query = request.GET.copy()
+    query.pop('page', None)
+    page_query = query.urlencode()
+    query.pop('sort', None)
+    sort = filters.get('sort') or 'id'
+    sort_query = f"{query.urlencode()}&" if query else ''
+    data.update({
+        'form': form,
+        'page_obj': page,
+        'page_query': f"{page_query}&" if page_query else '',
+        # کلیک دوباره روی ستون مرتب‌شده جهت مرتب‌سازی را برعکس می‌کند
+        'sort_links': {
+            key: f"?{sort_query}sort={'-' + key if sort == key else key}"
+            for key in RatingResultFilterForm.SORT_FIELDS
+        },
+    })
+    return render(request, 'rating_result.html', data)
+
+
+@staff_member_required
+def rating_result_rows_view(request, user_id):
+    """پاسخ‌های خام یک شرکت‌کننده در آزمون رتبه‌بندی (برای باز کردن ردیف در صفحه نتایج؛ فقط کارکنان)"""
+    user = get_object_or_404(CustomUser, pk=user_id)
+    rows = list(
         RatingResponse.objects
-        .values('stimulus', 'stimulus_file')
-        .annotate(
-            avg_valence=Avg('valence'),
-            avg_valence_rt=Avg('valence_rt'),
-            avg_arousal=Avg('arousal'),
-            avg_arousal_rt=Avg('arousal_rt'),
-            n_responses=Count('id'),
+        .filter(user=user)
+        .order_by('trial', 'created_at')
+        .values(
+            'trial', 'stimulus', 'stimulus_file', 'valence', 'valence_rt', 'valence_input_method',
+            'arousal', 'arousal_rt', 'arousal_input_method', 'is_active', 'created_at',
         )
-        .order_by('stimulus')
     )
-    
-    for rate in ratingresponse:
-        
-        rate_data = {
-            'stimulus': rate['stimulus'],
-            'N': rate['n_responses'],
-            'stimulus_file': rate['stimulus_file'][17:22],
-            'valence': round(rate['avg_valence'] or 0, 2),
-            'valence_rt': round(rate['avg_valence_rt'] or 0, 2),
-            'arousal': round(rate['avg_arousal'] or 0, 2),
-            'arousal_rt': round(rate['avg_arousal_rt'] or 0, 2),
-        }
-        data['rates'].append(rate_data)
-
-    for user in users:
-        results = Result.objects.filter(user=user)
-        rating_response = RatingResponse.objects.filter(user=user)
-        
-        avg_data = rating_response.aggregate(
-            avg_valence=Avg('valence'),
-            avg_valence_rt=Avg('valence_rt'),
-            avg_arousal=Avg('arousal'),
-            avg_arousal_rt=Avg('arousal_rt'),
-            n_responses=Count('id'),
-        )
-        if rating_response :
-            user_data = {
-                'name': user.get_full_name() or user.username,
-                'email': user.email,
-                'mobile': user.username,
-                'birth_date': convert_birth_to_jalali_view(user),
-                'age': calculate_age_view(user),
-                'gender': dict(CustomUser.GENDER_CHOICES).get(user.gender, 'نامشخص'),
-                'hand': dict(CustomUser.HAND_CHOICES).get(user.hand, 'نامشخص'),
-                'disorder': user.disorder,
-                'drug': user.drug,
-                'n_responses': avg_data['n_responses'],
-                'avg_valence': round(avg_data['avg_valence'] or 0, 2),
-                'avg_valence_rt': round(avg_data['avg_valence_rt'] or 0, 2),
-                'avg_arousal': round(avg_data['avg_arousal'] or 0, 2),
-                'avg_arousal_rt': round(avg_data['avg_arousal_rt'] or 0, 2),
-                'rating_response': rating_response,
-                'results': results,
-            }
-            data['users'].append(user_data)
-
-    return render(request, 'rating_result.html', data)
\ No newline at end of file
+    return JsonResponse({'user': user.username, 'count': len(rows), 'rows': rows})
+
+
+@staff_member_required
+def export_trials_view(request):
+    """
+    خروجی CSV/TSV یک جدول مرحله به صورت جریانی (فقط کارکنان).
+    پارامترها: stage، format (csv/tsv)، since و until (YYYY-MM-DD)، users (شماره‌ها جدا شده با کاما)
+    """
+    form = TrialExportForm(request.GET, stages=EXPORT_TABLES)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+
+    data = form.cleaned_data
+    fmt = data['format'] or 'csv'
+    table = EXPORT_TABLES[data['stage']]
+    lines = iter_lines(table, fmt, since=data['since'], until=data['until'], users=data['users'])
+    response = StreamingHttpResponse(lines, content_type=f'{EXPORT_FORMATS[fmt][1]}; charset=utf-8')
+    filename = f"{table.stage}_{timezone.now():%Y%m%d_%H%M%S}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
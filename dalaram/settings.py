@@ -120,4 +120,37 @@ STATIC_URL = '/static/'
 STATIC_ROOT = env('STATIC_ROOT')
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
-]
\ No newline at end of file
+]
+
+# صداهای محرک هنگام collectstatic یک کپی با نام هش‌دار (sha256 محتوا) هم می‌گیرند و ویوها
+# وقتی هش فایل در جدول Stimulus ثبت شده باشد (دستور build_stimulus_manifest) همان نام را می‌دهند.
+# ترتیب deploy: build_stimulus_manifest و سپس collectstatic.
+# نام‌های هش‌دار هرگز تغییر نمی‌کنند؛ وب‌سرور باید آن‌ها را با کش دائمی سرو کند، مثلاً در nginx:
+#   location ~ "^/static/(sounds/.+\.[0-9a-f]{12}\.mp3)$" {
+#       alias <STATIC_ROOT>/$1;
+#       add_header Cache-Control "public, max-age=31536000, immutable";
+#   }
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.storage.StimulusStaticFilesStorage'},
+}
+STIMULUS_HASHED_URLS = env.bool('STIMULUS_HASHED_URLS', default=not DEBUG)
+
+# endpointهای ذخیره پاسخ (pcm/save، rating/save، save-device-log، save-volume-log) یک نسخه async هم دارند
+# که با ASYNC_SAVE_ENDPOINTS=True جایگزین نسخه sync می‌شوند؛ فقط زیر سرور ASGI فعال شود (زیر WSGI هر
+# درخواست async یک event loop جدا می‌سازد و کندتر است). پیکربندی پیشنهادی:
+#   uvicorn dalaram.asgi:application --host 127.0.0.1 --port 8000 --workers 4 \
+#       --limit-concurrency 400 --backlog 2048 --timeout-graceful-shutdown 30
+# - workers: یکی برای هر هسته CPU؛ کار پایگاه داده هر درخواست در thread مخصوص همان درخواست اجرا می‌شود.
+# - limit-concurrency: سقف درخواست‌های هم‌زمان هر worker؛ چون هر درخواست هم‌زمان یک اتصال MySQL می‌گیرد،
+#   max_connections در MySQL باید دست‌کم workers × limit-concurrency باشد. مازاد با 503 رد می‌شود.
+# - timeout-graceful-shutdown: فرصت flush بافر telemetry هنگام restart (core.telemetry).
+# - CONN_MAX_AGE زیر ASGI باید 0 بماند (پیش‌فرض)؛ اتصال‌های ماندگار در threadهای هر درخواست بسته نمی‌شوند.
+# مقایسه با مسیر WSGI: دستور benchmark_save_endpoints روی هر دو سرور.
+ASYNC_SAVE_ENDPOINTS = env.bool('ASYNC_SAVE_ENDPOINTS', default=False)
+
+# کش مشترک همه workerها/پردازه‌ها. نسخه تنظیمات PCM، کاتالوگ محرک‌ها و تعریف پرسشنامه‌ها (core.versioned)
+# اینجا نگه داشته می‌شود و تغییر آن‌ها از پنل ادمین از همین راه به همه workerها می‌رسد؛ کش LocMem پیش‌فرض
+# جنگو بین پردازه‌ها مشترک نیست و مناسب نیست. پیش‌فرض جدول dalaram_cache در همان پایگاه داده است که
+# migration مربوطه (createcachetable) آن را می‌سازد؛ با CACHE_URL=redis://host:6379/1 می‌توان Redis گذاشت.
+CACHES = {'default': env.cache('CACHE_URL', default='dbcache://dalaram_cache')}
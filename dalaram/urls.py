@@ -14,11 +14,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from core.views import *
 from django.contrib.auth import views as auth_views
 
+# نسخه async endpointهای ذخیره فقط زیر سرور ASGI (تنظیم ASYNC_SAVE_ENDPOINTS)
+if settings.ASYNC_SAVE_ENDPOINTS:
+    rating_save_view, pcm_save_view = rating_save_response_async, pcm_save_response_async
+    device_log_view, volume_log_view = save_device_log_async, save_volume_log_async
+else:
+    rating_save_view, pcm_save_view = rating_save_response, pcm_save_response
+    device_log_view, volume_log_view = save_device_log, save_volume_log
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('temp_home', temp_home_view, name='temp_home'),
@@ -33,19 +42,22 @@ urlpatterns = [
     ),
     path('complete-profile/', complete_profile, name='complete_profile'),
     path('experiment/rating/', rating_view, name='rating'),
-    path('rating/save/', rating_save_response, name='rating_save'),
+    path('rating/save/', rating_save_view, name='rating_save'),
     path('experiment/pcm/', pcm_view, name='pcm'),
-    path('pcm/save/', pcm_save_response, name='pcm_save'),
+    path('pcm/save/', pcm_save_view, name='pcm_save'),
     path('final/', final_view, name='final'),
 
     path('questionnaire/<int:pk>/respond/', respond_questionnaire, name='respond_questionnaire'),
 
-    path('save-device-log/', save_device_log, name='save_device_log'),
-    path('save-volume-log/', save_volume_log, name='save_volume_log'),
+    path('save-device-log/', device_log_view, name='save_device_log'),
+    path('save-volume-log/', volume_log_view, name='save_volume_log'),
 
     path('result/', result_view, name='result'),
     path('result/pcm/', pcm_result_view, name='pcm_result'),
     path('result/rating/', rating_result_view, name='rating_result'),
+    path('result/rating/<int:user_id>/rows/', rating_result_rows_view, name='rating_result_rows'),
+    path('result/norms/', stimulus_norms_view, name='stimulus_norms'),
+    path('result/export/', export_trials_view, name='export_trials'),
     # path('detail/<int:id>/', detail_result_view, name='detail_result'),
 ]
 
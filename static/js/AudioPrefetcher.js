@@ -0,0 +1,157 @@
+// ======================================================
+// پیش‌بارگذاری و دیکد صداهای تریال‌های بعدی (Web Audio)
+// ------------------------------------------------------
+// صداهای N تریال بعدی از قبل دریافت و به AudioBuffer دیکد
+// می‌شوند تا پخش cue و محرک‌ها منتظر شبکه و دیکد نماند.
+// حجم بافرهای دیکدشده (PCM، ۴ بایت برای هر نمونه) محدود است
+// و با پر شدن بودجه، کم‌استفاده‌ترین بافرهایی که در لیست
+// تریال‌های پیش رو نیستند حذف می‌شوند (LRU).
+// play() تاخیر شروع پخش (از درخواست پخش تا خروج صدا) را
+// برمی‌گرداند تا همراه پاسخ تریال ذخیره شود.
+// بدون پشتیبانی Web Audio، available برابر false است.
+// ======================================================
+const AudioPrefetcher = (() => {
+  const DEFAULT_MAX_BYTES = 64 * 1024 * 1024;
+  const DEFAULT_CONCURRENCY = 3;
+  const RESUME_TIMEOUT = 1000;
+
+  function create({ maxBytes = DEFAULT_MAX_BYTES, concurrency = DEFAULT_CONCURRENCY } = {}) {
+    const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+    if (!AudioContextClass || !window.fetch) {
+      return { available: false };
+    }
+
+    const ctx = new AudioContextClass();
+    const entries = new Map();   // url -> { promise, buffer, bytes, lastUsed }
+    let wanted = new Set();      // صداهای تریال‌های پیش رو؛ حذف نمی‌شوند
+    let usedBytes = 0;
+    let active = 0;
+    const waiting = [];
+
+    // AudioContext فقط پس از تعامل کاربر اجازه پخش دارد
+    const unlock = () => { if (ctx.state === 'suspended') ctx.resume(); };
+    ['click', 'keydown', 'touchstart'].forEach(type => document.addEventListener(type, unlock, { capture: true }));
+
+    function decode(data) {
+      return new Promise((resolve, reject) => {
+        // Safari قدیمی فقط نسخه callback را دارد
+        const result = ctx.decodeAudioData(data, resolve, reject);
+        if (result && result.then) result.then(resolve, reject);
+      });
+    }
+
+    // محدود کردن تعداد دریافت‌های هم‌زمان
+    function slot() {
+      if (active < concurrency) {
+        active++;
+        return Promise.resolve();
+      }
+      return new Promise(resolve => waiting.push(resolve));
+    }
+
+    function release() {
+      const next = waiting.shift();
+      if (next) next();
+      else active--;
+    }
+
+    function load(url) {
+      let entry = entries.get(url);
+      if (entry) {
+        entry.lastUsed = performance.now();
+        return entry.promise;
+      }
+      entry = { buffer: null, bytes: 0, lastUsed: performance.now() };
+      entry.promise = slot()
+        .then(() => fetch(url, { credentials: 'same-origin' }))
+        .then(response => {
+          if (!response.ok) throw new Error(`HTTP ${response.status}`);
+          return response.arrayBuffer();
+        })
+        .then(decode)
+        .then(buffer => {
+          entry.buffer = buffer;
+          entry.bytes = buffer.length * buffer.numberOfChannels * 4;
+          usedBytes += entry.bytes;
+          evict();
+          return buffer;
+        })
+        .catch(err => {
+          entries.delete(url);
+          throw err;
+        })
+        .finally(release);
+      entries.set(url, entry);
+      return entry.promise;
+    }
+
+    function evict() {
+      if (usedBytes <= maxBytes) return;
+      const candidates = [...entries]
+        .filter(([url, entry]) => entry.buffer && !wanted.has(url))
+        .sort((a, b) => a[1].lastUsed - b[1].lastUsed);
+      for (const [url, entry] of candidates) {
+        if (usedBytes <= maxBytes) break;
+        entries.delete(url);
+        usedBytes -= entry.bytes;
+      }
+    }
+
+    // urls: صداهای تریال‌های پیش رو به ترتیب پخش
+    function prefetch(urls) {
+      wanted = new Set(urls.filter(Boolean));
+      wanted.forEach(url => load(url).catch(err => console.warn('AudioPrefetcher: prefetch failed', url, err)));
+      evict();
+    }
+
+    function isReady(url) {
+      const entry = entries.get(url);
+      return Boolean(entry && entry.buffer);
+    }
+
+    // پخش کامل یک صدا؛ خروجی: { latency (میلی‌ثانیه)، buffered }
+    async function play(url) {
+      const requested = performance.now();
+      const buffered = isReady(url);
+      const buffer = await load(url);
+      if (ctx.state !== 'running') {
+        // بدون تعامل کاربر resume برآورده نمی‌شود؛ در این حالت پخش به <audio> واگذار می‌شود
+        await Promise.race([ctx.resume(), new Promise(resolve => setTimeout(resolve, RESUME_TIMEOUT))]);
+        if (ctx.state !== 'running') throw new Error('AudioContext is not running');
+      }
+
+      return new Promise(resolve => {
+        const source = ctx.createBufferSource();
+        source.buffer = buffer;
+        source.connect(ctx.destination);
+        const when = ctx.currentTime;
+        source.start(when);
+
+        // زمان واقعی خروج صدا: getOutputTimestamp تاخیر خروجی سخت‌افزار را هم در بر دارد
+        let onset;
+        const stamp = ctx.getOutputTimestamp ? ctx.getOutputTimestamp() : null;
+        if (stamp && stamp.performanceTime) {
+          onset = stamp.performanceTime + (when - stamp.contextTime) * 1000;
+        } else {
+          onset = performance.now() + ((ctx.baseLatency || 0) + (ctx.outputLatency || 0)) * 1000;
+        }
+        const latency = Math.max(0, Math.round((onset - requested) * 10) / 10);
+
+        source.onended = () => {
+          source.disconnect();
+          resolve({ latency, buffered });
+        };
+      });
+    }
+
+    return {
+      available: true,
+      prefetch,
+      play,
+      isReady,
+      usage: () => ({ bytes: usedBytes, buffers: entries.size }),
+    };
+  }
+
+  return { create };
+})();
@@ -0,0 +1,232 @@
+// ======================================================
+// صف ماندگار پاسخ تریال‌ها (IndexedDB)
+// ------------------------------------------------------
+// هر پاسخ بلافاصله در IndexedDB ثبت می‌شود و ارسال به سرور
+// در پس‌زمینه و به‌صورت دسته‌ای (آرایه JSON) انجام می‌شود؛
+// بنابراین شروع تریال بعدی منتظر شبکه نمی‌ماند.
+// سرور تریال‌های تکراری را با کلید (جدول، بلوک، تریال) تشخیص
+// می‌دهد، پس ارسال دوباره یک دسته بی‌خطر است.
+// خطای شبکه و 5xx حداکثر MAX_ATTEMPTS بار پشت سر هم تکرار می‌شوند؛
+// پاسخ 4xx قطعی است و دسته به بخش قرنطینه (owner + ':rejected')
+// منتقل می‌شود تا صف پشت آن نماند؛ تریال‌هایی هم که سرور در نتیجه
+// دسته با وضعیت error رد کرده همان‌جا می‌روند. در این حالت‌ها و وقتی
+// صف خالی نمی‌شود (سقف تلاش یا 401/403) drain() رد (reject) می‌شود،
+// یا اگر کسی منتظر نیست onFailure صدا زده می‌شود تا صفحه پیام خطا
+// نشان دهد.
+// ======================================================
+const TrialQueue = (() => {
+  const DB_NAME = 'dalaram-trials';
+  const STORE = 'queue';
+  const BATCH_SIZE = 20;
+  const FLUSH_DELAY = 250;          // میلی‌ثانیه؛ جمع شدن چند پاسخ پشت سر هم
+  const MIN_BACKOFF = 1000;
+  const MAX_BACKOFF = 30000;
+  const MAX_ATTEMPTS = 8;           // حدود دو دقیقه با backoff نمایی
+  const TRANSIENT_STATUSES = [408, 429];
+
+  // ---------- لایه ذخیره‌سازی (IndexedDB یا حافظه در صورت نبود آن) ----------
+  function openStore() {
+    return new Promise(resolve => {
+      if (!window.indexedDB) return resolve(memoryStore());
+      let req;
+      try {
+        req = indexedDB.open(DB_NAME, 1);
+      } catch (e) {
+        return resolve(memoryStore());
+      }
+      req.onupgradeneeded = () => {
+        const store = req.result.createObjectStore(STORE, { keyPath: 'id', autoIncrement: true });
+        store.createIndex('owner', 'owner');
+      };
+      req.onsuccess = () => resolve(idbStore(req.result));
+      req.onerror = () => resolve(memoryStore());
+    });
+  }
+
+  function idbStore(db) {
+    const run = (mode, fn) => new Promise((resolve, reject) => {
+      const tx = db.transaction(STORE, mode);
+      const result = fn(tx.objectStore(STORE));
+      tx.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+      tx.onerror = () => reject(tx.error);
+      tx.onabort = () => reject(tx.error);
+    });
+    return {
+      add: item => run('readwrite', s => s.add(item)),
+      list: (owner, limit) => run('readonly', s => s.index('owner').getAll(owner, limit)),
+      remove: ids => run('readwrite', s => { ids.forEach(id => s.delete(id)); }),
+    };
+  }
+
+  function memoryStore() {
+    let nextId = 1;
+    const items = [];
+    return {
+      add: async item => { item.id = nextId++; items.push(item); return item.id; },
+      list: async (owner, limit) => items.filter(i => i.owner === owner).slice(0, limit),
+      remove: async ids => {
+        for (let i = items.length - 1; i >= 0; i--) {
+          if (ids.includes(items[i].id)) items.splice(i, 1);
+        }
+      },
+    };
+  }
+
+  // ---------- صف ----------
+  function create({ endpoint, owner, onFailure }) {
+    owner = String(owner);
+    const storeReady = openStore();
+    let flushing = null;
+    let timer = null;
+    let backoff = MIN_BACKOFF;
+    let attempts = 0;
+    let failed = false;             // onFailure در هر دوره خطا فقط یک‌بار
+    let waiters = [];
+    const unsent = new Map();       // نسخه همگام صف برای sendBeacon هنگام بستن صفحه
+    let adding = Promise.resolve(); // آخرین نوشتن در IndexedDB
+
+    function schedule(delay) {
+      clearTimeout(timer);
+      timer = setTimeout(flush, delay);
+    }
+
+    function push(payload) {
+      const added = storeReady
+        .then(store => store.add({ owner, endpoint, payload, ts: Date.now() }))
+        .then(id => {
+          unsent.set(id, payload);
+          schedule(FLUSH_DELAY);
+        });
+      adding = adding.then(() => added).catch(err => console.error('TrialQueue: store failed', err));
+      return added;
+    }
+
+    async function pending() {
+      const store = await storeReady;
+      return (await store.list(owner)).filter(i => i.endpoint === endpoint).length;
+    }
+
+    function settle(error) {
+      const pending = waiters;
+      waiters = [];
+      pending.forEach(w => (error ? w.reject(error) : w.resolve()));
+    }
+
+    // اگر drain() منتظر است، رد شدن آن جای onFailure را می‌گیرد (یک پیام برای شرکت‌کننده)
+    function fail(error) {
+      console.error('TrialQueue:', error.message);
+      if (waiters.length) {
+        settle(error);
+      } else if (!failed && onFailure) {
+        onFailure(error);
+      }
+      failed = true;
+    }
+
+    // انتقال آیتم‌های ردشده از صف به بخش قرنطینه (برای بررسی بعدی، بدون ارسال دوباره)
+    async function quarantine(store, items, status, messages = {}) {
+      for (const { id, ...item } of items) {
+        await store.add({ ...item, owner: `${owner}:rejected`, status, message: messages[id] });
+      }
+      await store.remove(items.map(i => i.id));
+      items.forEach(i => unsent.delete(i.id));
+    }
+
+    function flush() {
+      if (!flushing) {
+        flushing = sendBatches().finally(() => { flushing = null; });
+      }
+      return flushing;
+    }
+
+    async function sendBatches() {
+      const store = await storeReady;
+      while (true) {
+        const items = (await store.list(owner)).filter(i => i.endpoint === endpoint).slice(0, BATCH_SIZE);
+        if (!items.length) {
+          backoff = MIN_BACKOFF;
+          attempts = 0;
+          failed = false;
+          settle();
+          return;
+        }
+        let body;
+        let response;
+        try {
+          response = await fetch(endpoint, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(items.map(i => i.payload)),
+          });
+          if (response.ok) body = await response.json();
+        } catch (err) {
+          response = null;
+        }
+        if (response && response.status >= 400 && response.status < 500
+            && !TRANSIENT_STATUSES.includes(response.status)) {
+          // درخواست نامعتبر یا نشست منقضی: تکرار همین دسته فایده‌ای ندارد
+          await quarantine(store, items, response.status);
+          const error = new Error(`HTTP ${response.status}: ${items.length} trials rejected`);
+          fail(error);
+          if (response.status === 401 || response.status === 403) {
+            // بقیه صف هم رد خواهد شد؛ شرکت‌کننده باید دوباره وارد شود
+            return;
+          }
+          continue;
+        }
+        if (!body) {
+          // شبکه یا خطای سرور: تلاش دوباره با فاصله نمایی، حداکثر MAX_ATTEMPTS بار
+          attempts += 1;
+          const reason = response ? `HTTP ${response.status}` : 'network error';
+          if (attempts >= MAX_ATTEMPTS) {
+            fail(new Error(`flush failed ${attempts} times (${reason})`));
+            attempts = 0;
+            backoff = MIN_BACKOFF;
+            return;
+          }
+          console.warn('TrialQueue: flush failed, retrying', reason);
+          schedule(backoff);
+          backoff = Math.min(backoff * 2, MAX_BACKOFF);
+          return;
+        }
+        // created / duplicate قطعی‌اند و از صف حذف می‌شوند؛ error به قرنطینه می‌رود
+        const messages = {};
+        const rejected = (body.results || [])
+          .filter(r => r.status === 'error' && items[r.index])
+          .map(r => { messages[items[r.index].id] = r.message; return items[r.index]; });
+        if (rejected.length) await quarantine(store, rejected, response.status, messages);
+        const accepted = items.filter(i => !(i.id in messages));
+        await store.remove(accepted.map(i => i.id));
+        accepted.forEach(i => unsent.delete(i.id));
+        backoff = MIN_BACKOFF;
+        attempts = 0;
+        if (rejected.length) {
+          console.error('TrialQueue: rejected trials', rejected.map(i => [i.payload, messages[i.id]]));
+          fail(new Error(`${rejected.length} trials rejected by server`));
+        }
+      }
+    }
+
+    // وعده‌ای که پس از خالی شدن کامل صف برآورده و با ارسال ناموفق رد می‌شود
+    function drain() {
+      return adding.then(() => new Promise((resolve, reject) => {
+        waiters.push({ resolve, reject });
+        clearTimeout(timer);
+        flush();
+      }));
+    }
+
+    // ارسال آخرین پاسخ‌ها هنگام بستن صفحه؛ تکرار آن‌ها بعداً بی‌خطر است
+    window.addEventListener('pagehide', () => {
+      if (unsent.size && navigator.sendBeacon) {
+        navigator.sendBeacon(endpoint, new Blob([JSON.stringify([...unsent.values()])], { type: 'text/plain' }));
+      }
+    });
+    window.addEventListener('online', () => { attempts = 0; schedule(0); });
+
+    return { push, pending, flush, drain };
+  }
+
+  return { create };
+})();